@@ -0,0 +1,74 @@
+"""
+Bulk import benchmark for MapleTree.
+Compares loading a nested dictionary with a saveValue call per key
+against MapleTree.setSection / MapleTree.fromDict.
+
+Run from the repository root:
+    python -m benchmarks.mapleDictBenchmark
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from src.maplex import MapleTree
+
+def createSampleDict(sectionCount: int = 1000, tagCount: int = 10) -> dict:
+
+    return {f"SECTION_{i}": {f"TAG_{j}": f"Sample value {i}-{j}" for j in range(tagCount)} for i in range(sectionCount)}
+
+def loadPerKey(fileName: str, mapping: dict) -> None:
+
+    mapleTree = MapleTree(fileName, createBaseFile=True)
+
+    for header, tagValues in mapping.items():
+
+        for tag, value in tagValues.items():
+
+            mapleTree.saveValue(tag, value, header)
+
+    mapleTree._saveToFile()
+
+def loadFromDict(fileName: str, mapping: dict) -> None:
+
+    MapleTree.fromDict(fileName, mapping)
+
+def measure(label: str, func, fileName: str, mapping: dict, entryCount: int) -> float:
+
+    if os.path.isfile(fileName):
+
+        os.remove(fileName)
+
+    startTime = time.perf_counter()
+    func(fileName, mapping)
+    elapsed = time.perf_counter() - startTime
+
+    print(f"{label:<28}: {elapsed:8.3f} s {entryCount / elapsed:12.0f} entries/s")
+    return elapsed
+
+def runBenchmark():
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    workDir = tempfile.mkdtemp(prefix="maple_dict_bench_")
+    fileName = os.path.join(workDir, "bench.mpl")
+
+    try:
+
+        for sectionCount in (100, 1000):
+
+            mapping = createSampleDict(sectionCount)
+            entryCount = sectionCount * 10
+
+            print(f"{entryCount} entries")
+            perKey = measure("  saveValue per key", loadPerKey, fileName, mapping, entryCount)
+            bulk = measure("  MapleTree.fromDict", loadFromDict, fileName, mapping, entryCount)
+            print(f"  Speedup: {perKey / bulk:.1f}x")
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
@@ -0,0 +1,107 @@
+"""
+Encrypted open and save benchmark for MapleTree on a 10 MB file.
+Compares the old path (new Fernet per call, split and rebuild every line)
+with MapleTree (cached Fernet, lines split from the decrypted bytes),
+and the chunked encryption format (full atomic save and in place save
+of the changed segments).
+
+Run from the repository root:
+    python -m benchmarks.mapleEncryptionBenchmark
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from cryptography.fernet import Fernet
+from src.maplex import MapleTree, iterMaple
+from src.maplex.mapleDocument import parseMaple, renderMaple
+from benchmarks.mapleParseBenchmark import createSampleLines
+
+#
+##############################
+# Old encrypted open and save (reference for "before")
+
+def legacyOpen(fileName: str, key: bytes) -> tuple:
+
+    with open(fileName, "rb") as f:
+
+        fileData = Fernet(key).decrypt(f.read()).decode()
+
+    fileLines = fileData.split("\n")
+
+    for i, fileLine in enumerate(fileLines):
+
+        fileLines[i] = f"{fileLine}\n"
+
+    mapleIndex = fileLines.index("MAPLE\n")
+    root, eofIndex = parseMaple(fileLines, mapleIndex)
+    return root, fileLines[:mapleIndex + 1], fileLines[eofIndex:]
+
+def legacySave(fileName: str, key: bytes, document: tuple) -> None:
+
+    root, prologue, epilogue = document
+    fileData = f"{''.join(prologue)}{renderMaple(root, '    ')}{''.join(epilogue)}".encode()
+    fileData = Fernet(key).encrypt(fileData)
+
+    with open(fileName, "wb") as f:
+
+        f.write(fileData)
+
+def measure(label: str, func, repeat: int) -> float:
+
+    startTime = time.perf_counter()
+
+    for _ in range(repeat):
+
+        func()
+
+    elapsed = (time.perf_counter() - startTime) / repeat
+
+    print(f"{label:<28}: {elapsed * 1000:10.1f} ms")
+    return elapsed
+
+def runBenchmark(repeat: int = 5):
+
+    workDir = tempfile.mkdtemp(prefix="maple_encrypt_bench_")
+    fileName = os.path.join(workDir, "bench.mpl")
+    key = Fernet.generate_key()
+
+    try:
+
+        with open(fileName, "wb") as f:
+
+            f.write(Fernet(key).encrypt("".join(createSampleLines(17000)).encode()))
+
+        print(f"Encrypted file: {os.path.getsize(fileName) / 1000000:.2f} MB")
+
+        document = legacyOpen(fileName, key)
+        mapleTree = MapleTree(fileName, encrypt=True, key=key)
+
+        beforeOpen = measure("  Before: open", lambda: legacyOpen(fileName, key), repeat)
+        afterOpen = measure("  After: open", lambda: MapleTree(fileName, encrypt=True, key=key), repeat)
+        beforeSave = measure("  Before: save", lambda: legacySave(fileName, key, document), repeat)
+        afterSave = measure("  After: save", mapleTree._saveToFile, repeat)
+
+        print(f"  Open speedup: {beforeOpen / afterOpen:.2f}x, save speedup: {beforeSave / afterSave:.2f}x")
+
+        # Chunked encryption format
+
+        chunkedTree = MapleTree(fileName, encrypt=True, key=key, chunkSize=64 * 1024)
+        chunkedTree._saveToFile()
+        measure("  Chunked: open", lambda: MapleTree(fileName, encrypt=True, key=key), repeat)
+        measure("  Chunked: save (atomic)", chunkedTree._saveToFile, repeat)
+
+        chunkedTree.DURABILITY = "none"
+        chunkedTree._saveToFile()
+        editCount = iter(range(repeat))
+        measure("  Chunked: edit and save", lambda: chunkedTree.saveValue("TAG_0", next(editCount), "HEADER_16999", save=True), repeat)
+        measure("  Chunked: stream one header", lambda: list(iterMaple(fileName, "HEADER_0", key=key)), repeat)
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
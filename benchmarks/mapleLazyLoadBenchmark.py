@@ -0,0 +1,52 @@
+"""
+Open time benchmark for MapleTree.
+Compares the normal loading (readlines and parse all lines) with
+the memory mapped lazy loading (index H/E lines only) and one read.
+
+Run from the repository root:
+    python -m benchmarks.mapleLazyLoadBenchmark
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from src.maplex import MapleTree
+from benchmarks.mapleParseBenchmark import createSampleLines
+
+def measure(label: str, fileName: str, lazyLoad: bool) -> float:
+
+    startTime = time.perf_counter()
+    mapleTree = MapleTree(fileName, lazyLoad=lazyLoad)
+    openTime = time.perf_counter() - startTime
+    mapleTree.readMapleTag("TAG_0", "HEADER_0")
+    elapsed = time.perf_counter() - startTime
+
+    print(f"{label:<28}: open {openTime:8.3f} s, open and read {elapsed:8.3f} s")
+    return elapsed
+
+def runBenchmark():
+
+    workDir = tempfile.mkdtemp(prefix="maple_lazy_bench_")
+    fileName = os.path.join(workDir, "bench.mpl")
+
+    try:
+
+        for headerCount in (3000, 30000, 100000):
+
+            with open(fileName, "w") as f:
+
+                f.writelines(createSampleLines(headerCount))
+
+            print(f"{headerCount} headers, {os.path.getsize(fileName) / 1000000:.2f} MB")
+            eager = measure("  Normal loading", fileName, False)
+            lazy = measure("  Lazy loading (mmap)", fileName, True)
+            print(f"  Speedup: {eager / lazy:.1f}x")
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
@@ -0,0 +1,83 @@
+"""
+Multi-process logging benchmark for Logger.
+Measures records/s of 8 and 32 producer processes that write to one log file
+directly (each process rotates the file) and through the log server
+(one writer process rotates the file), with records sent one by one and in
+batches by the async writer thread, and counts the records in the log files.
+
+Run from the repository root:
+    python -m benchmarks.mapleLogServerBenchmark
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from src.maplex.mapleLogger import Logger, startLogServer, stopLogServer
+
+def produce(workDir: str, logServer: str | None, asyncWrite: bool, recordCount: int, producerIndex: int) -> None:
+
+    logger = Logger("bench", workingDirectory=workDir, cmdLogLevel="NONE", maxLogSize=0.5, logServer=logServer, asyncWrite=asyncWrite)
+
+    for i in range(recordCount):
+
+        logger.info("Producer %d record %d", producerIndex, i)
+
+    logger.flush()
+
+def countRecords(workDir: str) -> int:
+
+    recordCount = 0
+
+    for fileName in os.listdir(workDir):
+
+        with open(os.path.join(workDir, fileName), "rb") as f:
+
+            recordCount += f.read().count(b"\n")
+
+    return recordCount
+
+def measure(label: str, producerCount: int, recordCount: int, useServer: bool, asyncWrite: bool = False) -> float:
+
+    workDir = tempfile.mkdtemp(prefix="maple_log_server_bench_")
+
+    try:
+
+        startTime = time.perf_counter()
+        logServer = startLogServer() if useServer else None
+        producers = [multiprocessing.Process(target=produce, args=(workDir, logServer, asyncWrite, recordCount, i)) for i in range(producerCount)]
+
+        for producer in producers:
+
+            producer.start()
+
+        for producer in producers:
+
+            producer.join()
+
+        if useServer:
+
+            stopLogServer()
+
+        elapsed = time.perf_counter() - startTime
+        totalCount = producerCount * recordCount
+        print(f"{label:<28}: {totalCount / elapsed:10.0f} records/s, {countRecords(workDir)}/{totalCount} records in the log files")
+        return elapsed
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+def runBenchmark(recordCount: int = 5000):
+
+    for producerCount in (8, 32):
+
+        print(f"{producerCount} producers")
+        measure("  Direct write", producerCount, recordCount, False)
+        measure("  Log server", producerCount, recordCount, True)
+        measure("  Log server (async batches)", producerCount, recordCount, True, True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
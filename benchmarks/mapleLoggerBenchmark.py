@@ -0,0 +1,64 @@
+"""
+Log call benchmark for Logger.
+Measures calls/s of filtered records (below the log levels), with
+eager f-strings and lazy arguments, and emitted file records with and
+without the caller lookup, in the JSON lines format and in the async mode,
+and records of a rate limited call site.
+The inspect.stack() caller lookup used before is measured for reference.
+
+Run from the repository root:
+    python -m benchmarks.mapleLoggerBenchmark
+"""
+
+import inspect
+import shutil
+import tempfile
+import time
+from src.maplex import Logger
+
+def measure(label: str, func, callCount: int) -> float:
+
+    startTime = time.perf_counter()
+
+    for i in range(callCount):
+
+        func(i)
+
+    elapsed = time.perf_counter() - startTime
+
+    print(f"{label:<36}: {callCount / elapsed:12.0f} calls/s")
+    return elapsed
+
+def runBenchmark(callCount: int = 50000):
+
+    workDir = tempfile.mkdtemp(prefix="maple_logger_bench_")
+
+    try:
+
+        logger = Logger("bench", workingDirectory=workDir, cmdLogLevel="NONE", fileLogLevel="INFO", maxLogSize="1G")
+        noCallerLogger = Logger("bench", workingDirectory=workDir, cmdLogLevel="NONE", fileLogLevel="INFO", maxLogSize="1G", captureCaller=False)
+        jsonLogger = Logger("bench", workingDirectory=workDir, cmdLogLevel="NONE", fileLogLevel="INFO", maxLogSize="1G", fileFormat="json")
+        limitedLogger = Logger("bench", workingDirectory=workDir, cmdLogLevel="NONE", fileLogLevel="INFO", maxLogSize="1G")
+        limitedLogger.setRecordLimit("WARN", maxRecords=100)
+        asyncLogger = Logger("bench", workingDirectory=workDir, cmdLogLevel="NONE", fileLogLevel="INFO", maxLogSize="1G", asyncWrite=True)
+
+        measure("  inspect.stack() lookup (reference)", lambda i: inspect.stack()[1], callCount // 50)
+        measure("  Filtered (debug, f-string)", lambda i: logger.debug(f"Filtered message {i} {workDir}"), callCount)
+        measure("  Filtered (debug, lazy arguments)", lambda i: logger.debug("Filtered message %s %s", i, workDir), callCount)
+        measure("  Filtered (isEnabledFor)", lambda i: logger.isEnabledFor(Logger.LogLevel.DEBUG), callCount)
+        measure("  Emitted (file)", lambda i: logger.info("Emitted message"), callCount)
+        measure("  Emitted (file, no caller)", lambda i: noCallerLogger.info("Emitted message"), callCount)
+        measure("  Emitted (file, JSON lines)", lambda i: jsonLogger.info("Emitted message"), callCount)
+        measure("  Rate limited (100 per call site)", lambda i: limitedLogger.warn("Limited message %d", i), callCount)
+        elapsed = measure("  Emitted (file, async enqueue)", lambda i: asyncLogger.info("Emitted message"), callCount)
+        startTime = time.perf_counter()
+        asyncLogger.flush()
+        print(f"{'  Emitted (file, async with flush)':<36}: {callCount / (elapsed + time.perf_counter() - startTime):12.0f} calls/s")
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
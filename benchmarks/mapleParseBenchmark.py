@@ -0,0 +1,112 @@
+"""
+Parse throughput benchmark for the Maple file tokenizer.
+Compares the old character loop tokenizer (before) with tokenizeLine
+and the single-pass parser (after) in MB/s.
+
+Run from the repository root:
+    python -m benchmarks.mapleParseBenchmark
+"""
+
+import time
+from src.maplex.mapleDocument import parseMaple, tokenizeLine
+
+#
+##############################
+# Old character loop tokenizer (reference for "before")
+
+def legacyRemoveWhiteSpace(strLine: str) -> str:
+
+    strLen = len(strLine)
+    ind = 0
+
+    while ind < strLen:
+
+        if strLine[ind] != " " and strLine[ind] != "\t":
+            break
+
+        ind += 1
+
+    return strLine[ind:strLen]
+
+def legacyGetTag(mapleLine: str) -> str:
+
+    if mapleLine == "":
+        return ""
+
+    mapleLine = f"{legacyRemoveWhiteSpace(mapleLine)}\n"
+
+    for ind in range(0, len(mapleLine)):
+
+        if mapleLine[ind] == " " or mapleLine[ind] == "\n" or mapleLine[ind] == "\r":
+            break
+
+    return mapleLine[:ind]
+
+def legacyGetValue(mapleLine: str) -> str:
+
+    ind = 0
+    mapleLine = legacyRemoveWhiteSpace(mapleLine)
+    strLen = len(mapleLine)
+
+    if strLen < 2:
+        return ""
+
+    for ind in range(0, strLen):
+
+        if mapleLine[ind] == " " or mapleLine[ind] == "\n" or mapleLine[ind] == "\r":
+            ind += 1
+            break
+
+    if ind >= strLen - 1:
+        return ""
+
+    return mapleLine[ind:strLen - 1]
+
+#
+##############################
+# Sample data
+
+def createSampleLines(headerCount: int = 30000, tagCount: int = 10) -> list[str]:
+
+    fileLines = ["MAPLE\n"]
+
+    for i in range(headerCount):
+
+        fileLines.append(f"H HEADER_{i}\n")
+        fileLines.append(f"    CMT Sample header {i}\n")
+
+        for j in range(tagCount):
+
+            fileLines.append(f"    TAG_{j} Sample value {i}-{j} for the parse benchmark\n")
+
+        fileLines.append("E\n")
+
+    fileLines.append("EOF\n")
+    return fileLines
+
+def measure(label: str, func, fileLines: list[str], dataSize: int) -> float:
+
+    startTime = time.perf_counter()
+    func(fileLines)
+    elapsed = time.perf_counter() - startTime
+    throughput = dataSize / elapsed / 1000000
+
+    print(f"{label:<32}: {elapsed:8.3f} s {throughput:8.2f} MB/s")
+    return throughput
+
+def runBenchmark():
+
+    fileLines = createSampleLines()
+    dataSize = sum(len(fileLine) for fileLine in fileLines)
+
+    print(f"Sample data: {len(fileLines)} lines, {dataSize / 1000000:.2f} MB")
+
+    before = measure("Before: char loop tokenizer", lambda lines: [(legacyGetTag(line), legacyGetValue(line)) for line in lines], fileLines, dataSize)
+    after = measure("After: tokenizeLine", lambda lines: [tokenizeLine(line) for line in lines], fileLines, dataSize)
+    measure("After: parseMaple (with nodes)", lambda lines: parseMaple(lines, 0), fileLines, dataSize)
+
+    print(f"Tokenizer speedup: {after / before:.1f}x")
+
+if __name__ == "__main__":
+
+    runBenchmark()
@@ -0,0 +1,49 @@
+"""
+Hot key read benchmark for MapleTree.
+Compares readMapleTag without and with the read cache.
+
+Run from the repository root:
+    python -m benchmarks.mapleReadCacheBenchmark
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from src.maplex import MapleTree
+
+def measure(label: str, mapleTree: MapleTree, readCount: int) -> float:
+
+    startTime = time.perf_counter()
+
+    for _ in range(readCount):
+
+        mapleTree.readMapleTag("PORT", "SERVICES", "API", "HTTP")
+
+    elapsed = time.perf_counter() - startTime
+
+    print(f"{label:<28}: {readCount / elapsed:12.0f} reads/s")
+    return elapsed
+
+def runBenchmark(readCount: int = 500000):
+
+    workDir = tempfile.mkdtemp(prefix="maple_cache_bench_")
+    fileName = os.path.join(workDir, "bench.mpl")
+
+    try:
+
+        mapping = {"SERVICES": {"API": {"HTTP": {f"TAG_{i}": i for i in range(100)}}}}
+        mapping["SERVICES"]["API"]["HTTP"]["PORT"] = 8080
+        MapleTree.fromDict(fileName, mapping)
+
+        uncached = measure("  Without read cache", MapleTree(fileName), readCount)
+        cached = measure("  With read cache", MapleTree(fileName, readCacheSize=128), readCount)
+        print(f"  Speedup: {uncached / cached:.1f}x")
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
@@ -0,0 +1,66 @@
+"""
+Save cost benchmark for each durability level.
+Measures MapleTree saves and MapleJson writes with
+none (in place), flush (temporary file and replace) and
+fsync (temporary file, fsync and replace).
+
+Run from the repository root:
+    python -m benchmarks.mapleSaveBenchmark
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from src.maplex import MapleJson, MapleTree
+from benchmarks.mapleDictBenchmark import createSampleDict
+
+DURABILITY_LEVELS = ("none", "flush", "fsync")
+
+def measure(label: str, func, saveCount: int) -> float:
+
+    startTime = time.perf_counter()
+
+    for i in range(saveCount):
+
+        func(i)
+
+    elapsed = time.perf_counter() - startTime
+
+    print(f"{label:<28}: {elapsed / saveCount * 1000:8.3f} ms/save")
+    return elapsed
+
+def runBenchmark(saveCount: int = 200):
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    workDir = tempfile.mkdtemp(prefix="maple_save_bench_", dir=".")
+    mapping = createSampleDict(100)
+
+    try:
+
+        for sizeLabel, sectionCount in (("small", 1), ("1000 entries", 100)):
+
+            print(f"MapleTree ({sizeLabel})")
+
+            for durability in DURABILITY_LEVELS:
+
+                fileName = os.path.join(workDir, f"bench_{durability}.mpl")
+                mapleTree = MapleTree.fromDict(fileName, dict(list(mapping.items())[:sectionCount]))
+                mapleTree.DURABILITY = durability
+                measure(f"  {durability}", lambda i: mapleTree.saveValue("COUNT", i, "SECTION_0", save=True), saveCount)
+
+        print("MapleJson (1000 entries)")
+
+        for durability in DURABILITY_LEVELS:
+
+            mapleJson = MapleJson(os.path.join(workDir, f"bench_{durability}.json"), durability=durability)
+            measure(f"  {durability}", lambda i: mapleJson.write(mapping), saveCount)
+
+    finally:
+
+        shutil.rmtree(workDir, ignore_errors=True)
+
+if __name__ == "__main__":
+
+    runBenchmark()
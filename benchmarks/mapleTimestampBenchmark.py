@@ -0,0 +1,38 @@
+"""
+Timestamp format benchmark for Logger.
+Compares datetime.now().strftime() for each record with
+the timestamp formatter that caches the text down to the second.
+
+Run from the repository root:
+    python -m benchmarks.mapleTimestampBenchmark
+"""
+
+import time
+from datetime import datetime
+from src.maplex.mapleLogger import _TimestampFormatter
+
+def measure(label: str, func, callCount: int) -> float:
+
+    startTime = time.perf_counter()
+
+    for _ in range(callCount):
+
+        func()
+
+    elapsed = time.perf_counter() - startTime
+
+    print(f"{label:<36}: {callCount / elapsed:12.0f} timestamps/s")
+    return elapsed
+
+def runBenchmark(callCount: int = 500000):
+
+    timestampFormat = "%F %X.%f"
+    formatter = _TimestampFormatter(timestampFormat)
+
+    strftime = measure("  datetime.now().strftime()", lambda: datetime.now().strftime(timestampFormat)[:-3], callCount)
+    cached = measure("  Cached timestamp formatter", formatter.format, callCount)
+    print(f"  Speedup: {strftime / cached:.1f}x")
+
+if __name__ == "__main__":
+
+    runBenchmark()
@@ -5,7 +5,9 @@ Logger: A simple logging utility for tracking events and debugging.
 
 from .mapleColors import ConsoleColors
 from .json import MapleJson, getMapleJson
-from .mapleLogger import Logger, getLogger, getDailyLogger
+from .mapleDocument import iterMaple
+from .mapleKeyRotation import rotateKeys
+from .mapleLogger import Logger, getLogger, getDailyLogger, startLogServer, stopLogServer
 from .mapleExceptions import (
     InvalidMapleFileFormatException,
     KeyEmptyException,
@@ -29,6 +31,7 @@ __all__ = [
     'getDailyLogger',
     'getMapleJson',
     'getLogger',
+    'iterMaple',
     'InvalidMapleFileFormatException',
     'KeyEmptyException',
     'MapleDataNotFoundException',
@@ -44,7 +47,10 @@ __all__ = [
     'MapleTypeException',
     'NotAMapleFileException',
     'MapleTree',
+    'rotateKeys',
     'Logger',
+    'startLogServer',
+    'stopLogServer',
     'winHide',
     'winUnHide'
 ]
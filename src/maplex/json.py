@@ -1,8 +1,11 @@
+import io
 import json
 import os
 import base64
 from cryptography.fernet import Fernet
 from . import mapleExceptions as mExc
+from .mapleCrypto import ChunkedReader, encryptChunked, getFernet, isChunked
+from .utils import DURABILITY_LEVELS, writeFileAtomic
 
 class MapleJson:
 
@@ -12,16 +15,31 @@ class MapleJson:
                  indent: int = 4,
                  ensureAscii: bool = False,
                  encrypt: bool = False,
-                 key: bytes = None
+                 key: bytes = None,
+                 durability: str = "flush",
+                 chunkSize: int | None = None
                  ) -> None:
 
+        """
+        If chunkSize is more than 0, write the encrypted file in the chunked encryption format
+        with chunkSize bytes segments, and if it is 0, write a single encrypted token.
+        If chunkSize is None, keep the format (and the chunk size) of the file read last.
+        """
+
+        if durability not in DURABILITY_LEVELS:
+
+            raise mExc.MapleValueException(f"Durability level must be one of {DURABILITY_LEVELS}: {durability}")
+
         self.filePath = filePath
         self.fileEncoding = fileEncoding
         self.indent = indent
         self.ensureAscii = ensureAscii
         self.encrypt = encrypt
         self.key = key
-        self.fernet = Fernet(key) if encrypt and key else None
+        self.fernet = getFernet(key) if encrypt and key else None
+        self.durability = durability
+        self.chunkSize = chunkSize
+        self._readChunkSize = 0
 
     #
     #####################
@@ -72,7 +90,27 @@ class MapleJson:
             raise mExc.KeyEmptyException(self.filePath)
 
         self.key = key
-        self.fernet = Fernet(key) if encrypt and key else None
+        self.fernet = getFernet(key) if encrypt and key else None
+
+    def getDurability(self) -> str:
+
+        return self.durability
+    
+    def setDurability(self, durability: str) -> None:
+
+        if durability not in DURABILITY_LEVELS:
+
+            raise mExc.MapleValueException(f"Durability level must be one of {DURABILITY_LEVELS}: {durability}")
+
+        self.durability = durability
+
+    def getChunkSize(self) -> int | None:
+
+        return self.chunkSize
+    
+    def setChunkSize(self, chunkSize: int | None) -> None:
+
+        self.chunkSize = chunkSize
 
     def getKey(self) -> bytes | None:
 
@@ -81,7 +119,7 @@ class MapleJson:
     def setKey(self, key: bytes) -> None:
 
         self.key = key
-        self.fernet = Fernet(key) if self.encrypt and key else None
+        self.fernet = getFernet(key) if self.encrypt and key else None
 
     #
     #####################
@@ -97,7 +135,17 @@ class MapleJson:
 
                 if self.encrypt and self.fernet:
 
-                    decryptedData = self.fernet.decrypt(data)
+                    if isChunked(data):
+
+                        chunkedReader = ChunkedReader(io.BytesIO(data), self.key)
+                        decryptedData = b"".join(chunkedReader.readChunks())
+                        self._readChunkSize = chunkedReader.chunkSize
+
+                    else:
+
+                        decryptedData = self.fernet.decrypt(data)
+                        self._readChunkSize = 0
+
                     jsonData = json.loads(decryptedData.decode(self.fileEncoding))
 
                 else:
@@ -138,17 +186,17 @@ class MapleJson:
 
             if self.encrypt and self.fernet:
 
-                encryptedData = self.fernet.encrypt(jsonData)
+                chunkSize = self._readChunkSize if self.chunkSize is None else self.chunkSize
 
-                with open(self.filePath, 'wb') as file:
+                if chunkSize > 0:
 
-                    file.write(encryptedData)
+                    jsonData = encryptChunked(jsonData, self.key, chunkSize)
 
-            else:
+                else:
 
-                with open(self.filePath, 'wb') as file:
+                    jsonData = self.fernet.encrypt(jsonData)
 
-                    file.write(jsonData)
+            writeFileAtomic(self.filePath, jsonData, self.durability)
 
         except Exception as e:
 
@@ -176,7 +224,7 @@ class MapleJson:
         if setAsCurrent:
 
             self.key = key
-            self.fernet = Fernet(key)
+            self.fernet = getFernet(key)
             self.encrypt = True
 
         return key
@@ -190,7 +238,9 @@ def getMapleJson(filePath: str,
                   indent: int = 4,
                   ensureAscii: bool = False,
                   encrypt: bool = False,
-                  key: bytes = None
+                  key: bytes = None,
+                  durability: str = "flush",
+                  chunkSize: int | None = None
                   ) -> MapleJson:
 
     if filePath not in _json:
@@ -200,6 +250,8 @@ def getMapleJson(filePath: str,
                                     indent,
                                     ensureAscii,
                                     encrypt,
-                                    key)
+                                    key,
+                                    durability,
+                                    chunkSize)
 
     return _json[filePath]
\ No newline at end of file
@@ -0,0 +1,322 @@
+import base64
+import functools
+import hashlib
+import io
+import os
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from . import mapleExceptions as mExc
+from .utils import writeFileAtomic
+
+#
+#################################
+# Cipher cache
+
+# Number of keys (or key lists) whose Fernet instances are kept.
+# The least recently used instances are dropped so that old keys are not kept for the life of the process.
+
+FERNET_CACHE_SIZE = 32
+
+def keyList(key: bytes | str | list | tuple) -> list:
+
+    """Return the keys as a list (a list or tuple of keys is used during key rotation)"""
+
+    return list(key) if isinstance(key, (list, tuple)) else [key]
+
+def getFernet(key: bytes | str | list | tuple) -> Fernet | MultiFernet:
+
+    """Return the Fernet instance of the key.\n
+    For a list of keys, return MultiFernet that encrypts with the first key
+    and decrypts with any of the keys."""
+
+    return _cachedFernet(tuple(key) if isinstance(key, list) else key)
+
+@functools.lru_cache(maxsize=FERNET_CACHE_SIZE)
+def _cachedFernet(key: bytes | str | tuple) -> Fernet | MultiFernet:
+
+    """Build the Fernet instance (building Fernet decodes and splits the key every time)"""
+
+    if isinstance(key, tuple):
+
+        return MultiFernet([Fernet(fernetKey) for fernetKey in key])
+
+    return Fernet(key)
+
+#
+#################################
+# Chunked encryption format
+#
+# Header: magic "MPLC", version (1 byte), chunk size (4 bytes), salt (16 bytes)
+# Segments: nonce (12 bytes), AES-GCM encrypted chunk and tag (chunk size + 16 bytes)
+#
+# Every segment has chunk size bytes of data except the last one.
+# The segment AAD is the header, the segment index and the last segment flag,
+# so segments cannot be reordered, removed or cut off.
+# The AES-256 key is derived from the Fernet key and the salt with HKDF.
+
+CHUNK_MAGIC = b"MPLC"
+CHUNK_VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_chunkHeaderStruct = struct.Struct(">4sBI16s")
+_segmentAadStruct = struct.Struct(">Q?")
+_NONCE_SIZE = 12
+_TAG_SIZE = 16
+
+def isChunked(data: bytes) -> bool:
+
+    """Return True if the data starts with the chunked encryption header"""
+
+    return data[:len(CHUNK_MAGIC)] == CHUNK_MAGIC
+
+def _chunkCipher(key: bytes | str, salt: bytes) -> AESGCM:
+
+    """Return the AES-GCM cipher for the Fernet key and the file salt"""
+
+    keyMaterial = base64.urlsafe_b64decode(keyList(key)[0])
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"maplex chunked encryption v1")
+    return AESGCM(hkdf.derive(keyMaterial))
+
+def _chunkDigest(chunk: bytes, isLast: bool) -> bytes:
+
+    """Return the digest to find changed chunks"""
+
+    return hashlib.blake2b(chunk, digest_size=16, person=b"last" if isLast else b"").digest()
+
+class ChunkedWriter:
+
+    """Encrypt data to the chunked encryption format"""
+
+    def __init__(self, key: bytes | str, chunkSize: int = DEFAULT_CHUNK_SIZE, salt: bytes | None = None) -> None:
+
+        if chunkSize <= 0:
+
+            raise mExc.MapleValueException(f"Chunk size must be more than 0: {chunkSize}")
+
+        self.chunkSize = chunkSize
+        self.salt = os.urandom(16) if salt is None else salt
+        self.header = _chunkHeaderStruct.pack(CHUNK_MAGIC, CHUNK_VERSION, chunkSize, self.salt)
+        self.segmentSize = _NONCE_SIZE + chunkSize + _TAG_SIZE
+        self._cipher = _chunkCipher(key, self.salt)
+
+    def encryptSegment(self, index: int, chunk: bytes, isLast: bool) -> bytes:
+
+        """Return the encrypted segment of the chunk"""
+
+        nonce = os.urandom(_NONCE_SIZE)
+        return nonce + self._cipher.encrypt(nonce, chunk, self.header + _segmentAadStruct.pack(index, isLast))
+
+    def splitChunks(self, data: bytes) -> list[bytes]:
+
+        """Split data into chunks (at least one chunk)"""
+
+        chunkSize = self.chunkSize
+        return [data[pos:pos + chunkSize] for pos in range(0, len(data), chunkSize)] or [b""]
+
+    def encrypt(self, data: bytes) -> bytes:
+
+        """Return the whole encrypted data"""
+
+        chunks = self.splitChunks(data)
+        lastIndex = len(chunks) - 1
+        return b"".join([self.header, *(self.encryptSegment(index, chunk, index == lastIndex) for index, chunk in enumerate(chunks))])
+
+class ChunkedReader(io.RawIOBase):
+
+    """Readable binary stream that decrypts the chunked encryption format segment by segment.
+    digests keeps the digests of the read chunks for rewriting only the changed segments.
+    If key is a list of keys, the key that decrypts the first segment is used (set to key)."""
+
+    def __init__(self, stream: io.BufferedIOBase, key: bytes | str | list | tuple) -> None:
+
+        super().__init__()
+        header = stream.read(_chunkHeaderStruct.size)
+
+        if len(header) < _chunkHeaderStruct.size:
+
+            raise mExc.InvalidMapleFileFormatException(message="Chunked encryption header is broken")
+
+        magic, version, chunkSize, salt = _chunkHeaderStruct.unpack(header)
+
+        if magic != CHUNK_MAGIC or version != CHUNK_VERSION:
+
+            raise mExc.InvalidMapleFileFormatException(message="Unsupported chunked encryption format")
+
+        self.header = header
+        self.chunkSize = chunkSize
+        self.salt = salt
+        self.segmentSize = _NONCE_SIZE + chunkSize + _TAG_SIZE
+        self._stream = stream
+        self._ciphers = [(fernetKey, _chunkCipher(fernetKey, salt)) for fernetKey in keyList(key)]
+        self.key = None
+        self._index = 0
+        self._nextSegment = stream.read(self.segmentSize)
+        self._buffer = b""
+        self._bufferPos = 0
+        self._finished = False
+        self.digests: list[bytes] = []
+
+    def readable(self) -> bool:
+
+        return True
+
+    def close(self) -> None:
+
+        """Close the reader and the encrypted stream"""
+
+        if not self.closed:
+
+            self._stream.close()
+
+        super().close()
+
+    def readSegment(self) -> bytes | None:
+
+        """Decrypt and return the next chunk, or None after the last chunk"""
+
+        if self._finished:
+
+            return None
+
+        segment = self._nextSegment
+
+        if len(segment) < _NONCE_SIZE + _TAG_SIZE:
+
+            raise mExc.InvalidMapleFileFormatException(message="Chunked encrypted data is cut off")
+
+        # Look ahead to know if this is the last segment
+
+        self._nextSegment = self._stream.read(self.segmentSize) if len(segment) == self.segmentSize else b""
+        isLast = self._nextSegment == b""
+
+        segmentAad = self.header + _segmentAadStruct.pack(self._index, isLast)
+
+        for fernetKey, cipher in self._ciphers:
+
+            try:
+
+                chunk = cipher.decrypt(segment[:_NONCE_SIZE], segment[_NONCE_SIZE:], segmentAad)
+                break
+
+            except InvalidTag:
+
+                continue
+
+        else:
+
+            raise mExc.MapleException(f"Chunked encrypted data is broken or the key is wrong (segment {self._index})")
+
+        # Use the key of the file for the rest of segments
+
+        self._ciphers = [(fernetKey, cipher)]
+        self.key = fernetKey
+
+        self._index += 1
+        self._finished = isLast
+        self.digests.append(_chunkDigest(chunk, isLast))
+        return chunk
+
+    def readinto(self, buffer) -> int:
+
+        while self._bufferPos >= len(self._buffer):
+
+            chunk = self.readSegment()
+
+            if chunk is None:
+
+                return 0
+
+            self._buffer = chunk
+            self._bufferPos = 0
+
+        readSize = min(len(buffer), len(self._buffer) - self._bufferPos)
+        buffer[:readSize] = self._buffer[self._bufferPos:self._bufferPos + readSize]
+        self._bufferPos += readSize
+        return readSize
+
+    def readChunks(self) -> list[bytes]:
+
+        """Decrypt and return all remaining chunks"""
+
+        chunks = []
+
+        while (chunk := self.readSegment()) is not None:
+
+            chunks.append(chunk)
+
+        return chunks
+
+def encryptChunked(data: bytes, key: bytes | str, chunkSize: int = DEFAULT_CHUNK_SIZE) -> bytes:
+
+    """Encrypt data to the chunked encryption format"""
+
+    return ChunkedWriter(key, chunkSize).encrypt(data)
+
+def decryptChunked(data: bytes, key: bytes | str) -> bytes:
+
+    """Decrypt the chunked encryption format data"""
+
+    return b"".join(ChunkedReader(io.BytesIO(data), key).readChunks())
+
+def openDecrypted(stream: io.BufferedReader, key: bytes | str, encoding: str | None = "utf-8") -> tuple[io.TextIOWrapper, ChunkedReader | None]:
+
+    """
+    Return a text stream of the encrypted file stream and the chunked reader.\n
+    Chunked encryption files are decrypted segment by segment while they are read
+    (the chunked reader is None for single Fernet token files).
+    """
+
+    if isChunked(stream.peek(len(CHUNK_MAGIC))):
+
+        chunkedReader = ChunkedReader(stream, key)
+        return io.TextIOWrapper(io.BufferedReader(chunkedReader), encoding=encoding), chunkedReader
+
+    return io.TextIOWrapper(io.BytesIO(getFernet(key).decrypt(stream.read())), encoding=encoding), None
+
+#
+#################################
+# Save chunked file
+
+def writeChunked(filePath: str, data: bytes, key: bytes | str, chunkSize: int = DEFAULT_CHUNK_SIZE, durability: str = "flush", previous: tuple[bytes, list[bytes]] | None = None) -> tuple[bytes, list[bytes]]:
+
+    """
+    Save data to filePath in the chunked encryption format.\n
+    previous is (salt, chunk digests) returned by the last read or write of the file.
+    If durability is none and previous is given, only the changed segments are
+    rewritten in place. Otherwise the whole file is written with writeFileAtomic.\n
+    Return (salt, chunk digests) for the next save.
+    """
+
+    if previous is not None and durability == "none" and os.path.isfile(filePath):
+
+        salt, digests = previous
+        writer = ChunkedWriter(key, chunkSize, salt)
+        chunks = writer.splitChunks(data)
+        lastIndex = len(chunks) - 1
+        newDigests = [_chunkDigest(chunk, index == lastIndex) for index, chunk in enumerate(chunks)]
+
+        with open(filePath, "r+b") as f:
+
+            if f.read(len(writer.header)) == writer.header:
+
+                for index, chunk in enumerate(chunks):
+
+                    if index < len(digests) and digests[index] == newDigests[index]:
+
+                        continue
+
+                    f.seek(len(writer.header) + index * writer.segmentSize)
+                    f.write(writer.encryptSegment(index, chunk, index == lastIndex))
+
+                f.truncate(len(writer.header) + lastIndex * writer.segmentSize + _NONCE_SIZE + len(chunks[lastIndex]) + _TAG_SIZE)
+                return salt, newDigests
+
+    writer = ChunkedWriter(key, chunkSize)
+    chunks = writer.splitChunks(data)
+    lastIndex = len(chunks) - 1
+    writeFileAtomic(filePath, b"".join([writer.header, *(writer.encryptSegment(index, chunk, index == lastIndex) for index, chunk in enumerate(chunks))]), durability)
+    return writer.salt, [_chunkDigest(chunk, index == lastIndex) for index, chunk in enumerate(chunks)]
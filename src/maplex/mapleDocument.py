@@ -0,0 +1,818 @@
+import itertools
+import json
+import re
+from collections.abc import Iterator
+from . import mapleExceptions as mExc
+from .mapleCrypto import openDecrypted
+
+# Keys for lines that cannot be looked up by tag (duplicates, comment blocks)
+
+_lineKeys = itertools.count()
+
+# H, E and EOF tags and comment block end lines in a file buffer (after a line feed)
+
+_structureTagPattern = re.compile(rb"\n[ \t]*+(H|E|EOF)(?=[ \r\n]|\Z)")
+_commentEndLinePattern = re.compile(rb"\n[ \t]*+E \*#[ \t\r]*+(?=\n|\Z)")
+
+##################################
+# Tag line node
+
+class MapleLine:
+
+    """A tag line in a header block.
+    converted keeps (value type, converted value) of the last typed read."""
+
+    __slots__ = ("tag", "value", "converted")
+
+    def __init__(self, tag: str, value: str) -> None:
+
+        self.tag = tag
+        self.value = value
+        self.converted: tuple | None = None
+
+    def render(self) -> str:
+
+        """Return the line string without indentation."""
+
+        if self.value == "":
+
+            return self.tag
+
+        return f"{self.tag} {self.value}"
+
+#
+##################################
+# Comment block node
+
+class MapleCommentBlock:
+
+    """A comment block from "H #*" to "E *#".
+    The lines inside the block are kept as they are."""
+
+    __slots__ = ("value", "lines")
+
+    def __init__(self, value: str, lines: list[str]) -> None:
+
+        self.value = value
+        self.lines = lines
+
+#
+##################################
+# Header block node
+
+class MapleHeader:
+
+    """A header block.
+    children maps a tag to its MapleLine and "H <name>" to its MapleHeader.
+    Duplicated tags, duplicated headers and comment blocks are kept in order
+    with an integer key so that they are saved back as they are.
+    rendered keeps (tab format, rendered block lines) until the block is changed.
+    source keeps (file buffer, content parts) of a block that is not loaded yet,
+    and the children are loaded from the buffer when they are accessed first."""
+
+    __slots__ = ("name", "parent", "_children", "rendered", "source")
+
+    def __init__(self, name: str | None = None, parent: "MapleHeader | None" = None) -> None:
+
+        self.name = name
+        self.parent = parent
+        self._children: dict = {}
+        self.rendered: tuple[str, str] | None = None
+        self.source: tuple[bytes, list] | None = None
+
+    @property
+    def children(self) -> dict:
+
+        if self.source is not None:
+
+            _loadSource(self)
+
+        return self._children
+
+    @children.setter
+    def children(self, children: dict) -> None:
+
+        self.source = None
+        self._children = children
+
+    def touch(self) -> None:
+
+        """Drop the rendered lines of this block and its parent blocks."""
+
+        node = self
+
+        while node is not None and node.rendered is not None:
+
+            node.rendered = None
+            node = node.parent
+
+    def getHeader(self, name: str) -> "MapleHeader | None":
+
+        """Return the child header or None."""
+
+        return self.children.get(f"H {name}")
+
+    def addHeader(self, name: str) -> "MapleHeader":
+
+        """Append a new child header and return it."""
+
+        header = MapleHeader(name, self)
+        key = f"H {name}"
+
+        if key in self.children:
+
+            key = next(_lineKeys)
+
+        self.children[key] = header
+        self.touch()
+        return header
+
+    def removeHeader(self, name: str) -> bool:
+
+        """Remove the child header. Return False if it does not exist."""
+
+        key = f"H {name}"
+
+        if self.children.pop(key, None) is None:
+
+            return False
+
+        self.__promoteDuplicate(key, lambda child: type(child) is MapleHeader and child.name == name)
+        self.touch()
+        return True
+
+    def getLine(self, tag: str) -> MapleLine | None:
+
+        """Return the tag line or None."""
+
+        line = self.children.get(tag)
+
+        if type(line) is MapleLine:
+
+            return line
+
+        return None
+
+    def addLine(self, tag: str, value: str) -> MapleLine:
+
+        """Append a new tag line and return it."""
+
+        line = MapleLine(tag, value)
+        key = tag
+
+        if key in self.children or " " in key:
+
+            key = next(_lineKeys)
+
+        self.children[key] = line
+        self.touch()
+        return line
+
+    def setValue(self, tag: str, value: str) -> None:
+
+        """Overwrite the tag line value or append a new tag line."""
+
+        line = self.getLine(tag)
+
+        if line is None:
+
+            self.addLine(tag, value)
+
+        else:
+
+            # Replace the line so that the old line is kept as it was
+
+            self.children[tag] = MapleLine(tag, value)
+            self.touch()
+
+    def removeLine(self, tag: str) -> bool:
+
+        """Remove the tag line. Return False if it does not exist."""
+
+        if self.getLine(tag) is None:
+
+            return False
+
+        del self.children[tag]
+        self.__promoteDuplicate(tag, lambda child: type(child) is MapleLine and child.tag == tag)
+        self.touch()
+        return True
+
+    def __promoteDuplicate(self, key: str, isDuplicate) -> None:
+
+        """Move the first duplicate (kept with an integer key) to the removed key
+        so that it can be looked up next. The order of the children is kept."""
+
+        children = self._children
+        duplicateKey = next((childKey for childKey, child in children.items() if type(childKey) is int and isDuplicate(child)), None)
+
+        if duplicateKey is not None:
+
+            self._children = {key if childKey == duplicateKey else childKey: child for childKey, child in children.items()}
+
+    def addCommentBlock(self, commentBlock: MapleCommentBlock) -> None:
+
+        """Append a comment block."""
+
+        self.children[next(_lineKeys)] = commentBlock
+        self.touch()
+
+    def clear(self) -> None:
+
+        """Remove all children."""
+
+        self.source = None
+        self._children.clear()
+        self.touch()
+
+#
+#################################
+# Load dictionary
+
+# Tags that cannot be data tags (comment tags are not read back as data)
+
+_RESERVED_TAGS = frozenset(("H", "E", "EOF", "CMT"))
+
+def _checkDictText(text: str, fileName: str) -> None:
+
+    """Raise MapleSyntaxException if the key or value would break the line"""
+
+    if "\n" in text or "\r" in text:
+
+        raise mExc.MapleSyntaxException(f"Key or value cannot contain a line break: [{text!r}] in {fileName}")
+
+def loadDict(header: MapleHeader, mapping: dict, fileName: str = "") -> None:
+
+    """Append the mapping to the header block in a single pass.\n
+    dict values become header blocks, list and tuple values become
+    "*NOTES" blocks, and other values become tag lines.\n
+    Raise MapleSyntaxException for reserved tags, headers starting with "#" or "*"
+    and keys or values with line breaks."""
+
+    for key, value in mapping.items():
+
+        key = f"{key}"
+        _checkDictText(key, fileName)
+
+        if isinstance(value, dict):
+
+            if key[:1] in ("#", "*"):
+
+                raise mExc.MapleSyntaxException(f"Header cannot start with '#' or '*': [{key}] in {fileName}")
+
+            loadDict(header.addHeader(key), value, fileName)
+
+        elif isinstance(value, (list, tuple)):
+
+            notesHeader = header.addHeader(f"*NOTES {key}")
+
+            for noteValue in value:
+
+                noteValue = f"{noteValue}"
+                _checkDictText(noteValue, fileName)
+                notesHeader.addLine("NTE", noteValue)
+
+        elif key == "" or " " in key or "\t" in key:
+
+            raise mExc.MapleSyntaxException(f"Tag cannot be empty or contain white space: [{key}] in {fileName}")
+
+        elif key in _RESERVED_TAGS or key[0] == "#":
+
+            raise mExc.MapleSyntaxException(f"Tag is reserved for the Maple file format: [{key}] in {fileName}")
+
+        else:
+
+            value = f"{value}"
+            _checkDictText(value, fileName)
+            header.addLine(key, value)
+
+#
+#################################
+# Dump dictionary
+
+def dumpDict(header: MapleHeader) -> dict:
+
+    """Return the header block as a nested dictionary.\n
+    Header blocks become dict values, "*NOTES" blocks become lists of notes
+    and comment lines and comment blocks are ignored."""
+
+    retDic = {}
+
+    for child in header.children.values():
+
+        if type(child) is MapleLine:
+
+            if child.tag == "" or child.tag == "CMT" or child.tag[0] == "#":
+
+                # Ignore comment line
+
+                continue
+
+            retDic[child.tag] = child.value
+
+        elif type(child) is MapleHeader:
+
+            if child.name.startswith("*NOTES "):
+
+                retDic[child.name[7:]] = [line.value for line in child.children.values() if type(line) is MapleLine and line.tag == "NTE"]
+
+            else:
+
+                retDic[child.name] = dumpDict(child)
+
+    return retDic
+
+#
+#################################
+# Tokenize line
+
+def tokenizeLine(mapleLine: str) -> tuple[str, str, str]:
+
+    """Split a data line into (indent, tag, value) at once.\n
+    The tag is the string before the first white space,
+    and the value is the string after it without the line break."""
+
+    lineContent = mapleLine.rstrip("\r\n")
+    lineBody = lineContent.lstrip(" \t")
+    mapleTag, _, lineValue = lineBody.partition(" ")
+
+    return lineContent[:len(lineContent) - len(lineBody)], mapleTag, lineValue
+
+#
+#################################
+# Check comment block end
+
+def isCommentEnd(mapleLine: str) -> bool:
+
+    """Return True if the line closes a comment block."""
+
+    return mapleLine.strip(" \t\r\n") == "E *#"
+
+#
+#################################
+# Typed values
+
+_trueValues = frozenset(("true", "yes", "on", "1"))
+_falseValues = frozenset(("false", "no", "off", "0"))
+
+def parseBool(value: str) -> bool:
+
+    """Convert true/false, yes/no, on/off or 1/0 (case insensitive) to bool"""
+
+    lowerValue = value.strip().lower()
+
+    if lowerValue in _trueValues:
+
+        return True
+
+    if lowerValue in _falseValues:
+
+        return False
+
+    raise ValueError(f"invalid literal for bool: '{value}'")
+
+# Value types for typed reads ("json" for any JSON value)
+
+_valueConverters = {
+    int: int,
+    float: float,
+    bool: parseBool,
+    str: str,
+    "json": json.loads
+}
+
+def convertValue(line: MapleLine, valueType: type | str) -> any:
+
+    """Return the line value converted to valueType.
+    The converted value is kept in the line until the line is replaced."""
+
+    converted = line.converted
+
+    if converted is not None and converted[0] == valueType:
+
+        return converted[1]
+
+    try:
+
+        converter = _valueConverters[valueType]
+
+    except KeyError as ke:
+
+        raise mExc.MapleTypeException(message=f"Unsupported value type: {valueType}") from ke
+
+    value = converter(line.value)
+    line.converted = (valueType, value)
+    return value
+
+def formatValue(value: any) -> tuple[type | str, str]:
+
+    """Return (value type, line value string) to save the value.
+    bool, int, float and str values are saved as they are, and others as JSON."""
+
+    valueType = type(value)
+
+    if valueType in (bool, int, float, str):
+
+        return valueType, f"{value}"
+
+    return "json", json.dumps(value, ensure_ascii=False)
+
+#
+#################################
+# Parse Maple lines
+
+def parseMaple(fileLines: list[str], mapleIndex: int, fileName: str = "") -> tuple[MapleHeader, int]:
+
+    """Parse Maple data lines after the MAPLE line in a single pass.\n
+    Return the root header block and the EOF line index."""
+
+    root = MapleHeader()
+    node = root
+    lineInd = mapleIndex
+    lineCount = len(fileLines)
+
+    while lineInd < lineCount - 1:
+
+        lineInd += 1
+
+        # Tokenize the line once (same as tokenizeLine)
+
+        mapleTag, _, lineValue = fileLines[lineInd].rstrip("\r\n").lstrip(" \t").partition(" ")
+
+        if mapleTag == "H":
+
+            if lineValue[:2] == "#*":
+
+                # Keep comment block lines as they are
+
+                blockStart = lineInd
+
+                while True:
+
+                    lineInd += 1
+
+                    if lineInd >= lineCount:
+
+                        raise mExc.InvalidMapleFileFormatException(fileName)
+
+                    if isCommentEnd(fileLines[lineInd]):
+
+                        break
+
+                node.addCommentBlock(MapleCommentBlock(lineValue, fileLines[blockStart + 1:lineInd + 1]))
+
+            else:
+
+                node = node.addHeader(lineValue)
+
+        elif mapleTag == "E":
+
+            if node.parent is None:
+
+                raise mExc.InvalidMapleFileFormatException(fileName)
+
+            node = node.parent
+
+        elif mapleTag == "EOF":
+
+            if node is not root:
+
+                raise mExc.InvalidMapleFileFormatException(fileName, "EOF tag in the middle of the data")
+
+            return root, lineInd
+
+        elif mapleTag in node._children:
+
+            node.addLine(mapleTag, lineValue)
+
+        else:
+
+            # New tag in the header (same as addLine)
+
+            node._children[mapleTag] = MapleLine(mapleTag, lineValue)
+
+    raise mExc.InvalidMapleFileFormatException(fileName)
+
+#
+#################################
+# Index Maple buffer
+
+def indexMaple(buffer: bytes, dataStart: int, fileName: str = "") -> tuple[MapleHeader, int]:
+
+    """Build header blocks from the H and E lines of a file buffer
+    (bytes or mmap) without reading tag lines.\n
+    dataStart is the offset after the MAPLE line.
+    Return the root header block and the EOF line offset.
+    Tag lines are decoded from the buffer when the header block is accessed first."""
+
+    root = MapleHeader()
+    blockStack = [(root, [], dataStart)]
+    bufferSize = len(buffer)
+    pos = dataStart
+
+    while True:
+
+        # Search from the line feed before the line
+
+        tagMatch = _structureTagPattern.search(buffer, pos - 1)
+
+        if tagMatch is None:
+
+            raise mExc.InvalidMapleFileFormatException(fileName)
+
+        mapleTag = tagMatch.group(1)
+        lineStart = tagMatch.start() + 1
+        lineEnd = buffer.find(b"\n", tagMatch.end())
+
+        if lineEnd < 0:
+
+            lineEnd = bufferSize
+
+        pos = lineEnd + 1
+
+        if mapleTag == b"H":
+
+            lineValue = buffer[tagMatch.end() + 1:lineEnd].rstrip(b"\r").decode()
+
+            if lineValue[:2] == "#*":
+
+                # Comment block is a part of the content
+
+                endMatch = _commentEndLinePattern.search(buffer, pos - 1)
+
+                if endMatch is None:
+
+                    raise mExc.InvalidMapleFileFormatException(fileName)
+
+                pos = endMatch.end() + 1
+                continue
+
+            node, contentParts, contentStart = blockStack[-1]
+            childNode = MapleHeader(lineValue, node)
+            contentParts.append((contentStart, lineStart))
+            contentParts.append(childNode)
+            blockStack.append((childNode, [], pos))
+
+        elif mapleTag == b"E":
+
+            if len(blockStack) < 2:
+
+                raise mExc.InvalidMapleFileFormatException(fileName)
+
+            childNode, contentParts, contentStart = blockStack.pop()
+            contentParts.append((contentStart, lineStart))
+            childNode.source = (buffer, contentParts)
+            node, contentParts, _ = blockStack[-1]
+            blockStack[-1] = (node, contentParts, pos)
+
+        else:
+
+            if len(blockStack) > 1:
+
+                raise mExc.InvalidMapleFileFormatException(fileName, "EOF tag in the middle of the data")
+
+            _, contentParts, contentStart = blockStack[0]
+            contentParts.append((contentStart, lineStart))
+            root.source = (buffer, contentParts)
+
+            return root, lineStart
+
+#
+#################################
+# Load header block from buffer
+
+def _loadSource(header: MapleHeader) -> None:
+
+    """Decode the tag lines of the header block from its buffer"""
+
+    buffer, contentParts = header.source
+    header.source = None
+    children = header._children
+
+    for contentPart in contentParts:
+
+        if type(contentPart) is MapleHeader:
+
+            key = f"H {contentPart.name}"
+
+            if key in children:
+
+                key = next(_lineKeys)
+
+            children[key] = contentPart
+            continue
+
+        contentStart, contentEnd = contentPart
+
+        if contentStart >= contentEnd:
+
+            continue
+
+        fileLines = buffer[contentStart:contentEnd].decode().splitlines(keepends=True)
+        lineInd = -1
+
+        while lineInd < len(fileLines) - 1:
+
+            lineInd += 1
+            _, mapleTag, lineValue = tokenizeLine(fileLines[lineInd])
+
+            if mapleTag == "H":
+
+                # Comment block (other headers are not in the content)
+
+                blockStart = lineInd
+
+                while not isCommentEnd(fileLines[lineInd]):
+
+                    lineInd += 1
+
+                commentLines = [f"{commentLine.rstrip(chr(13) + chr(10))}\n" for commentLine in fileLines[blockStart + 1:lineInd + 1]]
+                children[next(_lineKeys)] = MapleCommentBlock(lineValue, commentLines)
+
+            elif mapleTag in children:
+
+                children[next(_lineKeys)] = MapleLine(mapleTag, lineValue)
+
+            else:
+
+                children[mapleTag] = MapleLine(mapleTag, lineValue)
+
+#
+#################################
+# Stream Maple file
+
+def iterMaple(fileName: str, *headers: str, encoding: str | None = None, key: bytes | None = None) -> Iterator[tuple[tuple[str, ...], str, str]]:
+
+    """Read a Maple file line by line and yield (header path, tag, value)
+    for each tag line without loading the whole file.\n
+    If headers are given, yield only the tag lines in the header block
+    (including its child blocks) and stop reading as soon as its E line is read.\n
+    If key is given, read the encrypted file. Chunked encryption files are
+    decrypted only up to the segment that has the E line of the header block.\n
+    Comment lines and comment blocks are skipped."""
+
+    headers = tuple(headers)
+    targetDepth = len(headers)
+
+    try:
+
+        if key is None:
+
+            mapleFile = open(fileName, "r", encoding=encoding)
+
+        else:
+
+            encryptedFile = open(fileName, "rb")
+
+            try:
+
+                mapleFile, chunkedReader = openDecrypted(encryptedFile, key, encoding or "utf-8")
+
+            except BaseException:
+
+                encryptedFile.close()
+                raise
+
+            if chunkedReader is None:
+
+                # The whole data has been decrypted
+
+                encryptedFile.close()
+
+    except FileNotFoundError as fnfe:
+
+        raise mExc.MapleFileNotFoundException(fileName) from fnfe
+
+    except mExc.MapleException:
+
+        raise
+
+    except Exception as ex:
+
+        raise mExc.MapleException(ex) from ex
+
+    with mapleFile:
+
+        # Search data region
+
+        for fileLine in mapleFile:
+
+            if fileLine == "MAPLE\n":
+
+                break
+
+        else:
+
+            raise mExc.NotAMapleFileException(fileName)
+
+        headerPath = ()
+        isFound = targetDepth == 0
+        inCommentBlock = False
+
+        for fileLine in mapleFile:
+
+            if inCommentBlock:
+
+                # Skip comment block lines
+
+                inCommentBlock = not isCommentEnd(fileLine)
+                continue
+
+            mapleTag, _, lineValue = fileLine.rstrip("\r\n").lstrip(" \t").partition(" ")
+
+            if mapleTag == "H":
+
+                if lineValue[:2] == "#*":
+
+                    inCommentBlock = True
+                    continue
+
+                headerPath += (lineValue,)
+
+                if headerPath == headers:
+
+                    isFound = True
+
+            elif mapleTag == "E":
+
+                if len(headerPath) == 0:
+
+                    raise mExc.InvalidMapleFileFormatException(fileName)
+
+                if targetDepth > 0 and headerPath == headers:
+
+                    # The header block has been read
+
+                    return
+
+                headerPath = headerPath[:-1]
+
+            elif mapleTag == "EOF":
+
+                if len(headerPath) > 0:
+
+                    raise mExc.InvalidMapleFileFormatException(fileName, "EOF tag in the middle of the data")
+
+                if not isFound:
+
+                    raise mExc.MapleHeaderNotFoundException(fileName, headers[-1])
+
+                return
+
+            elif mapleTag == "" or mapleTag == "CMT" or mapleTag[0] == "#":
+
+                # Ignore comment line
+
+                continue
+
+            elif headerPath[:targetDepth] == headers:
+
+                yield headerPath, mapleTag, lineValue
+
+    raise mExc.InvalidMapleFileFormatException(fileName)
+
+#
+#################################
+# Render Maple lines
+
+def renderMaple(header: MapleHeader, tabFormat: str, depth: int = 0) -> str:
+
+    """Render the children of the header block to indented lines.\n
+    Unchanged child blocks reuse their rendered lines,
+    so only the changed blocks are indented again."""
+
+    rendered = header.rendered
+
+    if rendered is not None and rendered[0] == tabFormat:
+
+        return rendered[1]
+
+    indent = tabFormat * depth
+    fileLines = []
+
+    for child in header.children.values():
+
+        if type(child) is MapleLine:
+
+            fileLines.append(f"{indent}{child.render()}\n")
+
+        elif type(child) is MapleHeader:
+
+            fileLines.append(f"{indent}H {child.name}\n")
+            fileLines.append(renderMaple(child, tabFormat, depth + 1))
+            fileLines.append(f"{indent}E\n")
+
+        else:
+
+            fileLines.append(f"{indent}H {child.value}\n")
+            fileLines.extend(child.lines)
+
+    renderedLines = "".join(fileLines)
+
+    if header.parent is not None:
+
+        # The root block is joined on every save and not kept
+
+        header.rendered = (tabFormat, renderedLines)
+
+    return renderedLines
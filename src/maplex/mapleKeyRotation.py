@@ -0,0 +1,308 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from cryptography.fernet import InvalidToken
+from . import mapleExceptions as mExc
+from .mapleCrypto import ChunkedReader, encryptChunked, getFernet, isChunked, keyList
+from .utils import lockFile, unlockFile, writeFileAtomic
+
+# Seconds to wait for the lock of each file
+
+DEFAULT_LOCK_TIMEOUT = 60.0
+
+# Journal line prefix of failed files (failed files are not skipped)
+
+JOURNAL_FAILED_PREFIX = "#FAILED "
+
+#
+#################################
+# Rotate file key
+
+def rotateFileKey(filePath: str, oldKey: bytes | list[bytes], newKey: bytes, durability: str = "fsync", lockTimeout: float | None = DEFAULT_LOCK_TIMEOUT) -> bool:
+
+    """
+    Re-encrypt the encrypted Maple or JSON file with newKey.\n
+    oldKey can be a list of keys. Both the single token format and
+    the chunked encryption format are supported, and the format is kept.\n
+    Return False if the file is already encrypted with newKey.\n
+    The exclusive lock on "<filePath>.lock" is held while the file is read and rewritten,
+    so the rotation waits for MapleTree instances that hold the lock.
+    Raise MapleFileLockedException if the lock is not taken in lockTimeout seconds (None waits forever).
+    The lock file is kept, as the lock files of MapleTree are.
+    """
+
+    if not os.path.isfile(filePath):
+
+        raise mExc.MapleFileNotFoundException(filePath)
+
+    lockFd = lockFile(f"{filePath}.lock", exclusive=True, timeout=lockTimeout)
+
+    if lockFd is None:
+
+        raise mExc.MapleFileLockedException(filePath, f"The file is locked for more than {lockTimeout} s")
+
+    try:
+
+        return _rotateLockedFile(filePath, oldKey, newKey, durability)
+
+    finally:
+
+        unlockFile(lockFd)
+
+def _rotateLockedFile(filePath: str, oldKey: bytes | list[bytes], newKey: bytes, durability: str) -> bool:
+
+    """Re-encrypt the file while the caller holds the file lock"""
+
+    try:
+
+        with open(filePath, "rb") as f:
+
+            fileData = f.read()
+
+    except FileNotFoundError as fnfe:
+
+        raise mExc.MapleFileNotFoundException(filePath) from fnfe
+
+    if isChunked(fileData):
+
+        # Check the first segment with the new key
+
+        try:
+
+            ChunkedReader(io.BytesIO(fileData), newKey).readSegment()
+            return False
+
+        except mExc.MapleException:
+
+            pass
+
+        chunkedReader = ChunkedReader(io.BytesIO(fileData), oldKey)
+        fileData = encryptChunked(b"".join(chunkedReader.readChunks()), newKey, chunkedReader.chunkSize)
+
+    else:
+
+        try:
+
+            getFernet(newKey).decrypt(fileData)
+            return False
+
+        except InvalidToken:
+
+            pass
+
+        try:
+
+            fileData = getFernet([newKey, *keyList(oldKey)]).rotate(fileData)
+
+        except InvalidToken as it:
+
+            raise mExc.MapleException(f"The file is not encrypted with the old key: {filePath}") from it
+
+    writeFileAtomic(filePath, fileData, durability)
+    return True
+
+def _rotateFileTask(filePath: str, oldKey: bytes | list[bytes], newKey: bytes, durability: str, lockTimeout: float | None) -> tuple[str, bool | None, int, str | None]:
+
+    """Rotate the file key in a worker process.
+    Return (file path, rotated, file size, error message)."""
+
+    try:
+
+        fileSize = os.path.getsize(filePath)
+        return filePath, rotateFileKey(filePath, oldKey, newKey, durability, lockTimeout), fileSize, None
+
+    except Exception as ex:
+
+        return filePath, None, 0, f"{type(ex).__name__}: {ex}"
+
+#
+#################################
+# Find target files
+
+def findFiles(targets: str | list[str], pattern: str = "*") -> list[str]:
+
+    """
+    Return the absolute paths of the target files.\n
+    A directory target is searched recursively for files matching pattern,
+    and other targets are used as glob patterns ("**" is supported).
+    Lock files ("*.lock") are excluded.
+    """
+
+    if isinstance(targets, str):
+
+        targets = [targets]
+
+    filePaths = set()
+
+    for target in targets:
+
+        if os.path.isdir(target):
+
+            candidates = (str(filePath) for filePath in Path(target).rglob(pattern))
+
+        else:
+
+            candidates = glob.iglob(target, recursive=True)
+
+        for filePath in candidates:
+
+            if os.path.isfile(filePath) and not filePath.endswith(".lock"):
+
+                filePaths.add(os.path.abspath(filePath))
+
+    return sorted(filePaths)
+
+#
+#################################
+# Rotate keys
+
+def rotateKeys(targets: str | list[str], oldKey: bytes | list[bytes], newKey: bytes, pattern: str = "*", workers: int | None = None, journalPath: str | None = None, durability: str = "fsync", lockTimeout: float | None = DEFAULT_LOCK_TIMEOUT) -> dict:
+
+    """
+    Re-encrypt all target files with newKey in a process pool.\n
+    targets are directories or glob patterns (see findFiles).
+    oldKey can be a list of keys.\n
+    If journalPath is given, the rotated files are recorded in the journal,
+    and they are skipped when the rotation is run again after an interruption.
+    Failed files are also recorded in the journal ("#FAILED <file path>: <error>" lines)
+    and they are tried again in the next run.
+    The journal is removed when all files are rotated.
+    Files that are already encrypted with newKey are also skipped.\n
+    Each file is written atomically. Files that fail are reported and do not stop the rotation.
+    A file whose lock is not taken in lockTimeout seconds fails with MapleFileLockedException.\n
+    Return {"total", "rotated", "skipped", "failed" ({file path: error}), "bytes", "elapsed", "filesPerSecond", "bytesPerSecond"}.
+    """
+
+    filePaths = findFiles(targets, pattern)
+    doneFiles = set()
+
+    if journalPath is not None:
+
+        journalPath = os.path.abspath(journalPath)
+
+        if os.path.isfile(journalPath):
+
+            with open(journalPath, "r", encoding="utf-8") as f:
+
+                doneFiles = {fileLine.rstrip("\n") for fileLine in f if not fileLine.startswith(JOURNAL_FAILED_PREFIX)}
+
+    todoFiles = [filePath for filePath in filePaths if filePath not in doneFiles and filePath != journalPath]
+    report = {"total": len(filePaths), "rotated": 0, "skipped": len(filePaths) - len(todoFiles), "failed": {}, "bytes": 0}
+    startTime = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    journal = None if journalPath is None else open(journalPath, "a", encoding="utf-8")
+
+    try:
+
+        if workers == 1 or len(todoFiles) < 2:
+
+            results = map(_rotateFileTask, todoFiles, repeat(oldKey), repeat(newKey), repeat(durability), repeat(lockTimeout))
+            executor = None
+
+        else:
+
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_rotateFileTask, todoFiles, repeat(oldKey), repeat(newKey), repeat(durability), repeat(lockTimeout), chunksize=max(1, len(todoFiles) // (workers * 8)))
+
+        try:
+
+            for filePath, rotated, fileSize, errorMessage in results:
+
+                if errorMessage is not None:
+
+                    report["failed"][filePath] = errorMessage
+
+                    if journal is not None:
+
+                        journal.write(f"{JOURNAL_FAILED_PREFIX}{filePath}: {errorMessage}\n")
+                        journal.flush()
+
+                    continue
+
+                if rotated:
+
+                    report["rotated"] += 1
+                    report["bytes"] += fileSize
+
+                else:
+
+                    report["skipped"] += 1
+
+                if journal is not None:
+
+                    journal.write(f"{filePath}\n")
+                    journal.flush()
+
+        finally:
+
+            if executor is not None:
+
+                executor.shutdown(cancel_futures=True)
+
+    finally:
+
+        if journal is not None:
+
+            journal.close()
+
+    if journalPath is not None and len(report["failed"]) == 0:
+
+        os.remove(journalPath)
+
+    elapsed = time.perf_counter() - startTime
+    report["elapsed"] = elapsed
+    report["filesPerSecond"] = report["rotated"] / elapsed if elapsed > 0 else 0.0
+    report["bytesPerSecond"] = report["bytes"] / elapsed if elapsed > 0 else 0.0
+    return report
+
+#
+#################################
+# Command line
+
+def main(argv: list[str] | None = None) -> int:
+
+    """
+    Rotate keys from the command line.\n
+    python -m maplex.mapleKeyRotation <targets> [--pattern "*.mpl"] [--workers 8] [--journal rotation.journal]\n
+    Keys are read from environment variables so that they are not shown in the process list.
+    """
+
+    parser = argparse.ArgumentParser(prog="maplex-rotate-keys", description="Re-encrypt encrypted Maple and JSON files with a new key.",
+                                     epilog="Each file is locked with \"<file>.lock\" while it is rotated. The lock files are kept next to the files (they are shared with MapleTree and skipped as targets).")
+    parser.add_argument("targets", nargs="+", help="directories or glob patterns of the target files")
+    parser.add_argument("--pattern", default="*", help="file name pattern in target directories (default: *)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--journal", default="maplex_key_rotation.journal", help="journal file to resume the rotation")
+    parser.add_argument("--durability", default="fsync", choices=("none", "flush", "fsync"), help="save mode of each file (default: fsync)")
+    parser.add_argument("--lock-timeout", type=float, default=DEFAULT_LOCK_TIMEOUT, help=f"seconds to wait for the lock of each file before it fails (default: {DEFAULT_LOCK_TIMEOUT:g})")
+    parser.add_argument("--old-key-env", default="MAPLEX_OLD_KEY", help="environment variable of the old keys (comma separated)")
+    parser.add_argument("--new-key-env", default="MAPLEX_NEW_KEY", help="environment variable of the new key")
+    args = parser.parse_args(argv)
+
+    oldKeys = os.environ.get(args.old_key_env, "")
+    newKey = os.environ.get(args.new_key_env, "")
+
+    if oldKeys == "" or newKey == "":
+
+        parser.error(f"Set the keys in {args.old_key_env} and {args.new_key_env}")
+
+    report = rotateKeys(args.targets, [oldKey.strip().encode() for oldKey in oldKeys.split(",")], newKey.strip().encode(), args.pattern, args.workers, args.journal, args.durability, args.lock_timeout)
+
+    for filePath, errorMessage in report["failed"].items():
+
+        print(f"FAILED {filePath}: {errorMessage}", file=sys.stderr)
+
+    print(f"{report['rotated']} rotated, {report['skipped']} skipped, {len(report['failed'])} failed / {report['total']} files "
+          f"in {report['elapsed']:.2f} s ({report['filesPerSecond']:.1f} files/s, {report['bytesPerSecond'] / 1000000:.2f} MB/s)")
+
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+
+    sys.exit(main())
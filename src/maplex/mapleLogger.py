@@ -1,9 +1,22 @@
+import atexit
 from datetime import datetime
 import inspect
+import json
+import multiprocessing
+from multiprocessing.connection import Client, Connection, Listener
 import os
 from os import path
+import queue
+import random
+import re
+import shutil
+import signal
 import sys
+import tempfile
+import threading
+import time
 import traceback
+import weakref
 from enum import IntEnum
 from typing import Literal
 from .json import MapleJson
@@ -22,11 +35,20 @@ class Logger:
             fileMode: Literal["append", "overwrite", "daily"] | None = None,
             configFile: str = "config.json",
             encoding: str | None = None,
+            asyncWrite: bool | None = None,
+            captureCaller: bool | None = None,
+            fileFormat: Literal["text", "json"] | None = None,
+            logServer: str | None = None,
             **kwargs
         ) -> None:
 
         """
-        Set a negative value to maxLogSize for an infinite log file size.
+        Set a negative value to maxLogSize for an infinite log file size.\n
+        If asyncWrite is True, log records are queued and written to the log file by a background thread.\n
+        If captureCaller is False, the caller function name and line number are not looked up nor logged.\n
+        If fileFormat is "json", the log file has one JSON object per record (JSON lines).\n
+        If logServer is the address of a log server (see startLogServer), the file records
+        are sent to the server process, which writes and rotates the log file for all processes.
         """
 
         self.intMaxValue = 4294967295
@@ -37,9 +59,9 @@ class Logger:
         self.consoleColors = ConsoleColors()
         self.fileMode = "append" if fileMode is None else fileMode
         self.encoding = encoding
-        self.timestampFormat = "%F %X.%f" # Timestamp format for logs (set this in config in future)
-        self.consoleAlignWidth = 16 # Width for function name alignment in logs (set this in config in future)
-        self.fileAlignWidth = 4 # Width for function name alignment in logs (set this in config in future)
+        self.timestampFormat = "%F %X.%f" # Timestamp format for logs ("%f" is milliseconds)
+        self.consoleAlignWidth = 16 # Width for function name alignment in logs
+        self.fileAlignWidth = 4 # Width for function name alignment in logs
 
         try:
 
@@ -60,6 +82,12 @@ class Logger:
             self.__setLogFileSize(maxLogSize)
             self.__setOutputLogLevels(cmdLogLevel, fileLogLevel)
             self.__setFileEncoding(encoding)
+            self.__setAsyncWrite(asyncWrite)
+            self.captureCaller = bool(self.logConf.get(self.CAPTURE_CALLER, True)) if captureCaller is None else captureCaller
+            self.__setFileFormat(fileFormat)
+            self.__setTimestampFormat()
+            self.__setRecordLimits()
+            self.logServer = logServer or self.logConf.get(self.LOG_SERVER, None) or os.environ.get(LOG_SERVER_ENV, None)
             self.__saveLogSettings(logConfInstance)
 
         except Exception as ex:
@@ -94,6 +122,15 @@ class Logger:
         self.MAX_LOG_SIZE = "MaxLogSize"
         self.WORKING_DIRECTORY = "WorkingDirectory"
         self.FILE_ENCODING = "FileEncoding"
+        self.ASYNC_WRITE = "AsyncWrite"
+        self.FLUSH_INTERVAL = "FlushInterval"
+        self.FLUSH_SIZE = "FlushSize"
+        self.CAPTURE_CALLER = "CaptureCaller"
+        self.FILE_FORMAT = "FileFormat"
+        self.LOG_SERVER = "LogServer"
+        self.TIMESTAMP_FORMAT = "TimestampFormat"
+        self.RECORD_LIMITS = "RecordLimits"
+        self.SUMMARY_INTERVAL = "SuppressSummaryInterval"
 
         # Set config file path
         
@@ -191,13 +228,10 @@ class Logger:
 
     def __setFuncName(self, isGetLogger: bool, func: str | None = None) -> None:
 
-        if isGetLogger:
+        callerFrame = _getCallerFrame(3 if isGetLogger else 2)
+        caller = "" if callerFrame is None else callerFrame.f_globals.get("__name__", "")
 
-            caller = inspect.stack()[3].frame.f_globals.get("__name__", "")
-
-        else:
-
-            caller = inspect.stack()[2].frame.f_globals.get("__name__", "")
+        self.loggerName = func or ""
 
         if func in {None, ""}:
 
@@ -271,6 +305,44 @@ class Logger:
 
         self.consoleLogLevel = self.__setLogLevel(self.CONSOLE_LOG_LEVEL, cmdLogLevel)
         self.fileLogLevel = self.__setLogLevel(self.FILE_LOG_LEVEL, fileLogLevel)
+        self.__setMinLogLevel()
+        self.__renderConsolePrefixes()
+
+    def __setMinLogLevel(self) -> None:
+
+        '''Set the lowest enabled log level as int for the fast level check'''
+
+        self.minLogLevel = int(min(self.consoleLogLevel, self.fileLogLevel))
+
+    def __renderConsolePrefixes(self) -> None:
+
+        '''
+        Render the console prefix of each enabled log level
+        (call this when the console log level, the alignment width or the console colors change)
+        consolePrefixes[level] is (prefix before the caller, visible prefix length) or None if the level is disabled.
+        '''
+
+        colors = self.consoleColors
+        levelColors = {
+            self.LogLevel.TRACE: colors.bBlack,
+            self.LogLevel.DEBUG: colors.Green,
+            self.LogLevel.INFO: colors.bLightBlue,
+            self.LogLevel.WARN: colors.bRed,
+            self.LogLevel.ERROR: colors.Red,
+            self.LogLevel.FATAL: colors.Bold + colors.Red,
+            self.LogLevel.NONE: colors.Bold + colors.Italic + colors.Black
+        }
+        consolePrefixes = [None] * len(self.LogLevel)
+
+        for loglevel in self.LogLevel:
+
+            if loglevel >= self.consoleLogLevel:
+
+                consolePrefixes[loglevel] = (f"[{levelColors[loglevel]}{loglevel.name:5}{colors.Reset}]{colors.Green}{self.func}{colors.Reset} {colors.bBlack}",
+                                             len(f"[{loglevel.name:5}]{self.func} "))
+
+        self.consoleReset = colors.Reset
+        self.consolePrefixes = consolePrefixes
 
     def __setLogLevel(self, fileOrConsole, loglevel: any) -> LogLevel:
 
@@ -315,6 +387,87 @@ class Logger:
 
             self.encoding = fileEncoding
 
+    def __setAsyncWrite(self, asyncWrite: bool | None) -> None:
+
+        '''Set async write mode and its flush thresholds'''
+
+        self.asyncWrite = bool(self.logConf.get(self.ASYNC_WRITE, False)) if asyncWrite is None else asyncWrite
+
+        try:
+
+            self.flushInterval = float(self.logConf.get(self.FLUSH_INTERVAL, 1.0))
+            self.flushSize = int(self.logConf.get(self.FLUSH_SIZE, 65536))
+
+        except (TypeError, ValueError):
+
+            print(f"{self.consoleColors.Red}Warning: Invalid {self.FLUSH_INTERVAL} or {self.FLUSH_SIZE} provided. Using default value.{self.consoleColors.Reset}")
+            self.flushInterval = 1.0
+            self.flushSize = 65536
+
+    def __setFileFormat(self, fileFormat: str | None) -> None:
+
+        '''Set log file format'''
+
+        if fileFormat is None:
+
+            fileFormat = self.logConf.get(self.FILE_FORMAT, "text")
+
+        try:
+
+            self.setFileFormat(fileFormat)
+
+        except MapleLoggerException:
+
+            print(f"{self.consoleColors.Red}Warning: Invalid {self.FILE_FORMAT} provided: [{fileFormat}]. Using default value.{self.consoleColors.Reset}")
+            self.fileFormat = "text"
+
+    def __setTimestampFormat(self) -> None:
+
+        '''Set timestamp format from the config'''
+
+        timestampFormat = self.logConf.get(self.TIMESTAMP_FORMAT, self.timestampFormat)
+
+        try:
+
+            self.setTimestampFormat(timestampFormat)
+
+        except MapleLoggerException:
+
+            print(f"{self.consoleColors.Red}Warning: Invalid {self.TIMESTAMP_FORMAT} provided: [{timestampFormat}]. Using default value.{self.consoleColors.Reset}")
+            self.setTimestampFormat("%F %X.%f")
+
+    def __setRecordLimits(self) -> None:
+
+        '''Set the rate limit and the sampling rate of each log level from the config'''
+
+        self.recordLimits = [None] * len(self.LogLevel)
+
+        try:
+
+            self.summaryInterval = float(self.logConf.get(self.SUMMARY_INTERVAL, 60.0))
+
+        except (TypeError, ValueError):
+
+            print(f"{self.consoleColors.Red}Warning: Invalid {self.SUMMARY_INTERVAL} provided. Using default value.{self.consoleColors.Reset}")
+            self.summaryInterval = 60.0
+
+        recordLimits = self.logConf.get(self.RECORD_LIMITS, {})
+
+        if type(recordLimits) is not dict:
+
+            print(f"{self.consoleColors.Red}Warning: Invalid {self.RECORD_LIMITS} provided. Records are not limited.{self.consoleColors.Reset}")
+            return
+
+        for levelName, recordLimit in recordLimits.items():
+
+            try:
+
+                self.setRecordLimit(levelName, recordLimit.get("MaxRecords", 0), recordLimit.get("Period", 60.0), recordLimit.get("SampleRate", 1.0))
+
+            except (MapleLoggerException, AttributeError):
+
+                print(f"{self.consoleColors.Red}Warning: Invalid {self.RECORD_LIMITS} provided for [{levelName}]. Records are not limited.{self.consoleColors.Reset}")
+
     def __saveLogSettings(self, logConfInstance: MapleJson | None) -> None:
 
         """ Save current log settings to config file """
@@ -373,6 +526,8 @@ class Logger:
         try:
 
             self.consoleLogLevel = self.toLogLevel(loglevel)
+            self.__setMinLogLevel()
+            self.__renderConsolePrefixes()
 
         except MapleInvalidLoggerLevelException as ex:
 
@@ -395,11 +550,90 @@ class Logger:
         try:
 
             self.fileLogLevel = self.toLogLevel(loglevel)
+            self.__setMinLogLevel()
 
         except MapleInvalidLoggerLevelException as ex:
 
             raise MapleInvalidLoggerLevelException(loglevel, "Invalid file log level. Log level must be a string or integer corresponding to a valid log level.") from ex
     
+    def getConsoleAlignWidth(self) -> int:
+
+        '''Get console prefix alignment width'''
+
+        return self.consoleAlignWidth
+
+    def setConsoleAlignWidth(self, consoleAlignWidth: int) -> None:
+
+        '''Set console prefix alignment width'''
+
+        if type(consoleAlignWidth) is not int or consoleAlignWidth <= 0:
+
+            raise MapleLoggerException(f"Invalid console align width: {consoleAlignWidth}. Align width must be a positive integer.")
+
+        self.consoleAlignWidth = consoleAlignWidth
+        self.__renderConsolePrefixes()
+
+    def getFileAlignWidth(self) -> int:
+
+        '''Get log file prefix alignment width'''
+
+        return self.fileAlignWidth
+
+    def setFileAlignWidth(self, fileAlignWidth: int) -> None:
+
+        '''Set log file prefix alignment width'''
+
+        if type(fileAlignWidth) is not int or fileAlignWidth <= 0:
+
+            raise MapleLoggerException(f"Invalid file align width: {fileAlignWidth}. Align width must be a positive integer.")
+
+        self.fileAlignWidth = fileAlignWidth
+
+    def getRecordLimits(self) -> dict[str, dict]:
+
+        '''Get the record limits by log level name'''
+
+        return {self.LogLevel(loglevel).name: {"MaxRecords": recordLimit.maxRecords, "Period": recordLimit.period, "SampleRate": recordLimit.sampleRate}
+                for loglevel, recordLimit in enumerate(self.recordLimits) if recordLimit is not None}
+
+    def setRecordLimit(self, loglevel: any, maxRecords: int = 0, period: float = 60.0, sampleRate: float = 1.0) -> None:
+
+        '''
+        Set the record limit of the log level
+        Each call site outputs at most maxRecords records in period seconds (0 for no limit),
+        and the records are sampled with sampleRate (1.0 for all records).
+        The suppressed records are counted and reported in a summary record.
+        Set maxRecords=0 and sampleRate=1.0 to remove the limit.
+        '''
+
+        try:
+
+            loglevel = self.toLogLevel(loglevel)
+            maxRecords = int(maxRecords)
+            period = float(period)
+            sampleRate = float(sampleRate)
+
+        except (MapleInvalidLoggerLevelException, TypeError, ValueError) as ex:
+
+            raise MapleLoggerException(f"Invalid record limit: {ex}") from ex
+
+        if maxRecords < 0 or period <= 0 or not 0.0 <= sampleRate <= 1.0:
+
+            raise MapleLoggerException(f"Invalid record limit: maxRecords={maxRecords}, period={period}, sampleRate={sampleRate}")
+
+        # Report the records suppressed with the old limit
+
+        self._reportSuppressed(loglevel)
+
+        if maxRecords == 0 and sampleRate == 1.0:
+
+            self.recordLimits[loglevel] = None
+
+        else:
+
+            self.recordLimits[loglevel] = _RecordLimiter(maxRecords, period, sampleRate)
+            _getSuppressReporter().add(self)
+
     def getMaxLogSize(self) -> float:
 
         '''Get max log size'''
@@ -418,6 +652,85 @@ class Logger:
 
             raise MapleLoggerException("Invalid max log size. Log size must be an integer, float or string.") from ex
 
+    def getTimestampFormat(self) -> str:
+
+        '''Get timestamp format'''
+
+        return self.timestampFormat
+
+    def setTimestampFormat(self, timestampFormat: str) -> None:
+
+        '''
+        Set timestamp format
+        The format is a strftime format, and "%f" is milliseconds (3 digits).
+        '''
+
+        if type(timestampFormat) is not str:
+
+            raise MapleLoggerException(f"Invalid timestamp format type: {type(timestampFormat)}. Timestamp format must be a string.")
+
+        self.timestampFormat = timestampFormat
+        self.timestampFormatter = _getTimestampFormatter(timestampFormat)
+
+    def getFileFormat(self) -> str:
+
+        '''Get log file format ("text" or "json")'''
+
+        return self.fileFormat
+
+    def setFileFormat(self, fileFormat: Literal["text", "json"]) -> None:
+
+        '''Set log file format ("text" or "json")'''
+
+        if fileFormat not in {"text", "json"}:
+
+            raise MapleLoggerException(f"Invalid log file format: {fileFormat}. Log file format must be \"text\" or \"json\".")
+
+        self.fileFormat = fileFormat
+
+    def getLogServer(self) -> str | None:
+
+        '''Get log server address'''
+
+        return self.logServer
+
+    def setLogServer(self, logServer: str | None) -> None:
+
+        '''Set log server address (None to write the log file in this process)'''
+
+        self.logServer = logServer
+
+    def getCaptureCaller(self) -> bool:
+
+        '''Get caller capture mode'''
+
+        return self.captureCaller
+
+    def setCaptureCaller(self, captureCaller: bool) -> None:
+
+        '''Set caller capture mode'''
+
+        self.captureCaller = captureCaller
+
+    def getAsyncWrite(self) -> bool:
+
+        '''Get async write mode'''
+
+        return self.asyncWrite
+
+    def setAsyncWrite(self, asyncWrite: bool) -> None:
+
+        '''
+        Set async write mode
+        Queued records are flushed before switching to the sync mode.
+        '''
+
+        if self.asyncWrite and not asyncWrite:
+
+            self.flush()
+
+        self.asyncWrite = asyncWrite
+
     #
     ######################
     # Convert log size
@@ -504,218 +817,336 @@ class Logger:
     #################################
     # Logger
 
+    #
+    ################################
+    # Check enabled log level
+
+    def isEnabledFor(self, loglevel: LogLevel | int) -> bool:
+
+        '''Return True if the log level is output to the console or the log file'''
+
+        return loglevel >= self.minLogLevel
+
+    def __formatMessage(self, message: any, args: tuple) -> any:
+
+        '''Format the lazy message (message % args, or the return value of the callable message)'''
+
+        try:
+
+            if args:
+
+                return str(message) % args
+
+            if callable(message):
+
+                return message()
+
+        except Exception as ex:
+
+            return f"{message} {args} (Failed to format the message: {ex})"
+
+        return message
+
     def logWriter(self, loglevel: LogLevel, message: any, callerDepth: int = 1) -> None:
 
         """
-        Output log to log file and console.
+        Output log to log file and console.\n
+        If the message is callable, it is called to get the message
+        only if the log level is enabled.
+        """
+
+        self.__writeLog(loglevel, message, (), callerDepth + 1)
+
+    def __writeLog(self, loglevel: LogLevel, message: any, args: tuple, callerDepth: int) -> None:
+
+        """
+        Output log to log file and console.\n
+        If args are given, the message is formatted with message % args.
+        If the message is callable, it is called to get the message.
+        Both are done only if the log level is enabled.
         """
 
         # Precheck log level
 
-        if loglevel < self.consoleLogLevel and loglevel < self.fileLogLevel:
+        if loglevel < self.minLogLevel:
 
             return
 
-        # Console colors
+        recordLimit = self.recordLimits[loglevel]
 
-        Black = self.consoleColors.Black
-        bBlack = self.consoleColors.bBlack
-        Red = self.consoleColors.Red
-        bRed = self.consoleColors.bRed
-        Green = self.consoleColors.Green
-        bLightBlue = self.consoleColors.bLightBlue
-        Bold = self.consoleColors.Bold
-        Italic = self.consoleColors.Italic
-        Reset = self.consoleColors.Reset
+        if recordLimit is None:
 
-        try:
+            callerFrame = _getCallerFrame(callerDepth) if self.captureCaller else None
 
-            # Get caller informations
+        else:
+
+            # Check the limit of the call site before formatting the message
+
+            callerFrame = _getCallerFrame(callerDepth)
+            allowed = recordLimit.allow(None if callerFrame is None else (callerFrame.f_code, callerFrame.f_lineno))
+
+            if recordLimit.summaryDue(self.summaryInterval):
+
+                self._reportSuppressed(loglevel)
+
+            if not allowed:
+
+                return
+
+            if not self.captureCaller:
 
-            callerFrame = inspect.stack()[callerDepth]
-            callerFunc = callerFrame.function
-            callerLine = callerFrame.lineno
+                callerFrame = None
 
-            # Set console color
+        if callerFrame is None:
 
-            match loglevel:
+            self.__outputLog(loglevel, self.__formatMessage(message, args), None, None)
 
-                case self.LogLevel.TRACE:
+        else:
+
+            self.__outputLog(loglevel, self.__formatMessage(message, args), callerFrame.f_code.co_name, callerFrame.f_lineno)
 
-                    col = bBlack
+    def _reportSuppressed(self, loglevel: LogLevel) -> None:
 
-                case self.LogLevel.DEBUG:
+        '''Output a summary record for each call site that has suppressed records
+        (also called by the suppress reporter thread and at exit)'''
 
-                    col = Green
+        recordLimit = self.recordLimits[loglevel]
 
-                case self.LogLevel.INFO:
+        if recordLimit is None:
+
+            return
 
-                    col = bLightBlue
+        elapsed, suppressedSites = recordLimit.takeSuppressed()
 
-                case self.LogLevel.WARN:
+        for site, (rateLimited, sampledOut) in suppressedSites.items():
 
-                    col = bRed
+            callerFunc, callerLine = (None, None) if site is None or not self.captureCaller else (site[0].co_name, site[1])
+            self.__outputLog(loglevel, f"Suppressed {rateLimited + sampledOut} records from this call site in the last {elapsed:.0f} s ({rateLimited} rate limited, {sampledOut} sampled out)", callerFunc, callerLine)
 
-                case self.LogLevel.ERROR:
+    def __outputLog(self, loglevel: LogLevel, message: any, callerFunc: str | None, callerLine: int | None) -> None:
 
-                    col = Red
+        '''Output the formatted log record to the console and the log file'''
 
-                case self.LogLevel.FATAL:
+        try:
 
-                    col = Bold + Red
+            # Caller informations
 
-                case self.LogLevel.NONE:
+            if callerFunc is not None:
 
-                    col = Bold + Italic + Black
+                callerInfo = f"{callerFunc}({callerLine})"
+                fileCallerInfo = f"{self.callerName}{callerInfo}"
 
-                case _:
+            else:
 
-                    col = ""
+                callerInfo = fileCallerInfo = ""
 
             # Export to console and log file
 
-            if loglevel >= self.consoleLogLevel:
-                consolePrefix = f"[{col}{loglevel.name:5}{Reset}]{Green}{self.func}{Reset} {bBlack}{callerFunc}({callerLine}){Reset}"
-                colorLength = len(col) + len(Reset) + len(Green) + len(Reset) + len(bBlack) + len(Reset)
-                consolePrefixLength = len(consolePrefix) - colorLength
-                consoleAlignWidth = self.consoleAlignWidth * (consolePrefixLength // self.consoleAlignWidth + (1 if consolePrefixLength % self.consoleAlignWidth != 0 else 0))
-                consoleAlignWidth += colorLength
-                print(f"{consolePrefix:<{consoleAlignWidth}}: {message}")
-        
+            consolePrefix = self.consolePrefixes[loglevel]
+
+            if consolePrefix is not None:
+
+                prefix, prefixLength = consolePrefix
+                padding = -(prefixLength + len(callerInfo)) % self.consoleAlignWidth
+                sys.stdout.write(f"{prefix}{callerInfo}{self.consoleReset}{' ' * padding}: {message}\n")
+
             if loglevel >= self.fileLogLevel:
 
-                timeStamp = datetime.now().strftime(self.timestampFormat)[:-3]
-                prefixString = f"({self.pid}) {timeStamp} [{loglevel.name:5}]{self.func} {self.callerName}{callerFunc}({callerLine})"
-                prefixLength = len(prefixString)
-                alignWidth = self.fileAlignWidth * (prefixLength // self.fileAlignWidth + (1 if prefixLength % self.fileAlignWidth != 0 else 0))
+                timeStamp = self.timestampFormatter.format()
 
-                for i in range(3):
+                if self.fileFormat == "json":
+
+                    # One JSON object per line (no alignment)
+
+                    if callerFunc is not None:
+
+                        callerJson = f'"function":{_jsonString(callerFunc)},"line":{callerLine}'
+
+                    else:
+
+                        callerJson = '"function":null,"line":null'
+
+                    fileText = (f'{{"timestamp":{_jsonString(timeStamp)},"level":"{loglevel.name}","pid":{self.pid},'
+                                f'"logger":{_jsonString(self.loggerName)},{callerJson},'
+                                f'"message":{_jsonString(message if type(message) is str else str(message))}}}\n')
+
+                else:
+
+                    prefixString = f"({self.pid}) {timeStamp} [{loglevel.name:5}]{self.func} {fileCallerInfo}"
+                    fileText = f"{prefixString}{' ' * (-len(prefixString) % self.fileAlignWidth)}: {message}\n"
+
+                if self.asyncWrite:
+
+                    # Queue the record for the writer thread (it sends the records to the log server in batches)
+
+                    _getAsyncWriter().put(self, fileText)
+                    return
+
+                if self.logServer is not None:
+
+                    # Send the record to the log server (write the log file here if the server is not available)
 
                     try:
 
-                        with open(self.logfile, "a", encoding=self.encoding) as f:
-                            print(f"{prefixString:<{alignWidth}}: {message}", file=f)
+                        _getLogClient(self.logServer).send(self, [fileText])
+                        return
+
+                    except (OSError, EOFError) as ex:
+
+                        _dropLogClient(self.logServer)
+                        print(f"{self.consoleColors.Red}Warning: Failed to send log to the log server {self.logServer}: {ex}. Writing the log file in this process.{self.consoleColors.Reset}")
+                        self.logServer = None
+
+                logFile = _getLogFile(self.logfile)
+
+                for i in range(3):
+
+                    try:
 
+                        logFile.write(fileText, self.encoding)
                         break
 
                     except IOError:
 
+                        # Reopen the file on the next try
+
+                        logFile.close()
+
                         if i == 2:
                             raise
 
+            else:
+
+                return
+
         except Exception as ex:
 
             raise MapleLoggerException(f"Failed to write log: {ex}") from ex
 
         if self.maxLogSize > 0:
 
-            # Check file size
+            # Check the written size
 
             try:
 
-                if path.exists(self.logfile) and path.getsize(self.logfile) > self.maxLogSize:
+                logFile.rotate(self.maxLogSize, self.fileMode)
 
-                    # Rename log file
+            except Exception as ex:
 
-                    if self.fileMode == "overwrite":
+                raise MapleLoggerException(f"Failed to rotate log file: {ex}") from ex
 
-                        if path.isfile(f"{self.logfile}_old.log"):
+    #
+    ################################
+    # Flush
 
-                            os.remove(f"{self.logfile}_old.log")
+    def flush(self) -> None:
 
-                        os.rename(self.logfile, f"{self.logfile}_old.log")
-                        return
+        '''
+        Output the summary of the suppressed records, and wait until the queued records
+        are written to the log files (async write mode and log server)
+        '''
 
-                    elif self.fileMode == "daily":
+        for loglevel in self.LogLevel:
 
-                        dateStr = ""
+            self._reportSuppressed(loglevel)
 
-                    else:
+        if _asyncWriter is not None:
 
-                        dateStr = f"_{datetime.now():%Y%m%d_%H%M%S}"
-                    
-                    i = 0
-                    logCopyFile = f"{self.logfile}{dateStr}{i}.log"
+            _asyncWriter.flush()
 
-                    while path.isfile(logCopyFile):
+        if self.logServer is not None and self.logServer in _logClients:
 
-                        i += 1
-                        logCopyFile = f"{self.logfile}{dateStr}{i}.log"
+            try:
 
-                    os.rename(self.logfile, logCopyFile)
+                _logClients[self.logServer].request(b"flush")
 
-            except Exception as ex:
+            except (OSError, EOFError):
 
-                raise MapleLoggerException(f"Failed to rotate log file: {ex}") from ex
+                _dropLogClient(self.logServer)
 
     #
     ################################
     # Trace
 
-    def trace(self, object: any):
+    def trace(self, object: any, *args):
 
         '''Trace log'''
 
-        self.logWriter(self.LogLevel.TRACE, object, callerDepth=2)
+        if _TRACE >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.TRACE, object, args, 2)
+
     #
     ################################
     # Debug
 
-    def debug(self, object: any):
+    def debug(self, object: any, *args):
 
         '''Debug log'''
 
-        self.logWriter(self.LogLevel.DEBUG, object, callerDepth=2)
+        if _DEBUG >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.DEBUG, object, args, 2)
 
     #
     ################################
     # Info
 
-    def info(self, object: any):
+    def info(self, object: any, *args):
 
         '''Info log'''
 
-        self.logWriter(self.LogLevel.INFO, object, callerDepth=2)
+        if _INFO >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.INFO, object, args, 2)
 
     #
     ################################
     # Warn
 
-    def warn(self, object: any):
+    def warn(self, object: any, *args):
 
         '''Warn log'''
 
-        self.logWriter(self.LogLevel.WARN, object, callerDepth=2)
+        if _WARN >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.WARN, object, args, 2)
 
     #
     ################################
     # Error
 
-    def error(self, object: any):
+    def error(self, object: any, *args):
 
         '''Error log'''
 
-        self.logWriter(self.LogLevel.ERROR, object, callerDepth=2)
+        if _ERROR >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.ERROR, object, args, 2)
 
     #
     ################################
     # Fatal
 
-    def fatal(self, object: any):
+    def fatal(self, object: any, *args):
 
         '''Fatal log'''
 
-        self.logWriter(self.LogLevel.FATAL, object, callerDepth=2)
+        if _FATAL >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.FATAL, object, args, 2)
 
     #
     ################################
     # None
 
-    def log(self, object: any):
+    def log(self, object: any, *args):
 
         '''None log'''
 
-        self.logWriter(self.LogLevel.NONE, object, callerDepth=2)
+        if _NONE >= self.minLogLevel:
+
+            self.__writeLog(self.LogLevel.NONE, object, args, 2)
 
     #
     ################################
@@ -735,9 +1166,9 @@ class Logger:
 
         if message is not None:
 
-            self.logWriter(logLevel, message, callerDepth=2)
+            self.__writeLog(logLevel, message, (), 2)
 
-        self.logWriter(logLevel, f"{ex}\n{traceback.format_exc()}", callerDepth=2)
+        self.__writeLog(logLevel, f"{ex}\n{traceback.format_exc()}", (), 2)
 
     #
     ################################
@@ -792,6 +1223,978 @@ class Logger:
 
             raise MapleLoggerException(f"Error saving logger config file: {e}") from e
 
+#
+#################################
+# Record limits
+
+class _RecordLimiter:
+
+    """
+    Rate limit and sampling of the records of one log level.\n
+    Each call site has its own rate limit window, and the suppressed records
+    are counted by call site until they are reported.
+    """
+
+    def __init__(self, maxRecords: int, period: float, sampleRate: float) -> None:
+
+        self.maxRecords = maxRecords
+        self.period = period
+        self.sampleRate = sampleRate
+        self.lock = threading.Lock()
+        self.windows: dict[tuple | None, list] = {}
+        self.suppressed: dict[tuple | None, list[int]] = {}
+        self.lastSummary = time.monotonic()
+
+    def allow(self, site: tuple | None) -> bool:
+
+        '''Return True if the record of the call site is output'''
+
+        with self.lock:
+
+            if self.sampleRate < 1.0 and random.random() >= self.sampleRate:
+
+                self.suppressed.setdefault(site, [0, 0])[1] += 1
+                return False
+
+            if self.maxRecords > 0:
+
+                now = time.monotonic()
+                window = self.windows.get(site)
+
+                if window is None or now - window[0] >= self.period:
+
+                    self.windows[site] = [now, 1]
+
+                elif window[1] >= self.maxRecords:
+
+                    self.suppressed.setdefault(site, [0, 0])[0] += 1
+                    return False
+
+                else:
+
+                    window[1] += 1
+
+            return True
+
+    def summaryDue(self, summaryInterval: float) -> bool:
+
+        '''Return True if there are suppressed records and the summary interval has passed'''
+
+        return bool(self.suppressed) and time.monotonic() - self.lastSummary >= summaryInterval
+
+    def windowEnded(self) -> bool:
+
+        '''Return True if the rate limit window of a call site with suppressed records has ended'''
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            for site in self.suppressed:
+
+                window = self.windows.get(site)
+
+                if window is not None and now - window[0] >= self.period:
+
+                    return True
+
+        return False
+
+    def takeSuppressed(self) -> tuple[float, dict]:
+
+        '''Return the seconds since the last summary and the suppressed counts by call site, and reset them'''
+
+        with self.lock:
+
+            now = time.monotonic()
+            elapsed = now - self.lastSummary
+            suppressed = self.suppressed
+            self.suppressed = {}
+            self.lastSummary = now
+
+            # Forget the call sites whose windows have ended
+
+            self.windows = {site: window for site, window in self.windows.items() if now - window[0] < self.period}
+
+        return elapsed, suppressed
+
+class _SuppressReporter:
+
+    """
+    Background thread that outputs the summaries of the suppressed records
+    when the rate limit window of the call site ends or the summary interval passes,
+    so that the summary is output even if no more records come from the logger.
+    """
+
+    CHECK_INTERVAL = 0.1
+
+    def __init__(self) -> None:
+
+        self.loggers = weakref.WeakSet()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.__run, name="MapleLoggerSuppressReporter", daemon=True)
+        self.thread.start()
+
+    def add(self, logger: Logger) -> None:
+
+        with self.lock:
+
+            self.loggers.add(logger)
+
+    def reportAll(self, force: bool = True) -> None:
+
+        '''Output the summaries of all loggers (only the due summaries if force is False)'''
+
+        with self.lock:
+
+            loggers = list(self.loggers)
+
+        for logger in loggers:
+
+            for loglevel, recordLimit in enumerate(logger.recordLimits):
+
+                if recordLimit is None or not recordLimit.suppressed:
+
+                    continue
+
+                if force or recordLimit.summaryDue(logger.summaryInterval) or recordLimit.windowEnded():
+
+                    try:
+
+                        logger._reportSuppressed(Logger.LogLevel(loglevel))
+
+                    except Exception as ex:
+
+                        print(f"Error: Failed to write the suppressed record summary: {ex}", file=sys.stderr)
+
+    def __run(self) -> None:
+
+        while True:
+
+            time.sleep(self.CHECK_INTERVAL)
+            self.reportAll(False)
+
+_suppressReporter: _SuppressReporter | None = None
+_suppressReporterLock = threading.Lock()
+
+def _getSuppressReporter() -> _SuppressReporter:
+
+    """Return the suppress reporter (start the reporter thread on first use)"""
+
+    global _suppressReporter
+
+    if _suppressReporter is None:
+
+        with _suppressReporterLock:
+
+            if _suppressReporter is None:
+
+                _suppressReporter = _SuppressReporter()
+
+    return _suppressReporter
+
+#
+#################################
+# Timestamp format
+
+class _TimestampFormatter:
+
+    """
+    Format the current time with the timestamp format.\n
+    The text down to the second is formatted once a second and cached,
+    and only the milliseconds ("%f") are formatted for each record.
+    """
+
+    def __init__(self, timestampFormat: str) -> None:
+
+        self.timestampFormat = timestampFormat
+
+        # Split the format at "%f" (not at "%%f")
+
+        self.parts = [""]
+
+        for token in re.split(r"(%%|%f)", timestampFormat):
+
+            if token == "%f":
+
+                self.parts.append("")
+
+            else:
+
+                self.parts[-1] += token
+
+        self.cache = (None, None)
+
+    def format(self) -> str:
+
+        now = time.time()
+        second = int(now)
+        cachedSecond, cachedParts = self.cache
+
+        if second != cachedSecond:
+
+            localTime = time.localtime(second)
+            cachedParts = [time.strftime(part, localTime) if part else "" for part in self.parts]
+            self.cache = (second, cachedParts)
+
+        if len(cachedParts) == 1:
+
+            return cachedParts[0]
+
+        return f"{int((now - second) * 1000):03d}".join(cachedParts)
+
+_timestampFormatters: dict[str, _TimestampFormatter] = {}
+
+def _getTimestampFormatter(timestampFormat: str) -> _TimestampFormatter:
+
+    """Return the formatter shared by the Loggers with the same timestamp format"""
+
+    formatter = _timestampFormatters.get(timestampFormat)
+
+    if formatter is None:
+
+        formatter = _timestampFormatters.setdefault(timestampFormat, _TimestampFormatter(timestampFormat))
+
+    return formatter
+
+# JSON string encoder (C implementation) for the JSON lines log file
+
+_jsonString = json.encoder.encode_basestring
+
+# Log level values for the fast level check
+
+_TRACE = int(Logger.LogLevel.TRACE)
+_DEBUG = int(Logger.LogLevel.DEBUG)
+_INFO = int(Logger.LogLevel.INFO)
+_WARN = int(Logger.LogLevel.WARN)
+_ERROR = int(Logger.LogLevel.ERROR)
+_FATAL = int(Logger.LogLevel.FATAL)
+_NONE = int(Logger.LogLevel.NONE)
+
+#
+#################################
+# Caller lookup
+
+if hasattr(sys, "_getframe"):
+
+    def _getCallerFrame(depth: int):
+
+        """Return the frame depth levels above the caller (None if the stack is not deep enough)"""
+
+        try:
+
+            return sys._getframe(depth + 1)
+
+        except ValueError:
+
+            return None
+
+else:
+
+    def _getCallerFrame(depth: int):
+
+        """Return the frame depth levels above the caller (None if the stack is not deep enough)"""
+
+        frame = inspect.currentframe()
+
+        for _ in range(depth + 1):
+
+            if frame is None:
+
+                return None
+
+            frame = frame.f_back
+
+        return frame
+
+#
+#################################
+# Log files
+
+_LINESEP = os.linesep
+
+class _LogFile:
+
+    """
+    Log file handle shared by the Logger instances that write to the same file.\n
+    The file is kept open, and the written bytes are counted to rotate the file
+    without checking the file size on every record. Use the lock while writing.
+    """
+
+    def __init__(self, logfile: str) -> None:
+
+        self.logfile = logfile
+        self.lock = threading.RLock()
+        self.handle = None
+        self.size = 0
+        self.pending = 0
+        self.lastFlush = time.monotonic()
+        self.flushInterval = 1.0
+        self.flushSize = 65536
+        self.rotateName = ""
+        self.rotateIndex = 0
+
+    def write(self, text: str, encoding: str | None, flush: bool = True) -> None:
+
+        '''Write the text (flush=False leaves it in the buffer for the async writer)'''
+
+        if _LINESEP != "\n":
+
+            text = text.replace("\n", _LINESEP)
+
+        data = text.encode(encoding or "utf-8")
+
+        with self.lock:
+
+            if self.handle is None:
+
+                self.handle = open(self.logfile, "ab")
+                self.size = self.handle.tell()
+
+            self.handle.write(data)
+            self.size += len(data)
+
+            if flush:
+
+                self.handle.flush()
+                self.pending = 0
+
+            else:
+
+                self.pending += len(data)
+
+    def flush(self) -> None:
+
+        with self.lock:
+
+            if self.handle is not None and self.pending > 0:
+
+                self.handle.flush()
+
+            self.pending = 0
+            self.lastFlush = time.monotonic()
+
+    def close(self) -> None:
+
+        with self.lock:
+
+            if self.handle is not None:
+
+                self.handle.close()
+                self.handle = None
+
+            self.pending = 0
+
+    def rotate(self, maxLogSize: int, fileMode: str) -> None:
+
+        '''Rename the log file to the old log file name if the written size is over maxLogSize'''
+
+        with self.lock:
+
+            if self.size <= maxLogSize:
+
+                return
+
+            self.close()
+            self.size = 0
+
+            if not path.exists(self.logfile):
+
+                return
+
+            if fileMode == "overwrite":
+
+                if path.isfile(f"{self.logfile}_old.log"):
+
+                    os.remove(f"{self.logfile}_old.log")
+
+                os.rename(self.logfile, f"{self.logfile}_old.log")
+                return
+
+            elif fileMode == "daily":
+
+                dateStr = ""
+
+            else:
+
+                dateStr = f"_{datetime.now():%Y%m%d_%H%M%S}"
+
+            # Continue from the last index used for the same name
+
+            if self.rotateName != dateStr:
+
+                self.rotateName = dateStr
+                self.rotateIndex = 0
+
+            logCopyFile = f"{self.logfile}{dateStr}{self.rotateIndex}.log"
+
+            while path.isfile(logCopyFile):
+
+                self.rotateIndex += 1
+                logCopyFile = f"{self.logfile}{dateStr}{self.rotateIndex}.log"
+
+            os.rename(self.logfile, logCopyFile)
+            self.rotateIndex += 1
+
+_logFiles: dict[str, _LogFile] = {}
+_logFilesLock = threading.Lock()
+
+def _getLogFile(logfile: str) -> _LogFile:
+
+    """Return the shared log file of the path"""
+
+    logFile = _logFiles.get(logfile)
+
+    if logFile is None:
+
+        with _logFilesLock:
+
+            logFile = _logFiles.setdefault(logfile, _LogFile(logfile))
+
+    return logFile
+
+def _closeLogFiles() -> None:
+
+    """Close all log files"""
+
+    for logFile in list(_logFiles.values()):
+
+        try:
+
+            logFile.close()
+
+        except Exception:
+
+            pass
+
+def _flushLogFilesBeforeFork() -> None:
+
+    """Flush the buffered records so that the forked child does not write them again"""
+
+    for logFile in list(_logFiles.values()):
+
+        try:
+
+            logFile.flush()
+
+        except Exception:
+
+            pass
+
+#
+#################################
+# Async log writer
+
+class _AsyncLogWriter:
+
+    """
+    Background thread that writes the queued log records.\n
+    Records are written in batches to the shared log files, and each file is
+    flushed when its pending bytes reach the flush size of the logger
+    or when the flush interval has passed. The queue is drained at exit.
+    """
+
+    BATCH_SIZE = 1024
+
+    def __init__(self) -> None:
+
+        self.queue = queue.SimpleQueue()
+        self.files: dict[str, _LogFile] = {}
+        self.thread = threading.Thread(target=self.__run, name="MapleLoggerWriter", daemon=True)
+        self.thread.start()
+
+    def put(self, logger: Logger, text: str) -> None:
+
+        self.queue.put((logger, text))
+
+    def flush(self) -> None:
+
+        '''Wait until all records queued before this call are written and flushed'''
+
+        if self.thread.is_alive():
+
+            flushed = threading.Event()
+            self.queue.put(flushed)
+            flushed.wait()
+
+    def stop(self) -> None:
+
+        '''Write the remaining records and stop the thread'''
+
+        if self.thread.is_alive():
+
+            self.queue.put(None)
+            self.thread.join()
+
+    def __run(self) -> None:
+
+        running = True
+
+        while running:
+
+            # Wait for records until the next flush is due
+
+            dueTimes = [logFile.lastFlush + logFile.flushInterval for logFile in self.files.values() if logFile.pending > 0]
+
+            try:
+
+                item = self.queue.get(timeout=max(0.0, min(dueTimes) - time.monotonic()) if dueTimes else None)
+
+            except queue.Empty:
+
+                self.__flushFiles(False)
+                continue
+
+            batch = [item]
+
+            while len(batch) < self.BATCH_SIZE:
+
+                try:
+
+                    batch.append(self.queue.get_nowait())
+
+                except queue.Empty:
+
+                    break
+
+            flushedEvents = []
+            serverBatches: dict[Logger, list[str]] = {}
+
+            for item in batch:
+
+                if item is None:
+
+                    running = False
+
+                elif isinstance(item, threading.Event):
+
+                    flushedEvents.append(item)
+
+                elif item[0].logServer is not None:
+
+                    serverBatches.setdefault(item[0], []).append(item[1])
+
+                else:
+
+                    self.__write(*item)
+
+            if serverBatches:
+
+                self.__sendToServers(serverBatches)
+
+            self.__flushFiles(not running or len(flushedEvents) > 0)
+
+            for flushed in flushedEvents:
+
+                flushed.set()
+
+    def __write(self, logger: Logger, text: str) -> None:
+
+        try:
+
+            logFile = self.files.get(logger.logfile)
+
+            if logFile is None:
+
+                logFile = self.files[logger.logfile] = _getLogFile(logger.logfile)
+
+            logFile.flushInterval = logger.flushInterval
+            logFile.flushSize = logger.flushSize
+            logFile.write(text, logger.encoding, flush=False)
+
+            if logger.maxLogSize > 0:
+
+                logFile.rotate(logger.maxLogSize, logger.fileMode)
+
+        except Exception as ex:
+
+            print(f"Error: Failed to write log: {ex}", file=sys.stderr)
+
+    def __sendToServers(self, serverBatches: dict) -> None:
+
+        '''Send the records of each logger to its log server in one message'''
+
+        for logger, texts in serverBatches.items():
+
+            try:
+
+                _getLogClient(logger.logServer).send(logger, texts)
+
+            except (OSError, EOFError) as ex:
+
+                _dropLogClient(logger.logServer)
+                print(f"Warning: Failed to send log to the log server {logger.logServer}: {ex}. Writing the log file in this process.", file=sys.stderr)
+                logger.logServer = None
+
+                for text in texts:
+
+                    self.__write(logger, text)
+
+    def __flushFiles(self, force: bool) -> None:
+
+        now = time.monotonic()
+
+        for logFile in self.files.values():
+
+            if logFile.pending > 0 and (force or logFile.pending >= logFile.flushSize or now - logFile.lastFlush >= logFile.flushInterval):
+
+                try:
+
+                    logFile.flush()
+
+                except Exception as ex:
+
+                    logFile.pending = 0
+                    print(f"Error: Failed to flush log file: {ex}", file=sys.stderr)
+
+_asyncWriter: _AsyncLogWriter | None = None
+_asyncWriterLock = threading.Lock()
+
+def _getAsyncWriter() -> _AsyncLogWriter:
+
+    """Return the async writer (start the writer thread on first use)"""
+
+    global _asyncWriter
+
+    if _asyncWriter is None:
+
+        with _asyncWriterLock:
+
+            if _asyncWriter is None:
+
+                _asyncWriter = _AsyncLogWriter()
+
+    return _asyncWriter
+
+def _resetAfterFork() -> None:
+
+    """Forget the writer thread and the log files of the parent process in a forked child"""
+
+    global _asyncWriter, _asyncWriterLock, _logFiles, _logFilesLock, _logClients, _logClientsLock, _logServer, _suppressReporter, _suppressReporterLock
+
+    _asyncWriter = None
+    _asyncWriterLock = threading.Lock()
+    _logFiles = {}
+    _logFilesLock = threading.Lock()
+    _logClients = {}
+    _logClientsLock = threading.Lock()
+    _logServer = None
+    _suppressReporter = None
+    _suppressReporterLock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+
+    os.register_at_fork(before=_flushLogFilesBeforeFork, after_in_child=_resetAfterFork)
+
+#
+#################################
+# Log server
+
+# Environment variable that passes the log server address to the worker processes
+
+LOG_SERVER_ENV = "MAPLEX_LOG_SERVER"
+
+class _LogTarget:
+
+    """Log file settings of the records sent to the log server (read by the async writer)"""
+
+    __slots__ = ("logfile", "encoding", "maxLogSize", "fileMode", "flushInterval", "flushSize", "logServer")
+
+    def __init__(self, logfile: str, encoding: str | None, maxLogSize: int, fileMode: str, flushInterval: float, flushSize: int) -> None:
+
+        self.logfile = logfile
+        self.encoding = encoding
+        self.maxLogSize = maxLogSize
+        self.fileMode = fileMode
+        self.flushInterval = flushInterval
+        self.flushSize = flushSize
+        self.logServer = None
+
+def _serveLogClient(conn: Connection, stopServer) -> None:
+
+    """Receive the records of one client process and queue them to the async writer"""
+
+    writer = _getAsyncWriter()
+    targets: dict[tuple, _LogTarget] = {}
+
+    try:
+
+        while True:
+
+            data = conn.recv_bytes()
+
+            if data == b"flush":
+
+                writer.flush()
+                conn.send_bytes(b"ok")
+                continue
+
+            if data == b"stop":
+
+                stopServer()
+                writer.flush()
+                conn.send_bytes(b"ok")
+                return
+
+            # JSON (not pickle) so that a client cannot run code in the server
+
+            *settings, texts = json.loads(data)
+            settings = tuple(settings)
+            target = targets.get(settings)
+
+            if target is None:
+
+                target = targets[settings] = _LogTarget(*settings)
+
+            for text in texts:
+
+                writer.put(target, text)
+
+    except (EOFError, OSError):
+
+        pass
+
+    except Exception as ex:
+
+        print(f"Error: Invalid log record from the client: {ex}", file=sys.stderr)
+
+    finally:
+
+        conn.close()
+
+def _runLogServer(address: str | None, family: str, ready: Connection, removeDirectory: str | None) -> None:
+
+    """Log server process main: accept client connections until stopped"""
+
+    # Ctrl+C is for the application (the server stops when the application stops it or exits)
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    listener = Listener(address, family)
+    ready.send(listener.address)
+    ready.close()
+    stopped = threading.Event()
+
+    def stopServer() -> None:
+
+        stopped.set()
+
+        # Wake up the accept call
+
+        try:
+
+            Client(listener.address, family).close()
+
+        except OSError:
+
+            pass
+
+    try:
+
+        while not stopped.is_set():
+
+            conn = listener.accept()
+
+            if stopped.is_set():
+
+                conn.close()
+                break
+
+            threading.Thread(target=_serveLogClient, args=(conn, stopServer), daemon=True).start()
+
+    finally:
+
+        listener.close()
+        _getAsyncWriter().stop()
+        _closeLogFiles()
+
+        if removeDirectory is not None:
+
+            shutil.rmtree(removeDirectory, ignore_errors=True)
+
+class _LogServerClient:
+
+    """Connection from this process to the log server"""
+
+    def __init__(self, address: str) -> None:
+
+        self.address = address
+        self.lock = threading.Lock()
+        self.conn = Client(address, _addressFamily(address))
+
+    def send(self, logger: Logger, texts: list[str]) -> None:
+
+        '''Send the records of the logger in one message'''
+
+        data = json.dumps([logger.logfile, logger.encoding, logger.maxLogSize, logger.fileMode, logger.flushInterval, logger.flushSize, texts], ensure_ascii=False).encode()
+
+        with self.lock:
+
+            self.conn.send_bytes(data)
+
+    def request(self, command: bytes) -> None:
+
+        '''Send the command and wait for the reply'''
+
+        with self.lock:
+
+            self.conn.send_bytes(command)
+            self.conn.recv_bytes()
+
+    def close(self) -> None:
+
+        with self.lock:
+
+            self.conn.close()
+
+_logClients: dict[str, _LogServerClient] = {}
+_logClientsLock = threading.Lock()
+
+def _addressFamily(address: str) -> str:
+
+    return "AF_PIPE" if address.startswith("\\\\") else "AF_UNIX"
+
+def _getLogClient(address: str) -> _LogServerClient:
+
+    """Return the connection to the log server (connect on first use)"""
+
+    client = _logClients.get(address)
+
+    if client is None:
+
+        with _logClientsLock:
+
+            client = _logClients.get(address)
+
+            if client is None:
+
+                client = _logClients[address] = _LogServerClient(address)
+
+    return client
+
+def _dropLogClient(address: str) -> None:
+
+    """Forget the broken connection to the log server"""
+
+    client = _logClients.pop(address, None)
+
+    if client is not None:
+
+        try:
+
+            client.close()
+
+        except OSError:
+
+            pass
+
+_logServer: tuple | None = None
+
+def startLogServer(address: str | None = None) -> str:
+
+    """
+    Start the log server process that writes and rotates the log files for all processes.\n
+    Loggers with logServer=address (or created after this call in this process and
+    its child processes, by the MAPLEX_LOG_SERVER environment variable) send their
+    file records to the server instead of writing the log files.\n
+    address is a Unix socket path (a named pipe on Windows). If it is None,
+    a socket in a new private temporary directory is used.\n
+    Return the server address.
+    """
+
+    global _logServer
+
+    if _logServer is not None:
+
+        return _logServer[1]
+
+    removeDirectory = None
+
+    if address is None and sys.platform != "win32":
+
+        removeDirectory = tempfile.mkdtemp(prefix="maplex_log_")
+        address = path.join(removeDirectory, "log.sock")
+
+    family = "AF_PIPE" if sys.platform == "win32" else "AF_UNIX"
+    readyReceiver, readySender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_runLogServer, args=(address, family, readySender, removeDirectory), name="MapleLogServer", daemon=True)
+    process.start()
+    readySender.close()
+
+    try:
+
+        address = readyReceiver.recv()
+
+    except EOFError as ex:
+
+        raise MapleLoggerException("Failed to start the log server") from ex
+
+    finally:
+
+        readyReceiver.close()
+
+    _logServer = (process, address)
+    os.environ[LOG_SERVER_ENV] = address
+    return address
+
+def stopLogServer() -> None:
+
+    """Write the remaining records and stop the log server started by startLogServer"""
+
+    global _logServer
+
+    if _logServer is None:
+
+        return
+
+    process, address = _logServer
+    _logServer = None
+
+    if os.environ.get(LOG_SERVER_ENV) == address:
+
+        del os.environ[LOG_SERVER_ENV]
+
+    _dropLogClient(address)
+
+    try:
+
+        client = _LogServerClient(address)
+        client.request(b"stop")
+        client.close()
+
+    except (OSError, EOFError):
+
+        pass
+
+    process.join(5)
+
+    if process.is_alive():
+
+        process.terminate()
+
+#
+#################################
+# Shutdown
+
+def _shutdownLogging() -> None:
+
+    """
+    Output the summaries of the suppressed records, write the queued records,
+    stop the log server and close the log files at exit (in this order).
+    """
+
+    if _suppressReporter is not None:
+
+        _suppressReporter.reportAll()
+
+    if _asyncWriter is not None:
+
+        _asyncWriter.stop()
+
+    stopLogServer()
+    _closeLogFiles()
+
+atexit.register(_shutdownLogging)
+
 # Dictionary to hold Logger instances
 
 _loggers: dict[str, Logger] = {}
@@ -840,7 +2243,6 @@ ToDo list:
 
 * Logger *
 
-- Add option to set date format
 - Add set* functions
 - Configure log format in config file
 
@@ -1,25 +1,64 @@
+import mmap
+import os
 import os.path as path
-from cryptography.fernet import Fernet
+import re
+import threading
+from collections.abc import Callable
+from contextlib import contextmanager
 from . import mapleExceptions as mExc
+from .mapleCrypto import encryptChunked, getFernet, keyList, openDecrypted, writeChunked
+from .mapleDocument import MapleHeader, MapleLine, convertValue, dumpDict, formatValue, indexMaple, loadDict, parseMaple, renderMaple
+from .utils import DURABILITY_LEVELS, lockFile, unlockFile, writeFileAtomic
 import warnings
+from collections import OrderedDict
+
+_mapleLinePattern = re.compile(rb"^MAPLE\r?\n", re.M)
 
 class MapleTree:
 
-    def __init__(self, fileName: str, tabInd: int = 4, encrypt: bool = False, key: bytes | None = None, createBaseFile: bool = False):
+    def __init__(self, fileName: str, tabInd: int = 4, encrypt: bool = False, key: bytes | None = None, createBaseFile: bool = False, lazyLoad: bool = False, durability: str = "flush", readCacheSize: int = 0, chunkSize: int = 0):
 
         """
         key must be base_64 bytes.
+        If lazyLoad is True, map the unencrypted file to memory and
+        read the tag lines of each block when the block is accessed first.
+        durability is the save mode (none, flush or fsync) of writeFileAtomic.
+        If readCacheSize is more than 0, keep up to readCacheSize readMapleTag results.
+        If chunkSize is more than 0, save the encrypted file in the chunked encryption format
+        with chunkSize bytes segments (files in the chunked format keep their format).
         """
 
         self.TAB_FORMAT = " " * tabInd
         self.ENCRYPT = encrypt
         self.KEY = key
         self.fileName = fileName
+        self._batchDepth = 0
+        self._batchJournal: dict[MapleHeader, dict] | None = None
+        self._batchSave = False
+        self._buffer: mmap.mmap | None = None
+        self._lockFd: int | None = None
+        self._lockDepth = 0
+        self._lockExclusive = False
 
         if encrypt and key is None:
 
             raise mExc.KeyEmptyException(fileName)
 
+        if durability not in DURABILITY_LEVELS:
+
+            raise mExc.MapleValueException(f"Durability level must be one of {DURABILITY_LEVELS}: {durability}")
+
+        self.DURABILITY = durability
+        self.LAZY_LOAD = lazyLoad
+        self._watcher: threading.Thread | None = None
+        self._watcherStop: threading.Event | None = None
+        self._readCache: OrderedDict[tuple[tuple, str], str | None] | None = OrderedDict() if readCacheSize > 0 else None
+        self._readCacheSize = readCacheSize
+        self._cacheHits = 0
+        self._cacheMisses = 0
+        self.CHUNK_SIZE = chunkSize
+        self._chunkState: tuple | None = None
+
         if createBaseFile and not path.isfile(fileName):
 
             # Create a base Maple file
@@ -32,48 +71,65 @@ class MapleTree:
 
                     # Encrypt data
 
-                    mapleBaseString = Fernet(key).encrypt(mapleBaseString.encode())
-                    writeMode = "wb"
+                    if chunkSize > 0:
 
-                else:
+                        mapleBaseString = encryptChunked(mapleBaseString.encode(), key, chunkSize)
 
-                    writeMode = "w"
+                    else:
 
-                with open(fileName, writeMode) as f:
+                        mapleBaseString = getFernet(key).encrypt(mapleBaseString.encode())
 
-                    f.write(mapleBaseString)
+                writeFileAtomic(fileName, mapleBaseString, durability)
 
             except Exception as e:
 
                 raise mExc.MapleException(e) from e
 
+        self.__setDocument(*self.__loadFile())
+
+    #
+    ##############################
+    # Load file
+
+    def __loadFile(self) -> tuple:
+
+        """Read and parse the file.\n
+        Return (root, prologue, epilogue, mapped buffer, file signature, chunked encryption state)."""
+
+        fileName = self.fileName
+
         try:
 
-            if encrypt:
+            signature = self.__statFile()
+
+            chunkState = None
+
+            if self.LAZY_LOAD and not self.ENCRYPT:
+
+                return *self.__mapFile(), signature, chunkState
+
+            if self.ENCRYPT:
 
                 with open(fileName, "rb") as f:
                         
-                    # Decode encryption
+                    # Decode encryption (split lines in the same way as reading a text file)
                     
-                    fileData = f.read()
-                    fileData = Fernet(key).decrypt(fileData).decode()
-                    self.fileStream = fileData.split("\n")
-
-                    # Add \n at the end of each line
+                    textStream, chunkedReader = openDecrypted(f, self.KEY)
+                    fileLines = textStream.readlines()
 
-                    for i, fileLine in enumerate(self.fileStream):
+                if chunkedReader is not None:
 
-                        self.fileStream[i] = f"{fileLine}\n"
+                    chunkState = (chunkedReader.key, chunkedReader.chunkSize, chunkedReader.salt, chunkedReader.digests)
 
             else:
 
                 with open(fileName, "r") as f:
                 
-                    self.fileStream = f.readlines()
+                    fileLines = f.readlines()
 
             # If the file is empty
 
-            if len(self.fileStream) == 0:
+            if len(fileLines) == 0:
 
                 raise mExc.MapleFileEmptyException(fileName)
 
@@ -81,20 +137,19 @@ class MapleTree:
 
             try:
 
-                self.mapleIndex = self.fileStream.index("MAPLE\n")
+                mapleIndex = fileLines.index("MAPLE\n")
 
             except ValueError as ve:
 
                 raise mExc.NotAMapleFileException(fileName) from ve
             
-            # Find EOF index
+            # Parse data region
 
-            self.eofIndex = len(self.fileStream) - 1
-            self.eofIndex = self._findEof(self.mapleIndex)
+            root, eofIndex = parseMaple(fileLines, mapleIndex, fileName)
 
-            # Check data format
+            # Keep lines outside the data region as they are
 
-            self._mapleFormatter()
+            return root, fileLines[:mapleIndex + 1], fileLines[eofIndex:], None, signature, chunkState
             
         except mExc.MapleFileEmptyException:
 
@@ -112,6 +167,99 @@ class MapleTree:
 
             raise mExc.MapleException(ex) from ex
 
+    def __setDocument(self, root: MapleHeader, prologue: list[str], epilogue: list[str], buffer: mmap.mmap | None, signature: tuple, chunkState: tuple | None) -> None:
+
+        """Swap in the parsed document"""
+
+        self._chunkState = chunkState
+        self._prologue = prologue
+        self._epilogue = epilogue
+        self._buffer = buffer
+        self._fileSignature = signature
+        self._root = root
+        self.clearReadCache()
+
+    def __statFile(self) -> tuple[int, int, int]:
+
+        """Return the file signature (inode, size, modified time)"""
+
+        fileStat = os.stat(self.fileName)
+        return fileStat.st_ino, fileStat.st_size, fileStat.st_mtime_ns
+
+    #
+    ##############################
+    # Map file to memory
+
+    def __mapFile(self) -> tuple:
+
+        """Map the file to memory and index the header blocks.\n
+        Return (root, prologue, epilogue, mapped buffer)."""
+
+        with open(self.fileName, "rb") as f:
+
+            if path.getsize(self.fileName) == 0:
+
+                raise mExc.MapleFileEmptyException(self.fileName)
+
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Search data region
+
+        mapleMatch = _mapleLinePattern.search(buffer)
+
+        if mapleMatch is None:
+
+            buffer.close()
+            raise mExc.NotAMapleFileException(self.fileName)
+
+        # Index data region
+
+        try:
+
+            root, eofPos = indexMaple(buffer, mapleMatch.end(), self.fileName)
+
+        except Exception:
+
+            buffer.close()
+            raise
+
+        # Keep lines outside the data region as they are
+
+        return root, self.__decodeLines(buffer[:mapleMatch.end()]), self.__decodeLines(buffer[eofPos:]), buffer
+
+    @staticmethod
+    def __decodeLines(data: bytes) -> list[str]:
+
+        """Decode buffer data to lines (same as text mode readlines)"""
+
+        return [f"{fileLine.rstrip(chr(13) + chr(10))}\n" if fileLine[-1] in "\r\n" else fileLine for fileLine in data.decode().splitlines(keepends=True)]
+
+    def __releaseBuffer(self) -> None:
+
+        """Close the memory mapped file after all blocks are loaded"""
+
+        if self._buffer is not None:
+
+            self._buffer.close()
+            self._buffer = None
+
+    #
+    ##############################
+    # File stream
+
+    @property
+    def fileStream(self) -> list[str]:
+
+        """Return the file lines rendered from the current data."""
+
+        return self._prologue + renderMaple(self._root, self.TAB_FORMAT).splitlines(keepends=True) + self._epilogue
+
+    def __renderFile(self) -> str:
+
+        """Return the file data rendered from the current data."""
+
+        return f"{''.join(self._prologue)}{renderMaple(self._root, self.TAB_FORMAT)}{''.join(self._epilogue)}"
+
     #
     ##############################
     # Getters and setters
@@ -159,448 +307,520 @@ class MapleTree:
     ##############################
     # Lock file instance
 
-    #
-    ##############################
-    # Unlock file instance
+    def lock(self, exclusive: bool = True, timeout: float | None = None) -> None:
 
-    #
-    ##############################
-    # Read file
+        """
+        Lock the Maple file against other processes.\n
+        If exclusive is False, take a shared lock for reading that other readers can also hold.\n
+        Wait until the lock is taken if timeout is None,
+        or raise MapleFileLockedException after timeout seconds.\n
+        The lock is taken on "<fileName>.lock" because saving replaces the Maple file.
+        Nested lock calls only count up until the same number of unlock calls.\n
+        Saves without the lock take the exclusive lock only while the file is written,
+        so hold the lock around reload, edit and save to keep the changes of other processes.
+        """
 
-    #
-    ##############################
-    # Change encryption key
+        if self._lockDepth > 0:
 
-    def changeEncryptionKey(self, newKey: bytes, save: bool = False) -> None:
+            if exclusive and not self._lockExclusive:
+
+                raise mExc.MapleFileLockedException(self.fileName, "Shared lock cannot be changed to exclusive lock")
+
+            self._lockDepth += 1
+            return
+
+        try:
+
+            lockFd = lockFile(f"{self.fileName}.lock", exclusive, timeout)
+
+        except Exception as e:
+
+            raise mExc.MapleException(e) from e
+
+        if lockFd is None:
+
+            raise mExc.MapleFileLockedException(self.fileName)
+
+        self._lockFd = lockFd
+        self._lockDepth = 1
+        self._lockExclusive = exclusive
+
+    @contextmanager
+    def locked(self, exclusive: bool = True, timeout: float | None = None):
 
         """
-        Change encryption key to newKey.
-        If save is True, overwrite the file with new encryption.
+        Lock the Maple file in the with block.\n
+        with mapleTree.locked():\n
+            mapleTree.saveValue(...)
         """
 
-        if not self.ENCRYPT:
+        self.lock(exclusive, timeout)
 
-            raise mExc.MapleEncryptionNotEnabledException(self.fileName)
+        try:
 
-        self.KEY = newKey
+            yield self
 
-        if save:
+        finally:
 
-            self._saveToFile()
+            self.unlock()
+
+    def isLocked(self) -> bool:
+
+        """Return if the instance holds the file lock."""
+
+        return self._lockDepth > 0
 
     #
     ##############################
-    # Encrypt data
+    # Unlock file instance
 
-    def __encryptData(self) -> bytes:
+    def unlock(self) -> None:
 
         """
-        Return encrypted base_64 string
+        Release the file lock taken by lock().
+        Do nothing if the instance does not hold the lock.
         """
 
-        fileData = "".join(self.fileStream).encode()
-        fileData = Fernet(self.KEY).encrypt(fileData)
+        if self._lockDepth == 0:
+
+            return
+
+        self._lockDepth -= 1
+
+        if self._lockDepth == 0:
+
+            lockFd = self._lockFd
+            self._lockFd = None
+
+            try:
+
+                unlockFile(lockFd)
 
-        return fileData
+            except Exception as e:
+
+                raise mExc.MapleException(e) from e
 
     #
     ##############################
-    # Save to file
+    # Read file
+
+    def reload(self) -> None:
 
-    def _saveToFile(self):
         """
-        Save current file stream to file
+        Read the file again and swap in the new data.\n
+        Unsaved changes are discarded.
+        The current data is kept if the file cannot be read.
         """
 
-        # Create file data
+        if self._batchDepth > 0:
+
+            raise mExc.MapleException("Cannot reload the file in the batch")
+
+        # Wait for the save of a lock holder if the lock file is used
+
+        autoLock = self._lockDepth == 0 and path.isfile(f"{self.fileName}.lock")
+
+        if autoLock:
+
+            self.lock(exclusive=False)
 
         try:
 
-            if self.ENCRYPT:
+            self.__setDocument(*self.__loadFile())
 
-                fileData = self.__encryptData()
+        finally:
 
-                # Save to file
+            if autoLock:
 
-                with open(self.fileName, "wb") as f:
+                self.unlock()
 
-                    f.write(fileData)
+    def reloadIfChanged(self) -> bool:
 
-            else:
+        """
+        Reload the file if its inode, size or modified time has changed.\n
+        Return True if the file was reloaded.
+        """
 
-                fileData = "".join(self.fileStream)
+        try:
 
-                # Save to file
+            signature = self.__statFile()
 
-                with open(self.fileName, "w") as f:
+        except FileNotFoundError as fnfe:
 
-                    f.writelines(fileData)
+            raise mExc.MapleFileNotFoundException(self.fileName) from fnfe
 
-        except Exception as e:
+        if signature == self._fileSignature:
+
+            return False
+
+        self.reload()
+        return True
 
-            raise mExc.MapleException(e) from e
-        
     #
     ##############################
-    # Remove white space
+    # Read cache
 
-    def __removeWhiteSpace(self, strLine: str) -> str:
+    def getReadCacheStats(self) -> dict[str, int]:
 
-        strLen = len(strLine)
-        ind = 0
+        """Return the read cache hits, misses, size and max size."""
 
-        while ind < strLen:
+        return {
+            "hits": self._cacheHits,
+            "misses": self._cacheMisses,
+            "size": 0 if self._readCache is None else len(self._readCache),
+            "maxSize": self._readCacheSize
+        }
 
-            if strLine[ind] != " " and strLine[ind] != "\t":
-                break
+    def clearReadCache(self) -> None:
 
-            ind += 1
+        """Remove all read cache entries."""
 
-        return strLine[ind:strLen]
+        if self._readCache is not None:
 
-    #
-    ################################
-    # Get tag
+            self._readCache.clear()
 
-    def __getTag(self, mapleLine: str) -> str:
+    def __invalidateCache(self, headers: tuple | list, tag: str | None = None) -> None:
 
-        """Get a tag from a data line."""
+        """Remove the cache entry of the tag, or all entries in the headers subtree if tag is None"""
 
-        if mapleLine == "":
-            return ""
+        readCache = self._readCache
 
-        # Remove white space in front and add return at the end
+        if not readCache:
 
-        mapleLine = f"{self.__removeWhiteSpace(mapleLine)}\n"
-        strLen = len(mapleLine)
+            return
 
-        # Start read tag
+        headers = tuple(headers)
 
-        try:
+        if tag is not None:
 
-            for ind in range(0, strLen):
-            
-                if mapleLine[ind] == " " or mapleLine[ind] == "\n" or mapleLine[ind] == "\r":
-                    break
-        
-        except Exception as ex:
+            readCache.pop((headers, tag), None)
+            return
+
+        headersLen = len(headers)
 
-            raise mExc.MapleException from ex
+        for cacheKey in [cacheKey for cacheKey in readCache if cacheKey[0][:headersLen] == headers]:
 
-        return mapleLine[:ind]
+            del readCache[cacheKey]
 
     #
-    ###########################
-    # Get value
+    ##############################
+    # Watch file
 
-    def __getValue(self, mapleLine: str) -> str:
+    def startWatcher(self, interval: float = 1.0, onReload: Callable[["MapleTree"], None] | None = None) -> None:
 
-        """Get a value from a data line."""
+        """
+        Start a background thread that checks the file every interval seconds
+        and reloads it when it has changed.\n
+        onReload(mapleTree) is called after each reload.
+        The new data is swapped in at once, so readers are never blocked.
+        Use the watcher for read only instances because reloading discards unsaved changes.
+        """
 
-        ind = 0
+        if self._watcher is not None:
 
-        # Remove white space in front
+            return
 
-        mapleLine = self.__removeWhiteSpace(mapleLine)
-        strLen = len(mapleLine)
-        
-        if strLen < 2 or mapleLine == "":
-            return ""
+        watcherStop = threading.Event()
 
-        # Remove tag
+        def watchFile() -> None:
 
-        try:
-            for ind in range(0, strLen):
+            while not watcherStop.wait(interval):
 
-                if mapleLine[ind] == " " or mapleLine[ind] == "\n" or mapleLine[ind] == "\r":
-                    ind += 1
-                    break
+                try:
 
-        except Exception as ex:
+                    if self.reloadIfChanged() and onReload is not None:
 
-            raise mExc.MapleException from ex
+                        onReload(self)
 
-        # Return value
+                except mExc.MapleException:
 
-        if ind >= strLen - 1:
+                    # Keep the current data (the file may be being written by another process)
 
-            return ""
-        
-        else:
+                    continue
 
-            return mapleLine[ind:strLen - 1]
-        
-    #
-    ####################################
-    # Header not found exception handler
+        self._watcherStop = watcherStop
+        self._watcher = threading.Thread(target=watchFile, name=f"MapleWatcher-{self.fileName}", daemon=True)
+        self._watcher.start()
 
-    def __headerNotFoundExceptionHandler(self, headInd: int, headers: tuple) -> None:
+    def stopWatcher(self) -> None:
 
-        if headInd < 1:
+        """Stop the background watcher thread."""
 
-            raise mExc.MapleHeaderNotFoundException(self.fileName, headers[headInd])
-        
-        else:
+        if self._watcher is None:
 
-            raise mExc.MapleHeaderNotFoundException(self.fileName, headers[headInd], headers[headInd - 1])
-    #
-    #################################
-    # Find EOF
+            return
 
-    def _findEof(self, startInd: int) -> int:
+        self._watcherStop.set()
 
-        """"Find EOF line index"""
+        if self._watcher is not threading.current_thread():
 
-        listLen = len(self.fileStream) - 1
+            self._watcher.join()
 
-        while startInd < listLen:
+        self._watcher = None
+        self._watcherStop = None
 
-            startInd += 1
-            lineTag = self.__getTag(self.fileStream[startInd])
+    #
+    ##############################
+    # Change encryption key
 
-            if lineTag == "H":
+    def changeEncryptionKey(self, newKey: bytes, save: bool = False) -> None:
 
-                # Check for comment block
+        """
+        Change encryption key to newKey.
+        If save is True, overwrite the file with new encryption.
+        """
 
-                lineValue = self.__getValue(self.fileStream[startInd])
+        if not self.ENCRYPT:
 
-                if lineValue[:2] == "#*":
+            raise mExc.MapleEncryptionNotEnabledException(self.fileName)
 
-                    # Skip comment block
+        self.KEY = newKey
 
-                    startInd = self.__ToCommentEnd(startInd)
-            
-            elif lineTag == "EOF":
+        if save:
 
-                return startInd
-            
-        raise mExc.InvalidMapleFileFormatException(self.fileName)
+            self._saveToFile()
 
     #
-    #################################
-    # ToE
+    ##############################
+    # Encrypt data
 
-    def __ToE(self, curInd: int) -> int:
+    def __encryptData(self) -> bytes:
 
-        """Return E tag line index of current level
-        Raise"""
+        """
+        Return encrypted base_64 string
+        """
 
-        while curInd < self.eofIndex:
+        return getFernet(self.KEY).encrypt(self.__renderFile().encode())
 
-            curInd += 1
-            mapleLine = self.fileStream[curInd]
-            mapleTag = self.__getTag(mapleLine)
+    #
+    ##############################
+    # Chunked encryption
 
-            if mapleTag == "E":
+    def __getChunkSize(self) -> int:
 
-                return curInd
-            
-            elif mapleTag == "H":
+        """Return the chunk size to save, or 0 for the single token format"""
 
-                # Check for comment block
+        if not self.ENCRYPT:
 
-                lineValue = self.__getValue(mapleLine)
+            return 0
 
-                if lineValue[:2] == "#*":
+        if self.CHUNK_SIZE > 0:
 
-                    # Skip comment block
+            return self.CHUNK_SIZE
 
-                    curInd = self.__ToCommentEnd(curInd)
+        return 0 if self._chunkState is None else self._chunkState[1]
 
-                else:
+    def __saveChunked(self, chunkSize: int) -> None:
 
-                    # Skip to its E
+        """Save the encrypted file in the chunked encryption format.
+        Only the changed segments are rewritten if durability is none."""
 
-                    curInd = self.__ToE(curInd)
+        previous = None
+        chunkState = self._chunkState
+        encryptionKey = keyList(self.KEY)[0]
 
-        raise mExc.InvalidMapleFileFormatException(self.fileName)
-    
-    def __ToCommentEnd(self, curInd: int) -> int:
+        # Segments can be rewritten in place only if the file is encrypted with the key used for saving
 
-        """Return comment block end line index of current level
-        Raise if not found"""
+        if chunkState is not None and chunkState[0] == encryptionKey and chunkState[1] == chunkSize:
 
-        while curInd < self.eofIndex:
+            previous = chunkState[2:]
 
-            curInd += 1
-            mapleLine = self.__removeWhiteSpace(self.fileStream[curInd]).rstrip()
+        salt, digests = writeChunked(self.fileName, self.__renderFile().encode(), self.KEY, chunkSize, self.DURABILITY, previous)
+        self._chunkState = (encryptionKey, chunkSize, salt, digests)
 
-            if mapleLine == "E *#":
+    #
+    ##############################
+    # Save to file
 
-                return curInd
+    def _saveToFile(self):
+        """
+        Save current file stream to file.\n
+        The exclusive file lock is taken while the file is written
+        if the instance does not hold the file lock.
+        """
 
-        raise mExc.InvalidMapleFileFormatException(self.fileName)
+        autoLock = self._lockDepth == 0
 
-    #
-    ######################
-    # Format maple file
+        # Create file data
 
-    def _mapleFormatter(self, willSave: bool = False):
+        try:
 
-        """Format Maple stream
-        and save to file if willSave is True"""
+            if autoLock:
 
-        try:
+                self.lock()
 
-            ind = 0
-            i = self.mapleIndex
+            chunkSize = self.__getChunkSize()
 
-            # Format
+            if chunkSize > 0:
 
-            while i <= len(self.fileStream) - 1:
+                self.__saveChunked(chunkSize)
 
-                mapleLine = self.__removeWhiteSpace(self.fileStream[i])
-                tag = self.__getTag(mapleLine)
+            else:
 
-                if tag == "EOF":
+                if self.ENCRYPT:
 
-                    if ind != 0:
+                    fileData = self.__encryptData()
 
-                        raise mExc.InvalidMapleFileFormatException(self.fileName, "EOF tag in the middle of the data")
-                    
-                    break
+                else:
 
-                elif tag == "E":
+                    fileData = self.__renderFile()
 
-                    ind -= 1
+                # All blocks are loaded by rendering.
+                # Unmap the file before it is overwritten
 
-                if ind < 0:
+                self.__releaseBuffer()
 
-                    raise mExc.InvalidMapleFileFormatException(self.fileName)
+                # Save to file
 
-                self.fileStream[i] = f"{self.TAB_FORMAT * ind}{mapleLine}"
+                writeFileAtomic(self.fileName, fileData, self.DURABILITY)
 
-                if tag == "H":
+            self._fileSignature = self.__statFile()
 
-                    if self.__getValue(mapleLine)[:2] == "#*":
+        except Exception as e:
 
-                        # Comment block
+            raise mExc.MapleException(e) from e
 
-                        i = self.__ToCommentEnd(i)
+        finally:
 
-                    else:
-                        
-                        ind += 1
+            if autoLock:
 
-                i += 1
+                self.unlock()
+        
+    #
+    ##############################
+    # Batch
 
-        except mExc.InvalidMapleFileFormatException:
+    @contextmanager
+    def batch(self, save: bool = True):
 
-            raise
+        """Group changes and save the file once at the end.\n
+        with mapleTree.batch():
+            mapleTree.saveValue(...)
+            mapleTree.deleteValue(...)\n
+        Changes are applied to the buffer when each function is called,
+        and save=True in the functions is deferred until the end of the batch.
+        If save is True, the file is saved once if anything was changed.
+        If an exception is raised in the batch, all the changes are rolled back.
+        Nested batches are part of the outer batch."""
 
-        except Exception as ex:
+        if self._batchDepth > 0:
 
-            raise mExc.MapleException(ex) from ex
-        
-        # Save to file
-        
-        if willSave:
-            
-            self._saveToFile()
+            self._batchDepth += 1
 
-    #
-    #################################
-    # Find header
+            try:
 
-    def _findHeader(self, headers: tuple) -> tuple[bool, int, int]:
+                yield self
 
-        """Serch header index.\n
-        If the headers exist, return True, last header line index.\n
-        If the headers does not exist, return False, E line index, last found headers index."""
+            finally:
 
-        headCount = len(headers)
-        ind = 0
-        lineIndex = self.mapleIndex
-        eInd = self.eofIndex
+                self._batchDepth -= 1
 
-        if "#*" in headers:
+            return
 
-            # Cannot search inside comment block
+        self._batchDepth = 1
+        self._batchJournal = {}
+        self._batchSave = False
 
-            headerIndex = headers.index("#*")
-            raise mExc.MapleSyntaxException(f"Cannot search inside comment block: Comment block header \"#*\" found in search headers list at index {headerIndex}")
+        try:
 
-        if len(headers) == 0:
+            yield self
 
-            # Return root block (No headers provided)
-            return True, self.eofIndex, self.mapleIndex
+        except BaseException:
 
-        # Find header
+            # Roll back changed header blocks
 
-        try:
+            for headerNode, children in self._batchJournal.items():
 
-            while lineIndex < eInd:
+                headerNode.children = children
+                headerNode.touch()
 
-                mapleLine = self.fileStream[lineIndex]
-                mapleTag = self.__getTag(mapleLine)
+            self.clearReadCache()
 
-                if mapleTag == "H":
+            raise
 
-                    lineValue = self.__getValue(mapleLine)
+        else:
 
-                    if lineValue[:2] == "#*":
+            willSave = self._batchSave or (save and len(self._batchJournal) > 0)
 
-                        # Comment block
+        finally:
 
-                        lineIndex = self.__ToCommentEnd(lineIndex)
+            self._batchDepth = 0
+            self._batchJournal = None
+            self._batchSave = False
 
-                    elif lineValue == headers[ind]:
+        if willSave:
 
-                        if ind == headCount - 1:
+            self._saveToFile()
 
-                            headInd = lineIndex
-                            eInd = self.__ToE(headInd)
-                            
-                            return True, eInd, headInd
+    def __journalHeader(self, headerNode: MapleHeader) -> None:
 
-                        ind += 1
+        """Keep the header block children before the first change in the batch"""
 
-                    else:
+        if self._batchJournal is not None and headerNode not in self._batchJournal:
 
-                        # Skip to E
+            self._batchJournal[headerNode] = dict(headerNode.children)
 
-                        lineIndex = self.__ToE(lineIndex)
+    def __saveChanges(self) -> None:
 
-                elif mapleTag == "E":
+        """Save to file now, or at the end of the batch"""
 
-                    if ind <= 0:
+        if self._batchDepth > 0:
 
-                        raise mExc.InvalidMapleFileFormatException(self.fileName)
-                    
-                    return False, lineIndex, ind
+            self._batchSave = True
 
-                lineIndex += 1
+        else:
 
-        except mExc.InvalidMapleFileFormatException:
+            self._saveToFile()
 
-            raise
+    #
+    ####################################
+    # Header not found exception handler
 
-        except Exception as e:
+    def __headerNotFoundExceptionHandler(self, headInd: int, headers: tuple) -> None:
+
+        if headInd < 1:
+
+            raise mExc.MapleHeaderNotFoundException(self.fileName, headers[headInd])
         
-            raise mExc.MapleException(e) from e
+        else:
+
+            raise mExc.MapleHeaderNotFoundException(self.fileName, headers[headInd], headers[headInd - 1])
 
-        return False, eInd, ind
-    
     #
     #################################
-    # Find tag line
+    # Get header
 
-    def _findTagLine(self, tag: str, headInd: int, eInd: int) -> int:
+    def _getHeader(self, headers: tuple, create: bool = False) -> MapleHeader:
 
-        while headInd < eInd:
+        """Return the header block of headers.\n
+        If the headers does not exist, create new headers if create is True,
+        or raise MapleHeaderNotFoundException."""
 
-            headInd += 1
-            tagLine = self.__getTag(self.fileStream[headInd])
+        if "#*" in headers:
 
-            if tagLine == "H":
+            # Cannot search inside comment block
 
-                headInd = self.__ToE(headInd)
+            headerIndex = list(headers).index("#*")
+            raise mExc.MapleSyntaxException(f"Cannot search inside comment block: Comment block header \"#*\" found in search headers list at index {headerIndex}")
 
-            elif tagLine == tag:
+        node = self._root
 
-                return headInd
-            
-        raise mExc.MapleTagNotFoundException(self.fileName, tag)
+        for headInd, header in enumerate(headers):
+
+            childNode = node.getHeader(header)
+
+            if childNode is None:
+
+                if not create:
+
+                    self.__headerNotFoundExceptionHandler(headInd, headers)
+
+                self.__journalHeader(node)
+                childNode = node.addHeader(header)
+
+            node = childNode
+
+        return node
 
     #
     #################################
@@ -612,115 +832,188 @@ class MapleTree:
         Read a Maple file tag line value in headers
         '''
 
-        headInd = self.mapleIndex
-        eInd = self.eofIndex
+        readCache = self._readCache
 
-        # Serch headers
+        if readCache is not None:
 
-        isFound, eInd, headInd = self._findHeader(headers)
+            cacheKey = (headers, tag)
 
-        if not isFound:
+            try:
 
-            self.__headerNotFoundExceptionHandler(headInd, headers)
+                value = readCache[cacheKey]
+                readCache.move_to_end(cacheKey)
+                self._cacheHits += 1
+                return value
+
+            except KeyError:
+
+                self._cacheMisses += 1
+
+        # Serch headers
+
+        root = self._root
+        headerNode = self._getHeader(headers)
 
         # Find tag
 
-        try:
+        line = headerNode.getLine(tag)
+        value = None if line is None else line.value
 
-            ind = self._findTagLine(tag, headInd, eInd)
-            return self.__getValue(self.fileStream[ind])
+        if readCache is not None and self._root is root:
 
-        except mExc.MapleTagNotFoundException:
+            # Do not keep the value if the file was reloaded while reading
 
-            return None
-        
-        except Exception as e:
+            readCache[cacheKey] = value
 
-            raise mExc.MapleException(e) from e
+            if len(readCache) > self._readCacheSize:
+
+                readCache.popitem(last=False)
+
+        return value
 
     #
-    ###############################
-    # Save tag line (easier to write)
+    #################################
+    # Read typed value
 
-    def saveValue(self, tag: str, value: any, *headers: str, **kwargs) -> None:
+    def readTyped(self, valueType: type | str, tag: str, *headers: str, default: any = None) -> any:
 
-        """Save valueStr to tag in headers.\n
-        If the headers does not exist, create new headers.\n
-        Overwrte file if save == True"""
+        """
+        Read a tag line value in headers converted to valueType
+        (int, float, bool, str or "json").\n
+        Return default if the tag does not exist.
+        The converted value is kept with the tag line until the line is changed,
+        so do not modify the returned list or dict from JSON values.
+        """
 
-        willSave = kwargs.get('save', False)
-        self.saveTagLine(tag, f"{value}", willSave, *headers)
-    #
-    ###################################################
-    # Save tag line (out of support)
+        line = self._getHeader(headers).getLine(tag)
 
-    def saveTagLine(self, tag: str, valueStr: str, willSave: bool, *headers: str) -> None:
+        if line is None:
 
-        """(Out of support)\n
-        Save valueStr to tag in headers.\n
-        If the headers does not exist, create new headers.\n
-        Overwrte file if sillSave == True"""
+            return default
 
-        warnings.warn("saveTagLine is out of support. Use saveValue instead.", DeprecationWarning)
+        try:
 
-        # Find headers
+            return convertValue(line, valueType)
 
-        isHead, eInd, headInd = self._findHeader(headers)
+        except ValueError as ve:
 
-        if not isHead:
+            raise mExc.MapleValueException(f"Cannot convert [{tag}] value to {getattr(valueType, '__name__', valueType)}: {line.value}") from ve
 
-            # Create new headers
+    def readInt(self, tag: str, *headers: str, default: int | None = None) -> int | None:
 
-            headLen = len(headers)
+        """Read a tag line value in headers as int."""
 
-            while headInd < headLen:
+        return self.readTyped(int, tag, *headers, default=default)
 
-                self.fileStream.insert(eInd, f"H {headers[headInd]}\n")
-                eInd += 1
-                self.fileStream.insert(eInd, "E\n")
-                headInd += 1
+    def readFloat(self, tag: str, *headers: str, default: float | None = None) -> float | None:
 
-            tagInd = eInd
+        """Read a tag line value in headers as float."""
 
-        else:
+        return self.readTyped(float, tag, *headers, default=default)
+
+    def readBool(self, tag: str, *headers: str, default: bool | None = None) -> bool | None:
+
+        """Read a tag line value (true/false, yes/no, on/off or 1/0) in headers as bool."""
+
+        return self.readTyped(bool, tag, *headers, default=default)
+
+    def readJson(self, tag: str, *headers: str, default: any = None) -> any:
+
+        """Read a JSON tag line value in headers."""
+
+        return self.readTyped("json", tag, *headers, default=default)
+
+    #
+    #################################
+    # Get typed values dictionary
+
+    def getTypedDic(self, schema: dict[str, type | str], *headers: str) -> dict[str, any]:
+
+        """
+        Read the tag lines in schema from headers in a single pass.\n
+        schema maps tags to value types (int, float, bool, str or "json").
+        Tags that do not exist are not included.
+        """
+
+        headerNode = self._getHeader(headers)
+        retDic = {}
+
+        for line in headerNode.children.values():
+
+            if type(line) is not MapleLine or line.tag in retDic:
 
-            # Find tag
+                continue
+
+            valueType = schema.get(line.tag)
+
+            if valueType is None:
+
+                continue
 
             try:
 
-                tagInd = self._findTagLine(tag, headInd, eInd)
+                retDic[line.tag] = convertValue(line, valueType)
 
-            except mExc.MapleTagNotFoundException:
+            except ValueError as ve:
 
-                # If the tag does not exist
+                raise mExc.MapleValueException(f"Cannot convert [{line.tag}] value to {getattr(valueType, '__name__', valueType)}: {line.value}") from ve
 
-                tagInd = eInd
+        return retDic
 
-            except Exception as e:
+    #
+    #################################
+    # Save typed value
 
-                raise mExc.MapleException(e) from e
-            
-        # Save tag line
+    def saveTyped(self, tag: str, value: any, *headers: str, **kwargs) -> None:
 
-        if tagInd == eInd:
+        """
+        Save value to tag in headers and keep the value for typed reads.\n
+        bool, int, float and str values are saved as they are, and others as JSON.\n
+        If the headers does not exist, create new headers.\n
+        Overwrte file if save == True
+        """
 
-            # If it is a new line
+        valueType, valueStr = formatValue(value)
+        self.saveValue(tag, valueStr, *headers, **kwargs)
+        self._getHeader(headers).getLine(tag).converted = (valueType, value)
 
-            self.fileStream.insert(tagInd, f"{tag} {valueStr}\n")
+    #
+    ###############################
+    # Save tag line (easier to write)
 
-        else:
+    def saveValue(self, tag: str, value: any, *headers: str, **kwargs) -> None:
 
-            # Overwite
+        """Save valueStr to tag in headers.\n
+        If the headers does not exist, create new headers.\n
+        Overwrte file if save == True"""
 
-            self.fileStream[tagInd] = f"{tag} {valueStr}\n"
+        willSave = kwargs.get('save', False)
+        self.saveTagLine(tag, f"{value}", willSave, *headers)
+    #
+    ###################################################
+    # Save tag line (out of support)
 
-        # Save?
+    def saveTagLine(self, tag: str, valueStr: str, willSave: bool, *headers: str) -> None:
 
-        self._mapleFormatter(willSave)
+        """(Out of support)\n
+        Save valueStr to tag in headers.\n
+        If the headers does not exist, create new headers.\n
+        Overwrte file if sillSave == True"""
+
+        warnings.warn("saveTagLine is out of support. Use saveValue instead.", DeprecationWarning)
+
+        # Find or create headers and save tag line
 
-        # Refresh EOF index
+        headerNode = self._getHeader(headers, create=True)
+        self.__journalHeader(headerNode)
+        headerNode.setValue(tag, valueStr)
+        self.__invalidateCache(headers, tag)
 
-        self.eofIndex = self._findEof(self.eofIndex - 1)
+        # Save?
+
+        if willSave:
+
+            self.__saveChanges()
 
     #
     #############################
@@ -751,24 +1044,21 @@ class MapleTree:
 
         try:
 
-            gotHeader, eInd, headInd = self._findHeader(headers)
+            headerNode = self._getHeader(headers)
 
-            if not gotHeader:
+            self.__journalHeader(headerNode)
 
-                self.__headerNotFoundExceptionHandler(headInd, headers)
+            if not headerNode.removeLine(delTag):
 
-            tagInd = self._findTagLine(delTag, headInd, eInd)
-            self.fileStream.pop(tagInd)
+                raise mExc.MapleTagNotFoundException(self.fileName, delTag)
+
+            self.__invalidateCache(headers, delTag)
 
             # Save?
 
             if willSave:
 
-                self._saveToFile()
-
-            # Refresh EOF index
-
-            self.eofIndex = self._findEof(tagInd)
+                self.__saveChanges()
 
         except mExc.MapleDataNotFoundException as dnfe:
 
@@ -793,42 +1083,19 @@ class MapleTree:
 
             # Find header
 
-            gotHeader, eInd, headInd = self._findHeader(headers)
-
-            if not gotHeader:
-
-                self.__headerNotFoundExceptionHandler(headInd, headers)
+            headerNode = self._getHeader(headers)
 
             # Get tag and values
 
-            while headInd < eInd - 1:
+            for line in headerNode.children.values():
 
-                headInd += 1
-                lineTag = self.__getTag(self.fileStream[headInd])
+                if type(line) is not MapleLine or line.tag == "" or line.tag == "CMT" or line.tag[0] == "#":
 
-                if lineTag == "H":
-
-                    headerValue = self.__getValue(self.fileStream[headInd])
-
-                    if headerValue[:2] == "#*":
-
-                        # Skip comment block
-
-                        headInd = self.__ToCommentEnd(headInd)
-
-                    else:
-
-                        headInd = self.__ToE(headInd)
-
-                elif lineTag == "CMT" or lineTag[0] == "#":
-
-                    # Ignore comment line
+                    # Ignore headers and comment lines
 
                     continue
 
-                else:
-
-                    retDic[lineTag] = self.__getValue(self.fileStream[headInd])
+                retDic[line.tag] = line.value
 
             return retDic
         
@@ -855,42 +1122,19 @@ class MapleTree:
 
             # Find header
                 
-            gotHeader, eInd, headInd = self._findHeader(headers)
-
-            if not gotHeader:
-
-                self.__headerNotFoundExceptionHandler(headInd, headers)
+            headerNode = self._getHeader(headers)
 
             # Get tag list
 
-            while headInd < eInd - 1:
-
-                headInd += 1
-                lineTag = self.__getTag(self.fileStream[headInd])
+            for line in headerNode.children.values():
 
-                if lineTag == "H":
+                if type(line) is not MapleLine or line.tag == "" or line.tag == "CMT" or line.tag[0] == "#":
 
-                    headerValue = self.__getValue(self.fileStream[headInd])
-
-                    if headerValue[:2] == "#*":
-
-                        # Skip comment block
-
-                        headInd = self.__ToCommentEnd(headInd)
-                    
-                    else:
-
-                        headInd = self.__ToE(headInd)
-
-                elif lineTag == "CMT" or lineTag[0] == "#":
-
-                    # Ignore comment line
+                    # Ignore headers and comment lines
 
                     continue
 
-                else:
-
-                    retList.append(lineTag)
+                retList.append(line.tag)
 
             return retList
         
@@ -928,42 +1172,24 @@ class MapleTree:
 
         try:
 
-            isFound, eInd, headInd = self._findHeader(headersList)
-
-            if not isFound:
-
-                # Create new headers
-
-                headLen = len(headersList)
-
-                while headInd < headLen:
+            # Overwrite existing note block
 
-                    self.fileStream.insert(eInd, f"H {headersList[headInd]}\n")
-                    eInd += 1
-                    self.fileStream.insert(eInd, "E\n")
-                    headInd += 1
-
-            else:
-
-                # Delete existing note block
-
-                self.fileStream = self.fileStream[:headInd + 1] + self.fileStream[eInd:]
-                eInd = headInd + 1
+            headerNode = self._getHeader(headersList, create=True)
+            self.__journalHeader(headerNode)
+            headerNode.clear()
+            self.__invalidateCache(headersList)
 
             # Insert note values
 
             for noteValue in noteValues:
 
-                self.fileStream.insert(eInd, f"NTE {noteValue}\n")
-                eInd += 1
-
-            # Refresh EOF index
-
-            self.eofIndex = self._findEof(headInd + 1)
+                headerNode.addLine("NTE", noteValue)
 
             # Save?
 
-            self._mapleFormatter(willSave)
+            if willSave:
+
+                self.__saveChanges()
 
         except mExc.MapleException:
 
@@ -1007,27 +1233,20 @@ class MapleTree:
 
         try:
 
-            isFound, eInd, headInd = self._findHeader(headersList)
-
-            if not isFound:
-
-                self.__headerNotFoundExceptionHandler(headInd, headersList)
-
+            headerNode = self._getHeader(headersList)
             noteValues = []
 
-            for line in self.fileStream[headInd + 1:eInd]:
+            for line in headerNode.children.values():
 
-                lineTag = self.__getTag(line)
-
-                if lineTag == "H":
+                if type(line) is not MapleLine:
 
                     # Note block cannot contain other headers
 
                     raise mExc.InvalidMapleFileFormatException(self.fileName, "Note block contains other headers")
 
-                elif lineTag == "NTE":
+                elif line.tag == "NTE":
 
-                    noteValues.append(self.__getValue(line))
+                    noteValues.append(line.value)
 
                 else:
 
@@ -1111,28 +1330,23 @@ class MapleTree:
 
         try:
 
-            gotHeader, eInd, headInd = self._findHeader(Headers)
+            headerNode = self._getHeader(Headers)
 
-            if not gotHeader:
+            self.__journalHeader(headerNode)
 
-                self.__headerNotFoundExceptionHandler(headInd, Headers)
+            if not headerNode.removeHeader(delHead):
 
-            headInd = self.fileStream.index(f"{self.TAB_FORMAT * len(Headers)}H {delHead}\n", headInd, eInd)
-            eInd = self.__ToE(headInd)
+                raise mExc.MapleHeaderNotFoundException(self.fileName, delHead)
 
-            self.fileStream = self.fileStream[:headInd] + self.fileStream[eInd + 1:]
+            self.__invalidateCache((*Headers, delHead))
 
             # Save?
 
             if willSave:
 
-                self._saveToFile()
-
-            # Refresh EOF index
-
-            self.eofIndex = self._findEof(headInd + 1)
+                self.__saveChanges()
 
-        except ValueError or mExc.MapleDataNotFoundException as ve:
+        except mExc.MapleDataNotFoundException as ve:
 
             raise mExc.MapleDataNotFoundException(self.fileName) from ve
         
@@ -1156,41 +1370,102 @@ class MapleTree:
 
         try:
 
-            gotHeader, eInd, headInd = self._findHeader(headers)
+            headerNode = self._getHeader(headers)
 
-            if not gotHeader:
+            for childNode in headerNode.children.values():
 
-                self.__headerNotFoundExceptionHandler(headInd, headers)
+                if type(childNode) is MapleHeader:
 
-            while headInd < eInd:
+                    retList.append(childNode.name)
 
-                headInd += 1
-                fileLine = self.__removeWhiteSpace(self.fileStream[headInd])
+        except mExc.MapleDataNotFoundException as dnfe:
 
-                if fileLine.startswith("H "):
+            raise mExc.MapleDataNotFoundException(self.fileName) from dnfe
+        
+        except Exception as ex:
 
-                    headerValue = self.__getValue(fileLine)
+            raise mExc.MapleException(ex) from ex
+        
+        return retList
 
-                    if headerValue[:2] == "#*":
+    #
+    ############################
+    # Set section from dictionary
 
-                        # Skip comment block
+    def setSection(self, mapping: dict, *headers: str, **kwargs) -> None:
 
-                        headInd = self.__ToCommentEnd(headInd)
-                    
-                    else:
+        """
+        Overwrite the header block(headers) with mapping in a single pass.\n
+        dict values are saved as header blocks, list values as note blocks
+        and other values as tag lines.\n
+        If the headers does not exist, create new headers.\n
+        Overwrte file if save == True
+        """
 
-                        retList.append(self.__getValue(fileLine))
-                        headInd = self.__ToE(headInd)
+        willSave = kwargs.get('save', False)
 
-        except mExc.MapleDataNotFoundException as dnfe:
+        try:
+
+            headerNode = self._getHeader(headers, create=True)
+            self.__journalHeader(headerNode)
+            headerNode.clear()
+            self.__invalidateCache(headers)
+            loadDict(headerNode, mapping, self.fileName)
+
+            # Save?
+
+            if willSave:
+
+                self.__saveChanges()
+
+        except mExc.MapleException:
+
+            raise
 
-            raise mExc.MapleDataNotFoundException(self.fileName) from dnfe
-        
         except Exception as ex:
 
             raise mExc.MapleException(ex) from ex
-        
-        return retList
+
+    #
+    ############################
+    # Get section as dictionary
+
+    def toDict(self, *headers: str) -> dict:
+
+        """
+        Get and return the header block(headers) as a nested dictionary.\n
+        Header blocks are returned as dict values, note blocks as lists
+        and comments are ignored.
+        """
+
+        try:
+
+            return dumpDict(self._getHeader(headers))
+
+        except mExc.MapleDataNotFoundException:
+
+            raise
+
+        except Exception as ex:
+
+            raise mExc.MapleException(ex) from ex
+
+    #
+    ############################
+    # Create from dictionary
+
+    @classmethod
+    def fromDict(cls, fileName: str, mapping: dict, tabInd: int = 4, encrypt: bool = False, key: bytes | None = None) -> "MapleTree":
+
+        """
+        Create a MapleTree from a nested dictionary and save it to fileName.\n
+        If the file already exists, its Maple data is overwritten with mapping.
+        """
+
+        mapleTree = cls(fileName, tabInd, encrypt, key, createBaseFile=True)
+        mapleTree.setSection(mapping, save=True)
+
+        return mapleTree
 
 """ * * * * * * * * * * * * * """
 """
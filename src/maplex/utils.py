@@ -1,4 +1,30 @@
+import os
+import signal
+import stat
 import subprocess
+import threading
+import time
+import uuid
+from . import mapleExceptions as mExc
+
+try:
+
+    import fcntl
+
+except ImportError:
+
+    # Windows
+
+    fcntl = None
+    import msvcrt
+
+# Durability levels of writeFileAtomic
+
+DURABILITY_LEVELS = ("none", "flush", "fsync")
+
+# Longest interval between the lock attempts of a timed wait
+
+LOCK_POLL_INTERVAL = 0.05
 
 ############################
 # Hide files and directories
@@ -39,4 +65,266 @@ def winUnHide(*fdPath):
     except Exception as ex:
 
         print(ex)
-        raise
\ No newline at end of file
+        raise
+
+#
+##############################
+# Write file atomically
+
+def writeFileAtomic(filePath: str, data: str | bytes, durability: str = "flush", encoding: str | None = None) -> None:
+
+    """
+    Write data to filePath with the durability level.\n
+    none: Overwrite the file in place (fastest, not crash safe)\n
+    flush: Write to a temporary file and replace the file with it\n
+    fsync: Same as flush, and sync the file and the directory to the disk\n
+    Readers see the old file or the new file, and never a truncated file
+    unless the durability level is none.
+    """
+
+    if durability not in DURABILITY_LEVELS:
+
+        raise mExc.MapleValueException(f"Durability level must be one of {DURABILITY_LEVELS}: {durability}")
+
+    writeMode = "wb" if type(data) is bytes else "w"
+    openOptions = {} if writeMode == "wb" else {"encoding": encoding}
+
+    if durability == "none":
+
+        with open(filePath, writeMode, **openOptions) as f:
+
+            f.write(data)
+
+        return
+
+    # Create a temporary file next to the file
+
+    dirPath, baseName = os.path.split(os.path.abspath(filePath))
+    tempPath = os.path.join(dirPath, f".{baseName}.{uuid.uuid4().hex}.tmp")
+    fd = os.open(tempPath, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+
+    try:
+
+        with os.fdopen(fd, writeMode, **openOptions) as f:
+
+            f.write(data)
+            f.flush()
+
+            if durability == "fsync":
+
+                os.fsync(f.fileno())
+
+        # Keep the permission of the file
+
+        try:
+
+            os.chmod(tempPath, stat.S_IMODE(os.stat(filePath).st_mode))
+
+        except FileNotFoundError:
+
+            pass
+
+        os.replace(tempPath, filePath)
+
+    except BaseException:
+
+        try:
+
+            os.remove(tempPath)
+
+        except OSError:
+
+            pass
+
+        raise
+
+    if durability == "fsync" and os.name != "nt":
+
+        # Save the directory entry
+
+        dirFd = os.open(dirPath, os.O_RDONLY)
+
+        try:
+
+            os.fsync(dirFd)
+
+        finally:
+
+            os.close(dirFd)
+
+#
+##############################
+# Lock file
+
+def lockFile(lockPath: str, exclusive: bool = True, timeout: float | None = None) -> int | None:
+
+    """
+    Lock the lock file and return the file descriptor that holds the lock.\n
+    If exclusive is False, take a shared lock that other shared locks can also hold.\n
+    Wait until the lock is taken if timeout is None, or return None after timeout seconds.\n
+    On POSIX, waiting is a blocking flock, so the waiter is woken by the kernel when the lock is released.
+    A timed wait in the main thread is cancelled by a SIGALRM timer (if SIGALRM is not used by the application).\n
+    Polling trade-off: a timed wait in other threads (and every wait on Windows, which supports
+    exclusive locks only) polls a non-blocking lock with a growing interval (up to LOCK_POLL_INTERVAL seconds).
+    A polling waiter wakes up to 1 / LOCK_POLL_INTERVAL times a second and is not queued,
+    so it can lose the lock to newer waiters while it sleeps.
+    The file descriptor is closed when the wait times out.
+    """
+
+    fd = os.open(lockPath, os.O_RDWR | os.O_CREAT, 0o666)
+
+    try:
+
+        if fcntl is not None:
+
+            lockMode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+            if timeout is None:
+
+                fcntl.flock(fd, lockMode)
+                return fd
+
+            if _canUseLockAlarm():
+
+                if _flockWithAlarm(fd, lockMode, timeout):
+
+                    return fd
+
+                os.close(fd)
+                return None
+
+        startTime = time.monotonic()
+        pollInterval = 0.001
+
+        while not _tryLockFile(fd, exclusive):
+
+            if timeout is not None:
+
+                remaining = timeout - (time.monotonic() - startTime)
+
+                if remaining <= 0:
+
+                    os.close(fd)
+                    return None
+
+                time.sleep(min(pollInterval, remaining))
+
+            else:
+
+                time.sleep(pollInterval)
+
+            pollInterval = min(pollInterval * 2, LOCK_POLL_INTERVAL)
+
+        return fd
+
+    except BaseException:
+
+        os.close(fd)
+        raise
+
+class _LockTimeout(Exception):
+
+    """Raised by the SIGALRM handler to cancel a blocking flock"""
+
+def _canUseLockAlarm() -> bool:
+
+    """Return if a timed wait can be cancelled with a SIGALRM timer.
+    Signal handlers run in the main thread only, and the SIGALRM handler and timer
+    of the application must not be replaced."""
+
+    return (threading.current_thread() is threading.main_thread()
+            and signal.getsignal(signal.SIGALRM) in (signal.SIG_DFL, None)
+            and signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0))
+
+def _flockWithAlarm(fd: int, lockMode: int, timeout: float) -> bool:
+
+    """Wait for the lock with a blocking flock cancelled by a SIGALRM timer.
+    Return False if the timer fired first."""
+
+    if timeout <= 0:
+
+        return _tryLockFile(fd, lockMode == fcntl.LOCK_EX)
+
+    waitState = {"waiting": True}
+
+    def onAlarm(signum, frame) -> None:
+
+        # Do nothing if the lock was taken just before the timer fired
+
+        if waitState["waiting"]:
+
+            raise _LockTimeout()
+
+    previousHandler = signal.signal(signal.SIGALRM, onAlarm)
+
+    try:
+
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        fcntl.flock(fd, lockMode)
+        waitState["waiting"] = False
+        return True
+
+    except _LockTimeout:
+
+        # Closing the file descriptor releases the lock if it was taken with the timer
+
+        return False
+
+    finally:
+
+        waitState["waiting"] = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL if previousHandler is None else previousHandler)
+
+def _tryLockFile(fd: int, exclusive: bool) -> bool:
+
+    """Try to lock the lock file without waiting and return if it is locked"""
+
+    try:
+
+        if fcntl is None:
+
+            # Lock the first byte of the lock file
+
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+        else:
+
+            fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+
+    except OSError as e:
+
+        # msvcrt raises OSError if the byte is locked by another process
+
+        if fcntl is None or isinstance(e, BlockingIOError):
+
+            return False
+
+        raise
+
+    return True
+
+#
+##############################
+# Unlock file
+
+def unlockFile(fd: int) -> None:
+
+    """
+    Release the lock taken by lockFile and close the file descriptor
+    """
+
+    try:
+
+        if fcntl is None:
+
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+        else:
+
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    finally:
+
+        os.close(fd)
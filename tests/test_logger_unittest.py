@@ -1,8 +1,17 @@
 import unittest
+import contextlib
+import io
+import json
+import multiprocessing
 import os
+import shutil
+import subprocess
+import sys
+import time
 import tempfile
 
-from src.maplex import Logger
+from src.maplex import Logger, startLogServer, stopLogServer
+from src.maplex.mapleExceptions import MapleLoggerException
 
 class TestLogger(unittest.TestCase):
 
@@ -72,5 +81,438 @@ class TestLogger(unittest.TestCase):
             except Exception as log_exception:
                 self.fail(f"Logger.showError raised an exception: {log_exception}")
 
+class TestLoggerAsyncWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.logger = Logger("test_async_logger", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", asyncWrite=True)
+
+    def tearDown(self):
+        self.logger.flush()
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def read_log_lines(self):
+        lines = []
+        for name in sorted(os.listdir(self.test_log_directory)):
+            with open(os.path.join(self.test_log_directory, name), encoding="utf-8") as f:
+                lines.extend(f.read().splitlines())
+        return lines
+
+    def test_records_are_written_after_flush(self):
+        """Queued records are written in order when flushed."""
+        for i in range(100):
+            self.logger.info(f"async message {i}")
+        self.logger.flush()
+        lines = self.read_log_lines()
+        self.assertEqual(len(lines), 100)
+        self.assertTrue(lines[0].endswith(": async message 0"))
+        self.assertTrue(lines[-1].endswith(": async message 99"))
+
+    def test_rotation_in_writer_thread(self):
+        """The writer thread rotates the log file without losing records."""
+        self.logger.setMaxLogSize(0.001)
+        for i in range(200):
+            self.logger.info(f"rotated message {i}")
+        self.logger.flush()
+        self.assertGreater(len(os.listdir(self.test_log_directory)), 1)
+        self.assertEqual(len(self.read_log_lines()), 200)
+
+    def test_switch_to_sync_write(self):
+        """Switching to the sync mode writes the queued records first."""
+        self.logger.info("queued message")
+        self.logger.setAsyncWrite(False)
+        self.logger.info("sync message")
+        lines = self.read_log_lines()
+        self.assertTrue(lines[0].endswith(": queued message"))
+        self.assertTrue(lines[1].endswith(": sync message"))
+
+class TestLoggerCaller(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def read_log_lines(self, logger):
+        with open(logger.getLogFile(), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_caller_function_and_line(self):
+        """The log line has the function and the line number of the caller."""
+        logger = Logger("test_caller", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+        logger.info("caller message"); line_number = sys._getframe().f_lineno
+        self.assertIn(f"test_caller_function_and_line({line_number})", self.read_log_lines(logger)[0])
+
+    def test_disable_caller_capture(self):
+        """The caller is not logged when the caller capture is disabled."""
+        logger = Logger("test_caller", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", captureCaller=False)
+        logger.info("no caller message")
+        line = self.read_log_lines(logger)[0]
+        self.assertNotIn("test_disable_caller_capture", line)
+        self.assertTrue(line.endswith(": no caller message"))
+
+    def test_log_writer_positional_caller_depth(self):
+        """logWriter still takes the caller depth as the third positional argument."""
+        logger = Logger("test_caller", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+        def log_wrapper(message):
+            logger.logWriter(Logger.LogLevel.INFO, message, 2)
+        log_wrapper("wrapper 100%"); wrapper_line = sys._getframe().f_lineno
+        logger.logWriter(Logger.LogLevel.INFO, "direct message"); direct_line = sys._getframe().f_lineno
+        lines = self.read_log_lines(logger)
+        self.assertIn(f"test_log_writer_positional_caller_depth({wrapper_line})", lines[0])
+        self.assertTrue(lines[0].endswith(": wrapper 100%"))
+        self.assertIn(f"test_log_writer_positional_caller_depth({direct_line})", lines[1])
+        self.assertTrue(lines[1].endswith(": direct message"))
+
+class TestLoggerLogFile(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def test_shared_log_file(self):
+        """Loggers writing to the same file keep the order of the records."""
+        first = Logger("first", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+        second = Logger("second", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+        for i in range(10):
+            first.info(f"first {i}")
+            second.info(f"second {i}")
+        with open(first.getLogFile(), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 20)
+        self.assertTrue(lines[0].endswith(": first 0"))
+        self.assertTrue(lines[-1].endswith(": second 9"))
+
+    def test_rotation_by_written_size(self):
+        """The log file is rotated when the written bytes are over the max log size."""
+        logger = Logger("rotation", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", maxLogSize=0.001)
+        for i in range(100):
+            logger.info(f"rotation message {i}")
+        file_names = os.listdir(self.test_log_directory)
+        self.assertGreater(len(file_names), 1)
+        line_count = 0
+        for name in file_names:
+            file_path = os.path.join(self.test_log_directory, name)
+            self.assertLess(os.path.getsize(file_path), 1000 + 100)
+            with open(file_path, encoding="utf-8") as f:
+                line_count += len(f.read().splitlines())
+        self.assertEqual(line_count, 100)
+
+    def test_overwrite_mode_rotation(self):
+        """The overwrite mode keeps one old log file."""
+        logger = Logger("overwrite", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", maxLogSize=0.001, fileMode="overwrite")
+        for i in range(100):
+            logger.info(f"overwrite message {i}")
+        file_names = os.listdir(self.test_log_directory)
+        self.assertIn("AppLog.log_old.log", file_names)
+        self.assertLessEqual(len(file_names), 2)
+
+class TestLoggerLazyMessage(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.logger = Logger("lazy", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", fileLogLevel="INFO")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def read_log_lines(self):
+        with open(self.logger.getLogFile(), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_format_arguments(self):
+        """The message is formatted with the arguments."""
+        self.logger.info("x=%s y=%d", "foo", 3)
+        self.logger.info(lambda: "callable message")
+        lines = self.read_log_lines()
+        self.assertTrue(lines[0].endswith(": x=foo y=3"))
+        self.assertTrue(lines[1].endswith(": callable message"))
+
+    def test_disabled_level_is_not_formatted(self):
+        """The message of a disabled level is not formatted."""
+        calls = []
+        self.logger.debug(lambda: calls.append("called"))
+        self.logger.debug("%s", self)
+        self.assertEqual(calls, [])
+        self.assertFalse(os.path.exists(self.logger.getLogFile()))
+
+    def test_is_enabled_for(self):
+        """isEnabledFor follows the console and file log levels."""
+        self.assertFalse(self.logger.isEnabledFor(Logger.LogLevel.DEBUG))
+        self.assertTrue(self.logger.isEnabledFor(Logger.LogLevel.INFO))
+        self.logger.setConsoleLogLevel("TRACE")
+        self.assertTrue(self.logger.isEnabledFor(Logger.LogLevel.TRACE))
+
+    def test_format_error(self):
+        """A wrong format does not raise an exception."""
+        self.logger.info("x=%d", "foo")
+        self.assertIn("x=%d ('foo',)", self.read_log_lines()[0])
+
+class TestLoggerJsonFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.logger = Logger("json_logger", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", fileFormat="json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def read_records(self):
+        with open(self.logger.getLogFile(), encoding="utf-8") as f:
+            return [json.loads(line) for line in f.read().splitlines()]
+
+    def test_json_lines(self):
+        """Each record is a JSON object on its own line."""
+        self.logger.info("first message"); line_number = sys._getframe().f_lineno
+        self.logger.error("multi\nline \"message\"")
+        records = self.read_records()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["level"], "INFO")
+        self.assertEqual(records[0]["logger"], "json_logger")
+        self.assertEqual(records[0]["pid"], os.getpid())
+        self.assertEqual(records[0]["function"], "test_json_lines")
+        self.assertEqual(records[0]["line"], line_number)
+        self.assertEqual(records[0]["message"], "first message")
+        self.assertEqual(records[1]["message"], "multi\nline \"message\"")
+
+    def test_json_without_caller(self):
+        """The function and the line are null without the caller capture."""
+        self.logger.setCaptureCaller(False)
+        self.logger.info({"key": "value"})
+        record = self.read_records()[0]
+        self.assertIsNone(record["function"])
+        self.assertIsNone(record["line"])
+        self.assertEqual(record["message"], "{'key': 'value'}")
+
+    def test_invalid_file_format(self):
+        """An invalid file format raises an exception."""
+        with self.assertRaises(MapleLoggerException):
+            self.logger.setFileFormat("xml")
+
+def produce_logs(log_directory, log_server, async_write, producer_index):
+    logger = Logger("producer", workingDirectory=log_directory, cmdLogLevel="NONE", maxLogSize=0.002, logServer=log_server, asyncWrite=async_write)
+    for i in range(50):
+        logger.info("producer %d record %d", producer_index, i)
+    logger.flush()
+
+@unittest.skipIf(os.name == "nt", "The test uses a Unix socket")
+class TestLoggerLogServer(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.log_server = startLogServer()
+
+    def tearDown(self):
+        stopLogServer()
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def count_records(self):
+        count = 0
+        for name in os.listdir(self.test_log_directory):
+            with open(os.path.join(self.test_log_directory, name), encoding="utf-8") as f:
+                count += len(f.read().splitlines())
+        return count
+
+    def run_producers(self, async_write):
+        producers = [multiprocessing.Process(target=produce_logs, args=(self.test_log_directory, self.log_server, async_write, i)) for i in range(4)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        stopLogServer()
+
+    def test_single_writer(self):
+        """Records from several processes are written and rotated by the log server."""
+        self.assertEqual(os.environ.get("MAPLEX_LOG_SERVER"), self.log_server)
+        self.run_producers(False)
+        self.assertGreater(len(os.listdir(self.test_log_directory)), 1)
+        self.assertEqual(self.count_records(), 200)
+        self.assertNotIn("MAPLEX_LOG_SERVER", os.environ)
+
+    def test_async_batches(self):
+        """Records queued by the async writer are sent to the log server in batches."""
+        self.run_producers(True)
+        self.assertEqual(self.count_records(), 200)
+
+    def test_flush(self):
+        """flush waits until the log server writes the records."""
+        logger = Logger("server", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+        self.assertEqual(logger.getLogServer(), self.log_server)
+        logger.info("server message")
+        logger.flush()
+        self.assertEqual(self.count_records(), 1)
+
+    def test_server_not_available(self):
+        """The log file is written in this process if the log server is not available."""
+        logger = Logger("server", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", logServer=os.path.join(self.test_log_directory, "missing.sock"))
+        logger.info("local message")
+        self.assertIsNone(logger.getLogServer())
+        self.assertEqual(self.count_records(), 1)
+
+class TestLoggerTimestamp(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.logger = Logger("timestamp", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def read_log_lines(self):
+        with open(self.logger.getLogFile(), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_default_timestamp(self):
+        """The default timestamp has milliseconds."""
+        self.logger.info("default timestamp")
+        self.assertRegex(self.read_log_lines()[0], r"^\(\d+\) \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3} \[INFO \]")
+
+    def test_custom_timestamp(self):
+        """A custom timestamp format is used for the following records."""
+        self.logger.setTimestampFormat("%Y/%m/%d %H:%M:%S,%f %%f")
+        self.logger.info("custom timestamp")
+        self.assertRegex(self.read_log_lines()[0], r"^\(\d+\) \d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2},\d{3} %f \[INFO \]")
+        self.logger.setTimestampFormat("%H:%M")
+        self.logger.info("no milliseconds")
+        self.assertRegex(self.read_log_lines()[1], r"^\(\d+\) \d{2}:\d{2} \[INFO \]")
+
+    def test_invalid_timestamp_format(self):
+        """An invalid timestamp format raises an exception."""
+        with self.assertRaises(MapleLoggerException):
+            self.logger.setTimestampFormat(None)
+
+class TestLoggerConsole(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.logger = Logger("console", workingDirectory=self.test_log_directory, cmdLogLevel="INFO", fileLogLevel="NONE")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def capture(self, func):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            func()
+        return output.getvalue()
+
+    def test_console_line(self):
+        """The console line has the colored level, the function name and the caller."""
+        colors = self.logger.consoleColors
+        output = self.capture(lambda: self.logger.info("console message"))
+        self.assertTrue(output.startswith(f"[{colors.bLightBlue}INFO {colors.Reset}]{colors.Green}[console]{colors.Reset} {colors.bBlack}<lambda>("))
+        self.assertTrue(output.endswith(": console message\n"))
+        self.assertEqual(self.capture(lambda: self.logger.debug("filtered message")), "")
+
+    def test_console_align_width(self):
+        """The console prefix is padded to the align width."""
+        self.logger.setCaptureCaller(False)
+        colors = self.logger.consoleColors
+        color_length = len(colors.bRed) + len(colors.Green) + len(colors.bBlack) + 3 * len(colors.Reset)
+        # "[WARN ][console] " is 17 characters
+        self.assertEqual(len(self.capture(lambda: self.logger.warn("x"))) - color_length, 32 + len(": x\n"))
+        self.logger.setConsoleAlignWidth(40)
+        self.assertEqual(len(self.capture(lambda: self.logger.warn("x"))) - color_length, 40 + len(": x\n"))
+        with self.assertRaises(MapleLoggerException):
+            self.logger.setConsoleAlignWidth(0)
+
+    def test_console_log_level_change(self):
+        """The console output follows the console log level change."""
+        self.logger.setConsoleLogLevel("ERROR")
+        self.assertEqual(self.capture(lambda: self.logger.warn("filtered message")), "")
+        self.logger.setConsoleLogLevel("TRACE")
+        self.assertIn("trace message", self.capture(lambda: self.logger.trace("trace message")))
+
+class TestLoggerRecordLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.test_log_directory = tempfile.mkdtemp()
+        self.logger = Logger("limits", workingDirectory=self.test_log_directory, cmdLogLevel="NONE")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_log_directory, ignore_errors=True)
+
+    def read_log_lines(self):
+        with open(self.logger.getLogFile(), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_rate_limit_by_call_site(self):
+        """Each call site outputs up to the max records and the rest are reported."""
+        self.logger.setRecordLimit("WARN", maxRecords=5)
+        for i in range(100):
+            self.logger.warn("first site %d", i)
+            self.logger.warn("second site %d", i)
+        self.assertEqual(len(self.read_log_lines()), 10)
+        self.logger.flush()
+        summaries = [line for line in self.read_log_lines() if "Suppressed" in line]
+        self.assertEqual(len(summaries), 2)
+        self.assertTrue(all("Suppressed 95 records from this call site" in line and line.endswith("(95 rate limited, 0 sampled out)") for line in summaries))
+        self.assertIn("test_rate_limit_by_call_site(", summaries[0])
+
+    def test_sampling(self):
+        """Sampled out records are counted in the summary."""
+        self.logger.setRecordLimit("INFO", sampleRate=0.0)
+        for i in range(10):
+            self.logger.info("sampled %d", i)
+        self.logger.error("not limited")
+        self.assertEqual(len(self.read_log_lines()), 1)
+        self.logger.flush()
+        self.assertTrue(self.read_log_lines()[1].endswith("(0 rate limited, 10 sampled out)"))
+
+    def test_remove_limit(self):
+        """Removing the limit reports the suppressed records and outputs all records."""
+        self.logger.setRecordLimit("INFO", maxRecords=1)
+        self.logger.info("first"); self.logger.info("second")
+        self.logger.setRecordLimit("INFO")
+        self.assertEqual(self.logger.getRecordLimits(), {})
+        self.logger.info("third"); self.logger.info("fourth")
+        self.assertEqual(len(self.read_log_lines()), 4)
+
+    def test_config_record_limits(self):
+        """Record limits and the summary interval are read from the config file."""
+        config_file = os.path.join(self.test_log_directory, "config.json")
+        with open(config_file, "w") as f:
+            json.dump({"MapleLogger": {"RecordLimits": {"WARN": {"MaxRecords": 2, "Period": 30}}, "SuppressSummaryInterval": 0}}, f)
+        logger = Logger("limits", workingDirectory=self.test_log_directory, cmdLogLevel="NONE", configFile=config_file)
+        self.assertEqual(logger.getRecordLimits(), {"WARN": {"MaxRecords": 2, "Period": 30.0, "SampleRate": 1.0}})
+        for i in range(4):
+            logger.warn("limited")
+        self.assertIn("Suppressed 1 records", self.read_log_lines()[-1])
+
+    def test_summary_after_burst_ends(self):
+        """The summary is output when the rate limit window ends without more records."""
+        self.logger.setRecordLimit("WARN", maxRecords=2, period=0.2)
+        for i in range(1000):
+            self.logger.warn("hot %d", i)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and not any("Suppressed" in line for line in self.read_log_lines()):
+            time.sleep(0.05)
+        lines = self.read_log_lines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].endswith("(998 rate limited, 0 sampled out)"))
+
+    def test_summary_at_exit(self):
+        """The summary is output when the process exits after a burst."""
+        for async_write in (False, True):
+            script = (
+                "from src.maplex import Logger\n"
+                f"logger = Logger('limits', workingDirectory={self.test_log_directory!r}, cmdLogLevel='NONE', asyncWrite={async_write})\n"
+                "logger.setRecordLimit('WARN', maxRecords=2, period=600)\n"
+                "for i in range(1000):\n"
+                "    logger.warn('hot %d', i)\n"
+            )
+            subprocess.run([sys.executable, "-c", script], check=True, cwd=self.test_log_directory, env={**os.environ, "PYTHONPATH": os.getcwd()})
+            lines = self.read_log_lines()
+            self.assertTrue(lines[-1].endswith("(998 rate limited, 0 sampled out)"))
+            os.remove(self.logger.getLogFile())
+
+    def test_invalid_record_limit(self):
+        """An invalid record limit raises an exception."""
+        with self.assertRaises(MapleLoggerException):
+            self.logger.setRecordLimit("WARN", sampleRate=2.0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
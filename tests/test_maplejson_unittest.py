@@ -7,6 +7,8 @@ import os
 import base64
 import unittest
 from src.maplex import MapleJson
+from src.maplex.mapleCrypto import ChunkedReader
+from src.maplex.mapleExceptions import MapleValueException
 
 class TestMapleJson(unittest.TestCase):
 
@@ -39,11 +41,45 @@ class TestMapleJson(unittest.TestCase):
         read_data = maple_json.read()
         self.assertEqual(self.test_data, read_data)
 
+    def test_chunked_encryption(self):
+        """Test writing and reading JSON data in the chunked encryption format."""
+        maple_json = MapleJson(self.test_file, chunkSize=16)
+        maple_json.setEncryption(True, key=maple_json.generateKey())
+        maple_json.write(self.test_data)
+        with open(self.test_file, 'rb') as f:
+            self.assertTrue(f.read().startswith(b"MPLC"))
+        self.assertEqual(self.test_data, maple_json.read())
+
+    def test_chunked_format_kept(self):
+        """Test a chunked file stays chunked when it is written without chunkSize."""
+        key = MapleJson(self.test_file).generateKey()
+        MapleJson(self.test_file, encrypt=True, key=key, chunkSize=16).write(self.test_data)
+        maple_json = MapleJson(self.test_file, encrypt=True, key=key)
+        data = maple_json.read()
+        data["value"] = 456
+        maple_json.write(data)
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(ChunkedReader(f, key).chunkSize, 16)
+        self.assertEqual(MapleJson(self.test_file, encrypt=True, key=key).read()["value"], 456)
+
     def test_invalid_file_read(self):
         """Test reading from a non-existent file."""
         maple_json = MapleJson("non_existent_file.json", encrypt=False)
         with self.assertRaises(Exception):
             maple_json.read()
 
+    def test_write_durability_levels(self):
+        """Test writing JSON data with each durability level."""
+        for durability in ("none", "flush", "fsync"):
+            maple_json = MapleJson(self.test_file, durability=durability)
+            maple_json.write(self.test_data)
+            self.assertEqual(self.test_data, maple_json.read())
+        self.assertEqual([f for f in os.listdir(".") if f.startswith(f".{self.test_file}.")], [])
+
+    def test_invalid_durability(self):
+        """Test an unknown durability level."""
+        with self.assertRaises(MapleValueException):
+            MapleJson(self.test_file, durability="always")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
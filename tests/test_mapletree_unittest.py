@@ -8,17 +8,29 @@ import os
 import tempfile
 import shutil
 import base64
+import threading
+import signal
 
 from src.maplex import (
     MapleTree,
+    MapleException,
     MapleFileNotFoundException,
     NotAMapleFileException,
     MapleFileEmptyException,
+    MapleFileLockedException,
     KeyEmptyException,
     MapleTagNotFoundException,
     MapleHeaderNotFoundException,
-    MapleEncryptionNotEnabledException
+    MapleEncryptionNotEnabledException,
+    MapleSyntaxException,
+    InvalidMapleFileFormatException,
+    iterMaple,
+    rotateKeys,
+    MapleJson
 )
+from src.maplex.mapleCrypto import FERNET_CACHE_SIZE, getFernet
+from src.maplex.mapleDocument import tokenizeLine
+from src.maplex.mapleExceptions import MapleValueException
 
 
 class TestMapleTreeBasicOperations(unittest.TestCase):
@@ -244,6 +256,18 @@ class TestMapleTreeEncryption(unittest.TestCase):
         
         self.assertEqual(result, test_data)
     
+    def test_encrypted_file_does_not_grow(self):
+        """Test reopening and saving an encrypted file keeps the same data"""
+        maple1 = MapleTree(self.encrypted_file, encrypt=True, key=self.key, createBaseFile=True)
+        maple1.saveValue("TAG", "data", "HEADER", save=True)
+        file_stream = maple1.fileStream
+        
+        for _ in range(3):
+            maple2 = MapleTree(self.encrypted_file, encrypt=True, key=self.key)
+            maple2._saveToFile()
+        
+        self.assertEqual(MapleTree(self.encrypted_file, encrypt=True, key=self.key).fileStream, file_stream)
+    
     def test_encryption_without_key_raises_error(self):
         """Test that encryption without key raises exception"""
         with self.assertRaises(KeyEmptyException):
@@ -294,6 +318,16 @@ class TestMapleTreeEncryption(unittest.TestCase):
         
         with self.assertRaises(Exception):  # Fernet will raise ValueError
             MapleTree(self.encrypted_file, encrypt=True, key=invalid_key, createBaseFile=True)
+    
+    def test_cipher_cache_is_bounded(self):
+        """Test the cipher of a key is reused and old keys are dropped from the cache"""
+        first_key = base64.urlsafe_b64encode(os.urandom(32))
+        self.assertIs(getFernet(first_key), getFernet(first_key))
+        self.assertIs(getFernet([first_key, self.key]), getFernet([first_key, self.key]))
+        first_fernet = getFernet(first_key)
+        for _ in range(FERNET_CACHE_SIZE):
+            getFernet(base64.urlsafe_b64encode(os.urandom(32)))
+        self.assertIsNot(getFernet(first_key), first_fernet)
 
 
 class TestMapleTreeFileValidation(unittest.TestCase):
@@ -388,6 +422,873 @@ class TestMapleTreeEdgeCases(unittest.TestCase):
         self.assertIsNotNone(result)
 
 
+class TestMapleTreeDocument(unittest.TestCase):
+    """Test header and tag lookups on the parsed document after edits"""
+    
+    def setUp(self):
+        """Set up test file with nested headers and comment blocks"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_document_")
+        self.test_file = os.path.join(self.test_dir, 'document.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write(
+                "MAPLE\n"
+                "ROOT root value\n"
+                "H FOO\n"
+                "CMT comment line\n"
+                "BAR bar value\n"
+                "H #*\n"
+                "H NOT A HEADER\n"
+                "E *#\n"
+                "H BAZ\n"
+                "QUX qux value\n"
+                "E\n"
+                "TAIL tail value\n"
+                "E\n"
+                "H QUUX\n"
+                "CORGE corge value\n"
+                "E\n"
+                "EOF\n"
+            )
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def _assert_same_as_reloaded(self, maple):
+        """Helper to compare the edited instance with a freshly loaded one"""
+        maple._saveToFile()
+        reloaded = MapleTree(self.test_file)
+        self.assertEqual(maple.fileStream, reloaded.fileStream)
+        headers_list = [()]
+        while headers_list:
+            headers = headers_list.pop()
+            self.assertEqual(maple.getTagValueDic(*headers), reloaded.getTagValueDic(*headers))
+            self.assertEqual(maple.getHeaders(*headers), reloaded.getHeaders(*headers))
+            headers_list.extend(headers + (header,) for header in maple.getHeaders(*headers))
+    
+    def test_read_values(self):
+        """Test reading values from nested headers"""
+        maple = MapleTree(self.test_file)
+        self.assertEqual(maple.readMapleTag("ROOT"), "root value")
+        self.assertEqual(maple.readMapleTag("QUX", "FOO", "BAZ"), "qux value")
+        self.assertEqual(maple.readMapleTag("TAIL", "FOO"), "tail value")
+        self.assertEqual(maple.getTags("FOO"), ["BAR", "TAIL"])
+        self.assertEqual(maple.getHeaders("FOO"), ["BAZ"])
+        self.assertEqual(maple.getHeaders(), ["FOO", "QUUX"])
+    
+    def test_save_keeps_format(self):
+        """Test saving without edits keeps comments and comment blocks"""
+        maple = MapleTree(self.test_file)
+        maple._saveToFile()
+        with open(self.test_file, 'r') as f:
+            lines = f.read().split("\n")
+        self.assertEqual(lines[3], "    CMT comment line")
+        self.assertEqual(lines[6], "H NOT A HEADER")
+        self.assertEqual(lines[9], "        QUX qux value")
+    
+    def test_edits_match_reloaded_file(self):
+        """Test edited data is the same after saving and reloading"""
+        maple = MapleTree(self.test_file)
+        maple.saveValue("NEW", "new value", "FOO", "BAZ")
+        maple.saveValue("DEEP", "deep value", "FOO", "NEW1", "NEW2")
+        maple.saveValue("BAR", "updated", "FOO")
+        maple.saveNotes(["note 1", "note 2"], "QUUX", "MEMO")
+        maple.saveNotes(["note 3"], "QUUX", "MEMO")
+        maple.deleteValue("ROOT")
+        maple.removeHeader("BAZ", "FOO")
+        
+        self.assertEqual(maple.readMapleTag("DEEP", "FOO", "NEW1", "NEW2"), "deep value")
+        self.assertEqual(maple.readMapleTag("BAR", "FOO"), "updated")
+        self.assertEqual(maple.readMapleTag("CORGE", "QUUX"), "corge value")
+        self.assertEqual(maple.readNotes("QUUX", "MEMO"), ["note 3"])
+        self.assertIsNone(maple.readMapleTag("ROOT"))
+        with self.assertRaises(MapleHeaderNotFoundException):
+            maple.readMapleTag("QUX", "FOO", "BAZ")
+        self._assert_same_as_reloaded(maple)
+    
+    def test_save_renders_only_changed_blocks(self):
+        """Test unchanged blocks reuse rendered lines after an edit"""
+        maple = MapleTree(self.test_file)
+        maple._saveToFile()
+        foo = maple._getHeader(("FOO",))
+        quux = maple._getHeader(("QUUX",))
+        quux_rendered = quux.rendered
+        self.assertIsNotNone(quux_rendered)
+        
+        maple.saveValue("QUX", "changed", "FOO", "BAZ", save=True)
+        self.assertIs(quux.rendered, quux_rendered)
+        self.assertIn("        QUX changed\n", foo.rendered[1])
+        self._assert_same_as_reloaded(maple)
+    
+    def test_remove_first_duplicate(self):
+        """Test the second duplicate tag or header is read after the first one is removed"""
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH A\n    X 1\n    X 2\nE\nH B\n    Y 1\nE\nH B\n    Y 2\nE\nEOF\n")
+        for lazy_load in (False, True):
+            with self.subTest(lazy_load=lazy_load):
+                maple = MapleTree(self.test_file, lazyLoad=lazy_load)
+                self.assertEqual(maple.readMapleTag("X", "A"), "1")
+                maple.deleteValue("X", "A")
+                self.assertEqual(maple.readMapleTag("X", "A"), "2")
+                self.assertEqual(maple.readMapleTag("Y", "B"), "1")
+                maple.removeHeader("B")
+                self.assertEqual(maple.readMapleTag("Y", "B"), "2")
+                self.assertEqual(maple.getHeaders(), ["A", "B"])
+
+
+class TestMapleTreeBatch(unittest.TestCase):
+    """Test grouped changes with MapleTree.batch"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_batch_")
+        self.test_file = os.path.join(self.test_dir, 'batch.mpl')
+        maple = MapleTree(self.test_file, createBaseFile=True)
+        maple.saveValue("TAG", "original", "HEADER", save=True)
+        maple.saveNotes(["note"], "HEADER", "MEMO", save=True)
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def _read_file(self):
+        """Helper to read the file data"""
+        with open(self.test_file, 'r') as f:
+            return f.read()
+    
+    def test_batch_saves_once(self):
+        """Test the file is saved once at the end of the batch"""
+        maple = MapleTree(self.test_file)
+        save_count = []
+        original_save = maple._saveToFile
+        maple._saveToFile = lambda: (save_count.append(1), original_save())
+        
+        with maple.batch():
+            for i in range(20):
+                maple.saveValue(f"TAG{i}", i, "HEADER", "SUB", save=True)
+            maple.deleteValue("TAG", "HEADER", save=True)
+            self.assertEqual(maple.readMapleTag("TAG5", "HEADER", "SUB"), "5")
+        
+        self.assertEqual(len(save_count), 1)
+        reloaded = MapleTree(self.test_file)
+        self.assertEqual(reloaded.readMapleTag("TAG19", "HEADER", "SUB"), "19")
+        self.assertIsNone(reloaded.readMapleTag("TAG", "HEADER"))
+    
+    def test_batch_rolls_back_on_error(self):
+        """Test changes are rolled back when an exception is raised"""
+        maple = MapleTree(self.test_file)
+        file_data = self._read_file()
+        
+        with self.assertRaises(ValueError):
+            with maple.batch():
+                maple.saveValue("TAG", "changed", "HEADER", save=True)
+                maple.saveValue("NEW", "new", "NEW_HEADER")
+                maple.saveNotes(["changed"], "HEADER", "MEMO")
+                maple.removeHeader("HEADER")
+                raise ValueError("Abort batch")
+        
+        self.assertEqual(maple.readMapleTag("TAG", "HEADER"), "original")
+        self.assertEqual(maple.readNotes("HEADER", "MEMO"), ["note"])
+        self.assertEqual(maple.getHeaders(), ["HEADER"])
+        self.assertEqual(self._read_file(), file_data)
+        self.assertEqual("".join(maple.fileStream), file_data)
+
+
+class TestMapleTreeDict(unittest.TestCase):
+    """Test importing and exporting nested dictionaries"""
+    
+    def setUp(self):
+        """Set up test directory and data"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_dict_")
+        self.test_file = os.path.join(self.test_dir, 'dict.mpl')
+        self.test_data = {
+            "NAME": "Maple",
+            "COUNT": 3,
+            "SERVER": {
+                "HOST": "example.com",
+                "PORTS": {"HTTP": 80, "HTTPS": 443}
+            },
+            "MEMO": ["line 1", "line 2"]
+        }
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_from_dict_and_to_dict(self):
+        """Test a dictionary round trip through a Maple file"""
+        MapleTree.fromDict(self.test_file, self.test_data)
+        maple = MapleTree(self.test_file)
+        
+        self.assertEqual(maple.readMapleTag("HTTPS", "SERVER", "PORTS"), "443")
+        self.assertEqual(maple.readNotes("MEMO"), ["line 1", "line 2"])
+        self.assertEqual(maple.toDict(), {
+            "NAME": "Maple",
+            "COUNT": "3",
+            "SERVER": {
+                "HOST": "example.com",
+                "PORTS": {"HTTP": "80", "HTTPS": "443"}
+            },
+            "MEMO": ["line 1", "line 2"]
+        })
+        self.assertEqual(maple.toDict("SERVER", "PORTS"), {"HTTP": "80", "HTTPS": "443"})
+    
+    def test_set_section_overwrites_header(self):
+        """Test setSection replaces only the target header block"""
+        maple = MapleTree.fromDict(self.test_file, self.test_data)
+        maple.setSection({"HOST": "localhost"}, "SERVER", save=True)
+        
+        reloaded = MapleTree(self.test_file)
+        self.assertEqual(reloaded.toDict("SERVER"), {"HOST": "localhost"})
+        self.assertEqual(reloaded.readMapleTag("NAME"), "Maple")
+    
+    def test_set_section_rejects_invalid_tag(self):
+        """Test tags with white space are rejected"""
+        maple = MapleTree(self.test_file, createBaseFile=True)
+        with self.assertRaises(MapleSyntaxException):
+            maple.setSection({"BAD TAG": "value"}, "HEADER")
+    
+    def test_from_dict_rejects_format_keys(self):
+        """Test reserved tags, comment or note headers and line breaks are rejected"""
+        for mapping in ({"E": "x"}, {"H": "x"}, {"EOF": "x"}, {"#TAG": "x"},
+                        {"S": {"#* c": {"A": "x"}}}, {"*NOTES S": {"A": "x"}},
+                        {"A": "line1\nline2"}, {"A\nB": "x"}, {"S\nE": {"A": "x"}},
+                        {"MEMO": ["line 1", "line2\r\nline3"]}):
+            with self.subTest(mapping=mapping):
+                with self.assertRaises(MapleSyntaxException):
+                    MapleTree.fromDict(self.test_file, mapping)
+
+
+class TestIterMaple(unittest.TestCase):
+    """Test streaming read of Maple files"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_stream_")
+        self.test_file = os.path.join(self.test_dir, 'stream.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write(
+                "Ignored line\n"
+                "MAPLE\n"
+                "ROOT root value\n"
+                "H FOO\n"
+                "    CMT comment line\n"
+                "    BAR bar value\n"
+                "    H #*\n"
+                "        BAZ not a value\n"
+                "    E *#\n"
+                "    H BAZ\n"
+                "        QUX qux value\n"
+                "    E\n"
+                "E\n"
+                "H QUUX\n"
+                "    CORGE corge value\n"
+                "E\n"
+                "E\n"
+                "EOF\n"
+            )
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_iter_header_block(self):
+        """Test reading a header block stops at its E line"""
+        events = list(iterMaple(self.test_file, "FOO"))
+        self.assertEqual(events, [
+            (("FOO",), "BAR", "bar value"),
+            (("FOO", "BAZ"), "QUX", "qux value")
+        ])
+    
+    def test_iter_whole_file(self):
+        """Test reading the whole file reaches the broken format"""
+        with self.assertRaises(InvalidMapleFileFormatException):
+            list(iterMaple(self.test_file))
+    
+    def test_iter_header_not_found(self):
+        """Test reading a header that does not exist"""
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH FOO\nBAR value\nE\nEOF\n")
+        with self.assertRaises(MapleHeaderNotFoundException):
+            list(iterMaple(self.test_file, "QUUX"))
+        self.assertEqual(list(iterMaple(self.test_file)), [(("FOO",), "BAR", "value")])
+
+
+class TestMapleTreeLazyLoad(unittest.TestCase):
+    """Test memory mapped lazy loading"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_lazy_")
+        self.test_file = os.path.join(self.test_dir, 'lazy.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write(
+                "Ignored line\n"
+                "MAPLE\n"
+                "ROOT root value\n"
+                "H FOO\n"
+                "    CMT comment line\n"
+                "    BAR bar value\n"
+                "    H #*\n"
+                "        H NOT_A_HEADER\n"
+                "    E *#\n"
+                "    H BAZ\n"
+                "        QUX qux value\n"
+                "    E\n"
+                "    BAR2 after block\n"
+                "E\n"
+                "H QUUX\n"
+                "    CORGE corge value\n"
+                "E\n"
+                "EOF\n"
+                "Trailing line\n"
+            )
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_lazy_matches_eager(self):
+        """Test lazy loading reads the same data as the normal loading"""
+        lazy_tree = MapleTree(self.test_file, lazyLoad=True)
+        eager_tree = MapleTree(self.test_file)
+        self.assertEqual(lazy_tree.toDict(), eager_tree.toDict())
+        self.assertEqual(lazy_tree.getHeaders("FOO"), ["BAZ"])
+        self.assertEqual(lazy_tree.fileStream, eager_tree.fileStream)
+    
+    def test_lazy_blocks_load_on_access(self):
+        """Test only the accessed blocks are decoded"""
+        maple = MapleTree(self.test_file, lazyLoad=True)
+        self.assertEqual(maple.readMapleTag("CORGE", "QUUX"), "corge value")
+        self.assertIsNotNone(maple._root.getHeader("FOO").source)
+        self.assertIsNone(maple._root.getHeader("QUUX").source)
+    
+    def test_lazy_save(self):
+        """Test saving a lazy loaded file keeps the other blocks"""
+        maple = MapleTree(self.test_file, lazyLoad=True)
+        maple.saveValue("CORGE", "new value", "QUUX", save=True)
+        self.assertIsNone(maple._buffer)
+        reloaded = MapleTree(self.test_file)
+        self.assertEqual(reloaded.readMapleTag("CORGE", "QUUX"), "new value")
+        self.assertEqual(reloaded.readMapleTag("QUX", "FOO", "BAZ"), "qux value")
+        self.assertEqual(reloaded.fileStream[-1], "Trailing line\n")
+    
+    def test_lazy_invalid_file(self):
+        """Test lazy loading validates the block structure"""
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH FOO\nBAR value\nEOF\n")
+        with self.assertRaises(MapleException):
+            MapleTree(self.test_file, lazyLoad=True)
+        with open(self.test_file, 'w') as f:
+            f.write("No data\n")
+        with self.assertRaises(NotAMapleFileException):
+            MapleTree(self.test_file, lazyLoad=True)
+
+
+class TestMapleTreeDurability(unittest.TestCase):
+    """Test atomic saves"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_durability_")
+        self.test_file = os.path.join(self.test_dir, 'durable.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH FOO\n    BAR value\nE\nEOF\n")
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_save_durability_levels(self):
+        """Test saving with each durability level leaves only the file"""
+        for durability in ("none", "flush", "fsync"):
+            maple = MapleTree(self.test_file, durability=durability)
+            maple.saveValue("BAR", durability, "FOO", save=True)
+            self.assertEqual(MapleTree(self.test_file).readMapleTag("BAR", "FOO"), durability)
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['durable.mpl', 'durable.mpl.lock'])
+    
+    @unittest.skipIf(os.name == "nt", "File permission bits are POSIX only")
+    def test_save_keeps_file_permission(self):
+        """Test the replaced file keeps its permission"""
+        os.chmod(self.test_file, 0o640)
+        maple = MapleTree(self.test_file)
+        maple.saveValue("BAR", "new value", "FOO", save=True)
+        self.assertEqual(os.stat(self.test_file).st_mode & 0o777, 0o640)
+    
+    def test_invalid_durability(self):
+        """Test an unknown durability level"""
+        with self.assertRaises(MapleValueException):
+            MapleTree(self.test_file, durability="always")
+
+
+@unittest.skipIf(os.name == "nt", "Shared locks are POSIX only")
+class TestMapleTreeLock(unittest.TestCase):
+    """Test file locks between instances"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_lock_")
+        self.test_file = os.path.join(self.test_dir, 'locked.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH FOO\n    BAR value\nE\nEOF\n")
+        self.first = MapleTree(self.test_file)
+        self.second = MapleTree(self.test_file)
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        self.first.unlock()
+        self.second.unlock()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_exclusive_lock_timeout(self):
+        """Test an exclusive lock blocks other locks until unlock"""
+        self.first.lock()
+        with self.assertRaises(MapleFileLockedException):
+            self.second.lock(exclusive=False, timeout=0.1)
+        self.first.unlock()
+        self.second.lock(timeout=1)
+        self.assertTrue(self.second.isLocked())
+    
+    def test_shared_locks(self):
+        """Test readers can hold shared locks together"""
+        self.first.lock(exclusive=False)
+        self.second.lock(exclusive=False, timeout=0)
+        with self.assertRaises(MapleFileLockedException):
+            self.second.lock()
+        with self.assertRaises(MapleFileLockedException):
+            MapleTree(self.test_file).lock(timeout=0.1)
+    
+    def test_wait_for_lock(self):
+        """Test a waiting lock is taken when the lock is released"""
+        self.first.lock()
+        timer = threading.Timer(0.1, self.first.unlock)
+        timer.start()
+        with self.second.locked(timeout=5):
+            self.assertTrue(self.second.isLocked())
+        timer.join()
+        self.assertFalse(self.second.isLocked())
+    
+    def test_save_waits_for_lock(self):
+        """Test a save without lock() takes the exclusive lock and waits for the holder"""
+        self.first.lock()
+        worker = threading.Thread(target=lambda: self.second.saveValue("BAR", "saved", "FOO", save=True))
+        worker.start()
+        worker.join(0.3)
+        self.assertTrue(worker.is_alive())
+        self.assertEqual(MapleTree(self.test_file).readMapleTag("BAR", "FOO"), "value")
+        self.first.unlock()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertFalse(self.second.isLocked())
+        self.assertEqual(MapleTree(self.test_file).readMapleTag("BAR", "FOO"), "saved")
+    
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "Open file descriptors are listed in /proc")
+    def test_lock_timeouts_do_not_leak(self):
+        """Test timed out locks leave no threads or file descriptors behind"""
+        self.first.lock()
+        thread_count = threading.active_count()
+        fd_count = len(os.listdir("/proc/self/fd"))
+        for _ in range(20):
+            with self.assertRaises(MapleFileLockedException):
+                self.second.lock(timeout=0.01)
+        self.assertEqual(threading.active_count(), thread_count)
+        self.assertEqual(len(os.listdir("/proc/self/fd")), fd_count)
+        self.first.unlock()
+        self.second.lock(timeout=1)
+        self.assertTrue(self.second.isLocked())
+    
+    def test_timed_wait_restores_alarm(self):
+        """Test a timed wait in the main thread leaves no SIGALRM handler or timer behind"""
+        self.first.lock()
+        with self.assertRaises(MapleFileLockedException):
+            self.second.lock(timeout=0.05)
+        self.assertEqual(signal.getsignal(signal.SIGALRM), signal.SIG_DFL)
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+        timer = threading.Timer(0.1, self.first.unlock)
+        timer.start()
+        self.second.lock(timeout=5)
+        timer.join()
+        self.assertTrue(self.second.isLocked())
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+    
+    def test_timed_wait_in_thread(self):
+        """Test a timed wait outside the main thread times out and takes the released lock"""
+        self.first.lock()
+        results = []
+        def wait_lock(timeout):
+            try:
+                self.second.lock(timeout=timeout)
+                results.append(True)
+            except MapleFileLockedException:
+                results.append(False)
+        worker = threading.Thread(target=wait_lock, args=(0.05,))
+        worker.start()
+        worker.join(5)
+        self.first.unlock()
+        worker = threading.Thread(target=wait_lock, args=(5,))
+        worker.start()
+        worker.join(5)
+        self.assertEqual(results, [False, True])
+    
+    def test_nested_lock(self):
+        """Test nested locks are released by the last unlock"""
+        with self.first.locked():
+            with self.first.locked():
+                pass
+            self.assertTrue(self.first.isLocked())
+        self.assertFalse(self.first.isLocked())
+
+
+class TestMapleTreeReload(unittest.TestCase):
+    """Test reloading the file when it changes on disk"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_reload_")
+        self.test_file = os.path.join(self.test_dir, 'reload.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH FOO\n    BAR value\nE\nEOF\n")
+        self.reader = MapleTree(self.test_file)
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        self.reader.stopWatcher()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_reload_if_changed(self):
+        """Test the file is reloaded only when it has changed"""
+        self.assertFalse(self.reader.reloadIfChanged())
+        MapleTree(self.test_file).saveValue("BAR", "new value", "FOO", save=True)
+        self.assertTrue(self.reader.reloadIfChanged())
+        self.assertEqual(self.reader.readMapleTag("BAR", "FOO"), "new value")
+        self.assertFalse(self.reader.reloadIfChanged())
+    
+    def test_own_save_does_not_reload(self):
+        """Test saving from the instance updates the file signature"""
+        self.reader.saveValue("BAR", "new value", "FOO", save=True)
+        self.assertFalse(self.reader.reloadIfChanged())
+    
+    def test_reload_keeps_data_on_error(self):
+        """Test the current data is kept if the new file is broken"""
+        with open(self.test_file, 'w') as f:
+            f.write("MAPLE\nH FOO\n")
+        with self.assertRaises(MapleException):
+            self.reader.reload()
+        self.assertEqual(self.reader.readMapleTag("BAR", "FOO"), "value")
+    
+    def test_watcher(self):
+        """Test the watcher reloads the changed file"""
+        reloaded = threading.Event()
+        self.reader.startWatcher(interval=0.05, onReload=lambda maple: reloaded.set())
+        MapleTree(self.test_file).saveValue("BAR", "watched", "FOO", save=True)
+        self.assertTrue(reloaded.wait(5))
+        self.assertEqual(self.reader.readMapleTag("BAR", "FOO"), "watched")
+
+
+class TestMapleTreeReadCache(unittest.TestCase):
+    """Test the read cache and its invalidation"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_cache_")
+        self.test_file = os.path.join(self.test_dir, 'cache.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write(
+                "MAPLE\n"
+                "H FOO\n"
+                "    BAR bar value\n"
+                "    H BAZ\n"
+                "        QUX qux value\n"
+                "    E\n"
+                "E\n"
+                "H QUUX\n"
+                "    CORGE corge value\n"
+                "E\n"
+                "EOF\n"
+            )
+        self.maple = MapleTree(self.test_file, readCacheSize=2)
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_cache_hits_and_eviction(self):
+        """Test repeated reads hit the cache and old entries are evicted"""
+        self.maple.readMapleTag("BAR", "FOO")
+        self.maple.readMapleTag("BAR", "FOO")
+        self.maple.readMapleTag("QUX", "FOO", "BAZ")
+        self.maple.readMapleTag("CORGE", "QUUX")
+        self.maple.readMapleTag("BAR", "FOO")
+        self.assertEqual(self.maple.getReadCacheStats(), {"hits": 1, "misses": 4, "size": 2, "maxSize": 2})
+    
+    def test_save_and_delete_invalidate_tag(self):
+        """Test saveValue and deleteValue invalidate the tag only"""
+        self.maple.readMapleTag("BAR", "FOO")
+        self.maple.saveValue("BAR", "new value", "FOO")
+        self.assertEqual(self.maple.readMapleTag("BAR", "FOO"), "new value")
+        self.maple.deleteValue("BAR", "FOO")
+        self.assertIsNone(self.maple.readMapleTag("BAR", "FOO"))
+        self.assertEqual(self.maple.getReadCacheStats()["hits"], 0)
+    
+    def test_remove_header_invalidates_subtree(self):
+        """Test removeHeader invalidates the entries in the removed block only"""
+        self.maple.readMapleTag("BAR", "FOO")
+        self.maple.readMapleTag("QUX", "FOO", "BAZ")
+        self.maple.removeHeader("BAZ", "FOO")
+        self.assertEqual(self.maple.getReadCacheStats()["size"], 1)
+        with self.assertRaises(MapleHeaderNotFoundException):
+            self.maple.readMapleTag("QUX", "FOO", "BAZ")
+        self.assertEqual(self.maple.readMapleTag("BAR", "FOO"), "bar value")
+        self.assertEqual(self.maple.getReadCacheStats()["hits"], 1)
+    
+    def test_reload_clears_cache(self):
+        """Test reload removes all entries"""
+        self.maple.readMapleTag("BAR", "FOO")
+        MapleTree(self.test_file).saveValue("BAR", "changed", "FOO", save=True)
+        self.maple.reload()
+        self.assertEqual(self.maple.readMapleTag("BAR", "FOO"), "changed")
+
+
+class TestMapleTreeTypedValues(unittest.TestCase):
+    """Test typed reads and saves"""
+    
+    def setUp(self):
+        """Set up test file"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_typed_")
+        self.test_file = os.path.join(self.test_dir, 'typed.mpl')
+        with open(self.test_file, 'w') as f:
+            f.write(
+                "MAPLE\n"
+                "H CONFIG\n"
+                "    PORT 8080\n"
+                "    RATIO 0.5\n"
+                "    DEBUG yes\n"
+                "    HOSTS [\"a\", \"b\"]\n"
+                "    NAME server\n"
+                "    BROKEN abc\n"
+                "E\n"
+                "EOF\n"
+            )
+        self.maple = MapleTree(self.test_file)
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_typed_reads(self):
+        """Test each typed read"""
+        self.assertEqual(self.maple.readInt("PORT", "CONFIG"), 8080)
+        self.assertEqual(self.maple.readFloat("RATIO", "CONFIG"), 0.5)
+        self.assertTrue(self.maple.readBool("DEBUG", "CONFIG"))
+        self.assertEqual(self.maple.readJson("HOSTS", "CONFIG"), ["a", "b"])
+        self.assertEqual(self.maple.readInt("MISSING", "CONFIG", default=1), 1)
+        with self.assertRaises(MapleValueException):
+            self.maple.readInt("BROKEN", "CONFIG")
+    
+    def test_converted_value_is_kept(self):
+        """Test the converted value is kept until the line is changed"""
+        hosts = self.maple.readJson("HOSTS", "CONFIG")
+        self.assertIs(self.maple.readJson("HOSTS", "CONFIG"), hosts)
+        self.maple.saveValue("HOSTS", "[\"c\"]", "CONFIG")
+        self.assertEqual(self.maple.readJson("HOSTS", "CONFIG"), ["c"])
+    
+    def test_save_typed(self):
+        """Test typed saves are read back after reloading"""
+        self.maple.saveTyped("PORT", 9090, "CONFIG")
+        self.maple.saveTyped("LIMITS", {"max": 3}, "CONFIG", "NEW")
+        self.maple.saveTyped("DEBUG", False, "CONFIG", save=True)
+        reloaded = MapleTree(self.test_file)
+        self.assertEqual(reloaded.readInt("PORT", "CONFIG"), 9090)
+        self.assertEqual(reloaded.readJson("LIMITS", "CONFIG", "NEW"), {"max": 3})
+        self.assertFalse(reloaded.readBool("DEBUG", "CONFIG"))
+    
+    def test_get_typed_dic(self):
+        """Test reading a section with a schema"""
+        schema = {"PORT": int, "DEBUG": bool, "HOSTS": "json", "NAME": str, "MISSING": int}
+        self.assertEqual(self.maple.getTypedDic(schema, "CONFIG"), {"PORT": 8080, "DEBUG": True, "HOSTS": ["a", "b"], "NAME": "server"})
+
+
+class TestMapleTreeChunkedEncryption(unittest.TestCase):
+    """Test the chunked encryption format"""
+    
+    def setUp(self):
+        """Set up test file and encryption key"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_chunked_")
+        self.test_file = os.path.join(self.test_dir, 'chunked.mpl')
+        self.key = base64.urlsafe_b64encode(os.urandom(32))
+        maple = MapleTree(self.test_file, encrypt=True, key=self.key, createBaseFile=True, chunkSize=64)
+        for i in range(20):
+            maple.saveValue("VALUE", f"value {i}", f"HEADER_{i}")
+        maple._saveToFile()
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def _read_file(self, file_name=None):
+        """Helper to read the file data"""
+        with open(file_name or self.test_file, 'rb') as f:
+            return f.read()
+    
+    def test_reopen_chunked_file(self):
+        """Test the chunked file keeps its format and data"""
+        self.assertTrue(self._read_file().startswith(b"MPLC"))
+        maple = MapleTree(self.test_file, encrypt=True, key=self.key)
+        self.assertEqual(maple.readMapleTag("VALUE", "HEADER_19"), "value 19")
+        maple.saveValue("VALUE", "changed", "HEADER_0", save=True)
+        self.assertTrue(self._read_file().startswith(b"MPLC"))
+        self.assertEqual(MapleTree(self.test_file, encrypt=True, key=self.key).readMapleTag("VALUE", "HEADER_0"), "changed")
+    
+    def test_in_place_save_with_key_list(self):
+        """Test an in place save with a key list does not mix keys in the file"""
+        new_key = base64.urlsafe_b64encode(os.urandom(32))
+        maple = MapleTree(self.test_file, encrypt=True, key=[new_key, self.key], durability="none")
+        maple.saveValue("VALUE", "changed", "HEADER_0", save=True)
+        for key in (new_key, [new_key, self.key]):
+            maple = MapleTree(self.test_file, encrypt=True, key=key, durability="none")
+            self.assertEqual(maple.readMapleTag("VALUE", "HEADER_0"), "changed")
+            self.assertEqual(maple.readMapleTag("VALUE", "HEADER_19"), "value 19")
+        maple.saveValue("VALUE", "changed again", "HEADER_19", save=True)
+        self.assertEqual(MapleTree(self.test_file, encrypt=True, key=new_key).readMapleTag("VALUE", "HEADER_19"), "changed again")
+    
+    def test_single_token_file_is_readable(self):
+        """Test single token files are read and can be changed to the chunked format"""
+        legacy_file = os.path.join(self.test_dir, 'legacy.mpl')
+        maple = MapleTree(legacy_file, encrypt=True, key=self.key, createBaseFile=True)
+        maple.saveValue("TAG", "data", "HEADER", save=True)
+        self.assertFalse(self._read_file(legacy_file).startswith(b"MPLC"))
+        maple = MapleTree(legacy_file, encrypt=True, key=self.key, chunkSize=32)
+        maple._saveToFile()
+        self.assertTrue(self._read_file(legacy_file).startswith(b"MPLC"))
+        self.assertEqual(MapleTree(legacy_file, encrypt=True, key=self.key).readMapleTag("TAG", "HEADER"), "data")
+    
+    def test_rewrite_changed_segments_only(self):
+        """Test only the changed segments are rewritten in place"""
+        before = self._read_file()
+        maple = MapleTree(self.test_file, encrypt=True, key=self.key, durability="none")
+        maple.saveValue("VALUE", "VALUE 19", "HEADER_19", save=True)
+        after = self._read_file()
+        segment_size = 12 + 64 + 16
+        self.assertEqual(after[:25 + segment_size * 3], before[:25 + segment_size * 3])
+        self.assertNotEqual(after, before)
+        self.assertEqual(MapleTree(self.test_file, encrypt=True, key=self.key).readMapleTag("VALUE", "HEADER_19"), "VALUE 19")
+    
+    def test_broken_segment(self):
+        """Test a broken segment is detected, and the sections before it can be streamed"""
+        data = bytearray(self._read_file())
+        data[-20] ^= 1
+        with open(self.test_file, 'wb') as f:
+            f.write(data)
+        with self.assertRaises(MapleException):
+            MapleTree(self.test_file, encrypt=True, key=self.key)
+        self.assertEqual(list(iterMaple(self.test_file, "HEADER_0", key=self.key)), [(("HEADER_0",), "VALUE", "value 0")])
+
+
+class TestKeyRotation(unittest.TestCase):
+    """Test re-encrypting many files with a new key"""
+    
+    def setUp(self):
+        """Set up encrypted files"""
+        self.test_dir = tempfile.mkdtemp(prefix="mapletree_rotation_")
+        self.old_key = base64.urlsafe_b64encode(os.urandom(32))
+        self.new_key = base64.urlsafe_b64encode(os.urandom(32))
+        self.files = []
+        for i in range(4):
+            file_name = os.path.join(self.test_dir, f'file_{i}.mpl')
+            maple = MapleTree(file_name, encrypt=True, key=self.old_key, createBaseFile=True, chunkSize=32 if i % 2 else 0)
+            maple.saveValue("INDEX", i, "DATA", save=True)
+            self.files.append(file_name)
+        self.json_file = os.path.join(self.test_dir, 'data.json')
+        MapleJson(self.json_file, encrypt=True, key=self.old_key).write({"value": 1})
+        
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_rotate_keys(self):
+        """Test all files are re-encrypted and a second run skips them"""
+        report = rotateKeys(self.test_dir, self.old_key, self.new_key, workers=2)
+        self.assertEqual((report["total"], report["rotated"], report["skipped"], report["failed"]), (5, 5, 0, {}))
+        for i, file_name in enumerate(self.files):
+            self.assertEqual(MapleTree(file_name, encrypt=True, key=self.new_key).readMapleTag("INDEX", "DATA"), str(i))
+        self.assertEqual(MapleJson(self.json_file, encrypt=True, key=self.new_key).read(), {"value": 1})
+        with open(self.files[1], 'rb') as f:
+            self.assertTrue(f.read().startswith(b"MPLC"))
+        report = rotateKeys(self.test_dir, self.old_key, self.new_key, workers=1)
+        self.assertEqual((report["rotated"], report["skipped"]), (0, 5))
+    
+    def test_failed_files_and_journal(self):
+        """Test failures are reported and the journal skips finished files"""
+        broken_file = os.path.join(self.test_dir, 'broken.mpl')
+        with open(broken_file, 'w') as f:
+            f.write("MAPLE\nEOF\n")
+        journal = os.path.join(self.test_dir, 'rotation.journal')
+        report = rotateKeys(self.test_dir, self.old_key, self.new_key, pattern="*.mpl", workers=1, journalPath=journal)
+        self.assertEqual(list(report["failed"]), [broken_file])
+        self.assertEqual(report["rotated"], 4)
+        os.remove(broken_file)
+        report = rotateKeys(self.test_dir, self.old_key, self.new_key, pattern="*.mpl", workers=1, journalPath=journal)
+        self.assertEqual((report["rotated"], report["skipped"], report["failed"]), (0, 4, {}))
+        self.assertFalse(os.path.exists(journal))
+    
+    def test_dual_key_read(self):
+        """Test files can be read with both keys during the rotation"""
+        rotateKeys(self.files[0], self.old_key, self.new_key, workers=1)
+        for file_name in self.files[:2]:
+            maple = MapleTree(file_name, encrypt=True, key=[self.new_key, self.old_key])
+            self.assertIsNotNone(maple.readMapleTag("INDEX", "DATA"))
+    
+    def test_rotation_waits_for_lock(self):
+        """Test the rotation waits while another instance holds the file lock"""
+        holder = MapleTree(self.files[0], encrypt=True, key=self.old_key)
+        holder.lock()
+        with open(self.files[0], 'rb') as f:
+            original = f.read()
+        reports = []
+        worker = threading.Thread(target=lambda: reports.append(rotateKeys(self.files[0], self.old_key, self.new_key, workers=1)))
+        worker.start()
+        worker.join(0.3)
+        self.assertTrue(worker.is_alive())
+        with open(self.files[0], 'rb') as f:
+            self.assertEqual(f.read(), original)
+        holder.unlock()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(reports[0]["rotated"], 1)
+        self.assertEqual(MapleTree(self.files[0], encrypt=True, key=self.new_key).readMapleTag("INDEX", "DATA"), "0")
+    
+    def test_locked_file_fails_after_timeout(self):
+        """Test a file locked longer than the lock timeout is reported and tried again"""
+        holder = MapleTree(self.files[0], encrypt=True, key=self.old_key)
+        holder.lock()
+        journal = os.path.join(self.test_dir, 'rotation.journal')
+        report = rotateKeys(self.test_dir, self.old_key, self.new_key, pattern="*.mpl", workers=1, journalPath=journal, lockTimeout=0.1)
+        self.assertEqual(list(report["failed"]), [self.files[0]])
+        self.assertTrue(report["failed"][self.files[0]].startswith("MapleFileLockedException"))
+        self.assertEqual(report["rotated"], 3)
+        with open(journal, 'r') as f:
+            self.assertIn(f"#FAILED {self.files[0]}: MapleFileLockedException", f.read())
+        holder.unlock()
+        report = rotateKeys(self.test_dir, self.old_key, self.new_key, pattern="*.mpl", workers=1, journalPath=journal, lockTimeout=0.1)
+        self.assertEqual((report["rotated"], report["skipped"], report["failed"]), (1, 3, {}))
+        self.assertFalse(os.path.exists(journal))
+
+
+class TestMapleTokenizer(unittest.TestCase):
+    """Test splitting data lines into indent, tag and value"""
+    
+    def test_tokenize_tag_line(self):
+        """Test a tag line with indent and value"""
+        self.assertEqual(tokenizeLine("    TAG some value \n"), ("    ", "TAG", "some value "))
+        self.assertEqual(tokenizeLine("\tH HEADER 1\r\n"), ("\t", "H", "HEADER 1"))
+    
+    def test_tokenize_tag_only_line(self):
+        """Test lines without values"""
+        self.assertEqual(tokenizeLine("E\n"), ("", "E", ""))
+        self.assertEqual(tokenizeLine("  EOF"), ("  ", "EOF", ""))
+        self.assertEqual(tokenizeLine("\n"), ("", "", ""))
+
+
 class TestMapleTreeWithRealFixture(unittest.TestCase):
     """Test MapleTree with a real fixture file"""
     